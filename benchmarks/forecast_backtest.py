@@ -0,0 +1,281 @@
+'''Backtest Jean forecasts on historical or synthetic concurrency series
+
+Replays ConcurrentExecutions histories, in the series formats accepted by
+Jean (see xlibs.timeseries), through a rolling-origin evaluation: at each
+origin, models are fitted on the history available up to that point and
+forecasts are compared to the demand observed in the following periods.
+
+Reported metrics, for each dataset:
+
+- under: rate of origins where the peak demand exceeded the containers warmed
+- over: container-minutes warmed in excess of the demand observed
+- fit ms: average fit latency per series
+- series/s: fitting throughput
+
+Datasets are loaded from JSON fixture files (a list of objects with "name"
+and "metrics" keys, or a single such object) and generated synthetically
+(diurnal, spiky and flat demand patterns).
+
+Usage (from the project root):
+
+    python benchmarks/forecast_backtest.py [--mode online] \\
+        [--forecaster numpy] [--confidence-level 0.9] [fixtures/*.json]
+'''
+import argparse
+import datetime
+import glob
+import json
+import math
+import os
+import sys
+import time
+from typing import Dict, List
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from xlibs import storage, timeseries  # NOQA
+from xlibs.jean import forecasters, ses_state, utils  # NOQA
+from xlibs.wolverine.constants import METRICS_TIME_PERIOD  # NOQA
+
+
+FIXTURES = os.path.join(ROOT, 'benchmarks', 'fixtures', '*.json')
+PERIODS_PER_DAY = 24 * 3600 // METRICS_TIME_PERIOD
+START = datetime.datetime(2019, 7, 1)
+
+
+def to_metrics(*, values: List) -> Dict:
+    '''Convert a list of values to the Wolverine metrics format'''
+    return {
+        'start': int(START.timestamp()),
+        'period': METRICS_TIME_PERIOD,
+        'values': [int(value) for value in values],
+    }
+
+
+def to_window(*, observations: List) -> Dict:
+    '''Convert (timestamp, value) pairs back to the format of their series'''
+    if observations and isinstance(observations[0][0], str):
+        return dict(observations)
+
+    return {
+        'start': observations[0][0] if observations else 0,
+        'period': METRICS_TIME_PERIOD,
+        'values': [value for _, value in observations],
+    }
+
+
+def diurnal(*, rng, periods: int) -> np.ndarray:
+    '''Demand following a daily cycle'''
+    t = np.arange(periods)
+    peak = rng.uniform(5, 50)
+    phase = rng.uniform(0, 2 * np.pi)
+    cycle = (1 + np.sin(t / PERIODS_PER_DAY * 2 * np.pi + phase)) / 2
+
+    return rng.poisson(1 + peak * cycle)
+
+
+def spiky(*, rng, periods: int) -> np.ndarray:
+    '''Low baseline demand with sudden, short-lived bursts'''
+    values = rng.poisson(rng.uniform(0.5, 3), periods)
+    spikes = rng.random(periods) < 0.02
+    values[spikes] += rng.integers(10, 60, spikes.sum())
+
+    return values
+
+
+def flat(*, rng, periods: int) -> np.ndarray:
+    '''Steady demand with little noise'''
+    return rng.poisson(rng.uniform(1, 20), periods)
+
+
+GENERATORS = {
+    'diurnal': diurnal,
+    'spiky': spiky,
+    'flat': flat,
+}
+
+
+def synthetic_datasets(*, count: int, periods: int, seed: int) -> Dict:
+    '''Generate datasets of synthetic series for each demand pattern'''
+    rng = np.random.default_rng(seed)
+
+    return {
+        f'synthetic-{name}': [
+            {
+                'name': f'{name}-{i}',
+                'metrics': to_metrics(
+                    values=generator(rng=rng, periods=periods),
+                ),
+            }
+            for i in range(count)
+        ]
+        for name, generator in GENERATORS.items()
+    }
+
+
+def fixture_datasets(*, paths: List) -> Dict:
+    '''Load datasets from JSON fixture files'''
+    datasets = {}
+
+    for path in paths:
+        with open(path, 'r') as file:
+            content = json.loads(file.read())
+
+        if isinstance(content, dict):
+            content = [content]
+
+        datasets[os.path.splitext(os.path.basename(path))[0]] = content
+
+    return datasets
+
+
+def backtest(
+        *,
+        functions: List,
+        mode: str,
+        forecaster: forecasters.Forecaster,
+        timeframe: int,
+        history: int,
+        step: int,
+        confidence_level: float,
+        ) -> Dict:
+    '''Run a rolling-origin evaluation over a dataset
+
+    :arg functions: list of dicts with "name" and "metrics"
+    :arg mode: "refit" fits models from scratch at every origin, "online"
+        uses persisted SES states, as Jean does in multi-function mode
+    '''
+    series = [timeseries.get_observations(f['metrics']) for f in functions]
+    length = min(len(s) for s in series)
+
+    clock = {'now': 0.0}
+    store = ses_state.SESStateStore(
+        backend=storage.MemoryStorage(),
+        clock=lambda: clock['now'],
+    )
+
+    origins = range(min(history, length - timeframe), length - timeframe,
+                    step)
+
+    under = 0
+    over_minutes = 0.0
+    fit_time = 0.0
+    fits = 0
+
+    for origin in origins:
+        window = [s[max(0, origin - history):origin] for s in series]
+        clock['now'] = origin * METRICS_TIME_PERIOD
+
+        started = time.perf_counter()
+
+        if mode == 'online':
+            forecasts = utils.forecasting_batch(
+                functions=[
+                    {
+                        'name': f['name'],
+                        'region': 'backtest',
+                        'metrics': to_window(observations=w),
+                        'confidence_level': confidence_level,
+                    }
+                    for f, w in zip(functions, window)
+                ],
+                timeframe=timeframe,
+                store=store,
+            )
+
+        else:
+            data = np.array([[float(v) for _, v in w] for w in window])
+            fitted = forecaster.fit(data=data)
+            forecasts = [
+                utils.prediction_intervals(
+                    level=fitted.level[i],
+                    alpha=fitted.alpha[i],
+                    mse=fitted.sse[i] / data.shape[1],
+                    timeframe=timeframe,
+                    confidence_level=confidence_level,
+                )
+                for i in range(len(functions))
+            ]
+
+        fit_time += time.perf_counter() - started
+        fits += len(functions)
+
+        for s, forecast in zip(series, forecasts):
+            actual = [v for _, v in s[origin:origin + timeframe]]
+            warm = utils.get_forecast_peak(forecast=forecast)
+
+            if max(actual) > warm:
+                under += 1
+
+            over_minutes += sum(max(0, warm - v) for v in actual) * \
+                METRICS_TIME_PERIOD / 60
+
+    evaluations = len(origins) * len(functions)
+
+    return {
+        'series': len(functions),
+        'origins': len(origins),
+        'under': under / evaluations if evaluations else math.nan,
+        'over': over_minutes,
+        'fit_ms': fit_time / fits * 1000 if fits else math.nan,
+        'throughput': fits / fit_time if fit_time else math.nan,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('fixtures', nargs='*', default=glob.glob(FIXTURES))
+    parser.add_argument('--mode', choices=['refit', 'online'],
+                        default='refit')
+    parser.add_argument('--forecaster', default='numpy',
+                        choices=list(forecasters.FORECASTERS.keys()))
+    parser.add_argument('--confidence-level', type=float, default=0.9)
+    parser.add_argument('--timeframe', type=int, default=3)
+    parser.add_argument('--history', type=int, default=3 * PERIODS_PER_DAY)
+    parser.add_argument('--step', type=int, default=12)
+    parser.add_argument('--synthetic', type=int, default=20,
+                        help='series per synthetic pattern (0 to disable)')
+    parser.add_argument('--days', type=int, default=7,
+                        help='days of synthetic data')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    datasets = fixture_datasets(paths=args.fixtures)
+
+    if args.synthetic:
+        datasets.update(synthetic_datasets(
+            count=args.synthetic,
+            periods=args.days * PERIODS_PER_DAY,
+            seed=args.seed,
+        ))
+
+    forecaster = forecasters.get_forecaster(backend=args.forecaster)
+
+    print(
+        f'{"dataset":<22} {"series":>6} {"origins":>7} {"under":>7} '
+        f'{"over c-min":>11} {"fit ms":>8} {"series/s":>9}'
+    )
+
+    for name, functions in datasets.items():
+        result = backtest(
+            functions=functions,
+            mode=args.mode,
+            forecaster=forecaster,
+            timeframe=args.timeframe,
+            history=args.history,
+            step=args.step,
+            confidence_level=args.confidence_level,
+        )
+
+        print(
+            f'{name:<22} {result["series"]:>6} {result["origins"]:>7} '
+            f'{result["under"]:>7.1%} {result["over"]:>11.0f} '
+            f'{result["fit_ms"]:>8.3f} {result["throughput"]:>9.0f}'
+        )
+
+
+if __name__ == '__main__':
+    main()
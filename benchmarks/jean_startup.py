@@ -0,0 +1,132 @@
+'''Benchmark Jean's cold start with each forecasting backend
+
+Each run starts a fresh Python process (as a Lambda cold start would) and
+measures:
+
+- import: time to import the Jean handler module
+- first: latency of the first invocation (includes lazy imports)
+- second: latency of a warm invocation
+
+It also reports the installed size of the packages each backend requires.
+
+Usage (from the project root):
+
+    python benchmarks/jean_startup.py [--runs 5]
+'''
+import argparse
+import importlib.metadata
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BACKENDS = {
+    'numpy': ['numpy'],
+    'statsmodels': ['numpy', 'statsmodels', 'scipy', 'pandas', 'patsy'],
+}
+
+# Code executed in a fresh interpreter for each run
+PROBE = '''
+import json, math, sys, time
+
+start = time.perf_counter()
+import jean
+imported = time.perf_counter()
+
+event = {
+    'metrics': {str(i): 10 + 5 * math.sin(i / 288 * 2 * math.pi)
+                for i in range(864)},
+    'timeframe': 3,
+}
+
+response = jean.handler(dict(event), None)
+first = time.perf_counter()
+
+jean.handler(dict(event), None)
+second = time.perf_counter()
+
+print(json.dumps({
+    'status': response['status'],
+    'import': imported - start,
+    'first': first - imported,
+    'second': second - first,
+    'modules': len(sys.modules),
+}))
+'''
+
+
+def probe(*, backend: str) -> dict:
+    '''Measure a cold start of the Jean handler in a new process'''
+    output = subprocess.run(
+        [sys.executable, '-c', PROBE],
+        cwd=ROOT,
+        env={**os.environ, 'FORECASTER_BACKEND': backend},
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def package_size(*, packages: list) -> float:
+    '''Installed size of a list of packages, in megabytes'''
+    total = 0
+
+    for package in packages:
+        try:
+            files = importlib.metadata.files(package) or []
+
+        except importlib.metadata.PackageNotFoundError:
+            continue
+
+        total += sum(
+            os.path.getsize(path)
+            for path in (f.locate() for f in files)
+            if os.path.isfile(path)
+        )
+
+    return total / 1024 ** 2
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    print(
+        f'{"backend":<12} {"import ms":>10} {"first ms":>10} '
+        f'{"second ms":>10} {"modules":>8} {"size MB":>8}'
+    )
+
+    for backend, packages in BACKENDS.items():
+        try:
+            runs = [probe(backend=backend) for _ in range(args.runs)]
+
+        except subprocess.CalledProcessError as error:
+            print(f'{backend:<12} failed: {error.stderr.strip()[-200:]}')
+            continue
+
+        if any(run['status'] != 200 for run in runs):
+            print(f'{backend:<12} unavailable (handler returned an error)')
+            continue
+
+        median = {
+            key: statistics.median(run[key] for run in runs) * 1000
+            for key in ['import', 'first', 'second']
+        }
+
+        print(
+            f'{backend:<12} {median["import"]:>10.1f} '
+            f'{median["first"]:>10.1f} {median["second"]:>10.1f} '
+            f'{runs[0]["modules"]:>8} '
+            f'{package_size(packages=packages):>8.1f}'
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,233 @@
+'''Benchmark the size of payloads exchanged between X-Lambdas
+
+Builds the requests and responses of each hop of the warming process for a
+batch of functions, in the legacy shape (handlers echo the whole request,
+Cyclops returns every warm-up response and errors echo the request with a
+full traceback) and in the slim shape (see xlibs.response). Jean is run for
+real; the other stages are emulated, since they depend on AWS APIs.
+
+Reported, for each hop:
+
+- legacy KB / slim KB: size of the JSON payload
+- ratio: legacy size over slim size
+- legacy ms / slim ms: time to serialize and parse the payload
+
+Usage (from the project root):
+
+    python benchmarks/payload_size.py [--functions 50] [--containers 10]
+'''
+import argparse
+import json
+import math
+import os
+import sys
+import time
+import traceback
+from typing import Dict, List
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import jean  # NOQA
+from xlibs import response  # NOQA
+from xlibs.cyclops import constants as cyclops_constants  # NOQA
+from xlibs.cyclops import utils as cyclops_utils  # NOQA
+from xlibs.wolverine import constants as wolverine_constants  # NOQA
+
+
+PERIODS = wolverine_constants.METRICS_DAYS_AGO * 24 * 3600 // \
+    wolverine_constants.METRICS_TIME_PERIOD
+
+
+def build_functions(*, count: int) -> List[Dict]:
+    '''Functions as declared in the X-Lambda config file'''
+    return [
+        {
+            'name': f'sentinel-{i}',
+            'region': 'us-east-1',
+            'settings': {'startup_time': 1000},
+            'scaling': {
+                'min_containers': 1,
+                'max_containers': 100,
+                'max_concurrency': 100,
+            },
+        }
+        for i in range(count)
+    ]
+
+
+def build_metrics(*, seed: int) -> Dict:
+    '''Columnar metrics series, as returned by Wolverine'''
+    return {
+        'start': 1561939200,
+        'period': wolverine_constants.METRICS_TIME_PERIOD,
+        'values': [
+            round(10 + 5 * math.sin((i + seed) / 288 * 2 * math.pi))
+            for i in range(PERIODS)
+        ],
+    }
+
+
+def warm_response(*, i: int) -> Dict:
+    '''Response envelope of a single warm-up invocation'''
+    return {
+        'status': 200,
+        'data': {
+            'StatusCode': 200,
+            'ExecutedVersion': '$LATEST',
+            'Payload': {'warmed': True, 'container': f'container-{i}'},
+        },
+    }
+
+
+def raise_deep_error() -> tuple:
+    '''Raise an error with a long description deep within a call stack
+
+    :return: tuple (error, traceback)
+    '''
+    def recurse(depth: int):
+        if not depth:
+            raise ValueError('Jean could not read the mind of ' + 'x' * 5000)
+
+        recurse(depth - 1)
+
+    try:
+        recurse(30)
+
+    except ValueError as error:
+        return error, traceback.format_exc()
+
+
+def hops(*, functions: int, containers: int) -> Dict[str, tuple]:
+    '''Build legacy and slim payloads for each hop of the process'''
+    config = build_functions(count=functions)
+
+    metered = [
+        {**function, 'metrics': build_metrics(seed=i)}
+        for i, function in enumerate(config)
+    ]
+    jean_request = {'functions': metered, 'timeframe': 3}
+
+    slim_forecast = jean.execute(options=json.loads(json.dumps(jean_request)))
+    forecasts = {
+        function['name']: function['forecast']
+        for function in slim_forecast['functions']
+    }
+    forecasted = [
+        {**function, 'forecast': forecasts[function['name']]}
+        for function in metered
+    ]
+
+    warm_results = [warm_response(i=i) for i in range(containers)]
+
+    error, trace = raise_deep_error()
+
+    legacy_error = response.build(
+        status=500,
+        error={
+            'type': type(error).__name__,
+            'description': str(error),
+            'trace': trace,
+        },
+        original_request=jean_request,
+    )
+    slim_error = response.build(
+        status=500,
+        error=response.format_error(error=error, trace=trace),
+    )
+
+    return {
+        'wolverine response': (
+            {'functions': metered, 'errors': [], 'rate_limits': {}},
+            {
+                'functions': [
+                    response.shape(
+                        data=function,
+                        fields=wolverine_constants.RESPONSE_FIELDS,
+                    )
+                    for function in metered
+                ],
+                'errors': [],
+                'rate_limits': {},
+            },
+        ),
+        'jean response': (
+            {**jean_request, 'functions': forecasted},
+            slim_forecast,
+        ),
+        'cyclops requests': (
+            forecasted,
+            [
+                {key: value for key, value in function.items()
+                 if key != 'metrics'}
+                for function in forecasted
+            ],
+        ),
+        'cyclops responses': (
+            [
+                {**function, 'warm_results': warm_results}
+                for function in forecasted
+            ],
+            [
+                response.shape(
+                    data={
+                        **function,
+                        'warm_count': containers,
+                        'warm_summary': cyclops_utils.summarize(
+                            results=warm_results,
+                        ),
+                    },
+                    fields=cyclops_constants.RESPONSE_FIELDS,
+                )
+                for function in forecasted
+            ],
+        ),
+        'error response': (legacy_error, slim_error),
+    }
+
+
+def measure(*, payload, runs: int) -> tuple:
+    '''Measure the size of a payload and its JSON round-trip time'''
+    size = len(json.dumps(payload).encode('utf-8'))
+
+    started = time.perf_counter()
+
+    for _ in range(runs):
+        json.loads(json.dumps(payload))
+
+    return size, (time.perf_counter() - started) / runs
+
+
+def report(*, name: str, legacy, slim, runs: int) -> None:
+    legacy_size, legacy_time = measure(payload=legacy, runs=runs)
+    slim_size, slim_time = measure(payload=slim, runs=runs)
+
+    print(
+        f'{name:<20} {legacy_size / 1024:>10.1f} {slim_size / 1024:>10.1f} '
+        f'{legacy_size / slim_size:>7.1f}x '
+        f'{legacy_time * 1000:>10.2f} {slim_time * 1000:>10.2f}'
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--functions', type=int, default=50)
+    parser.add_argument('--containers', type=int, default=10)
+    parser.add_argument('--runs', type=int, default=20)
+    args = parser.parse_args()
+
+    print(
+        f'{"hop":<20} {"legacy KB":>10} {"slim KB":>10} {"ratio":>8} '
+        f'{"legacy ms":>10} {"slim ms":>10}'
+    )
+
+    for name, (legacy, slim) in hops(
+            functions=args.functions,
+            containers=args.containers,
+            ).items():
+        report(name=name, legacy=legacy, slim=slim, runs=args.runs)
+
+
+if __name__ == '__main__':
+    main()
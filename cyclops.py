@@ -1,5 +1,4 @@
 import logging
-import traceback
 from typing import Dict
 
 try:
@@ -7,9 +6,17 @@ try:
 except ImportError:
     pass
 
-from xlibs import exc, response
-from xlibs.cyclops import constants, utils
+from xlibs import exc, response, telemetry
+from xlibs.cyclops import (
+    constants,
+    hold_controller,
+    spread_tracker,
+    utils,
+    warm_state,
+)
 from xlibs.mutant import Cyclops
+from xlibs.wolverine.settings_cache import SettingsCache
+from xlibs.wolverine.startup_tracker import StartupTracker
 
 
 logger = logging.getLogger()
@@ -23,9 +30,14 @@ def handler(event: Dict, context: Dict) -> Dict:
     :arg context: (dict) contextual data provided by the Lambda platform
     '''
     try:
-        result = execute(
-            options=event,
-        )
+        with telemetry.span(
+                'handler',
+                trace=event.get('trace'),
+                stage='cyclops',
+                ):
+            result = execute(
+                options=event,
+            )
 
         return response.build(
             status=200,
@@ -35,15 +47,7 @@ def handler(event: Dict, context: Dict) -> Dict:
     except Exception as error:
         logger.exception(error)
 
-        return response.build(
-            status=500,
-            error={
-                'type': type(error).__name__,
-                'description': str(error),
-                'trace': traceback.format_exc(),
-            },
-            original_request=event,
-        )
+        return response.build_error(error=error, event=event)
 
 
 def execute(*, options: Dict) -> Dict:
@@ -56,10 +60,119 @@ def execute(*, options: Dict) -> Dict:
     if not is_request_valid:
         raise exc.XLambdaExceptionInvalidRequest(validation_msg)
 
-    cyclops = Cyclops()
+    # The hold time is tuned for each function, chunks fired before the
+    # last one of their function hold for longer (see professor.packing)
+    controller = hold_controller.HoldController()
+    extension = options.get('hold_extension', 0)
+    default_hold = options['settings']['startup_time'] - extension
+
+    hold = controller.get_hold(
+        function_name=options['name'],
+        region=options['region'],
+        default=default_hold,
+    )
+
+    # Later requests hold for less, by the time elapsed since the first ones
+    spreads = spread_tracker.SpreadTracker()
+    request_spread = spreads.estimate(
+        function_name=options['name'],
+        region=options['region'],
+    )
+
+    cyclops = Cyclops().aim(target={
+        **options,
+        'settings': {**options['settings'], 'startup_time': hold},
+        'hold_extension': extension,
+        'request_spread': request_spread,
+    })
+
+    # Chunks only warm part of their function, which the state can't cover
+    tracker = warm_state.WarmStateTracker()
+    is_tracked = constants.WARM_STATE and 'chunk' not in options
+    warm_estimate = None
+
+    if is_tracked:
+        warm_estimate = tracker.estimate(
+            function_name=options['name'],
+            region=options['region'],
+            recent_concurrency=options.get('recent_concurrency'),
+        )
 
-    results = cyclops.aim(target=options).fire().results
+        # Functions not acknowledging warm-ups are always warmed up
+        if warm_estimate is not None and \
+                0 < cyclops.containers_to_warm <= warm_estimate:
+            telemetry.add(containers_skipped=cyclops.containers_to_warm)
 
-    options['warm_results'] = results
+            return response.shape(
+                data={
+                    **options,
+                    'warm_count': 0,
+                    'warm_summary': utils.summarize(results=[]),
+                    'hold_time': hold,
+                    'warm_estimate': warm_estimate,
+                },
+                fields=constants.RESPONSE_FIELDS,
+            )
+
+    started_at = tracker.now()
+
+    try:
+        cyclops.fire()
 
-    return options
+    except Exception:
+        # Failing to invoke the target may signal its settings have changed
+        SettingsCache().invalidate(
+            function_name=options['name'],
+            region=options['region'],
+        )
+        raise
+
+    # Cold starts reveal how long the function actually takes to start
+    StartupTracker().record(
+        function_name=options['name'],
+        region=options['region'],
+        durations=cyclops.init_durations,
+    )
+
+    if cyclops.burst_size:
+        spreads.record(
+            function_name=options['name'],
+            region=options['region'],
+            spread=cyclops.send_spread,
+            count=cyclops.burst_size,
+        )
+
+    summary = cyclops.summary
+
+    # Warm-ups of chunks are recorded too, since they add to the function
+    # concurrency metrics
+    if constants.WARM_STATE:
+        tracker.record(
+            function_name=options['name'],
+            region=options['region'],
+            started_at=started_at,
+            invocations=summary['invocations'],
+            confirmed=summary['containers'],
+            chunk=options['chunk']['index'] if 'chunk' in options else None,
+        )
+
+    next_hold = controller.update(
+        function_name=options['name'],
+        region=options['region'],
+        hold=hold,
+        requested=cyclops.containers_to_warm,
+        summary=summary,
+        default=default_hold,
+    )
+
+    return response.shape(
+        data={
+            **options,
+            'warm_count': cyclops.containers_to_warm,
+            'warm_summary': summary,
+            'hold_time': next_hold,
+            'send_spread': cyclops.send_spread,
+            'warm_estimate': warm_estimate,
+        },
+        fields=constants.RESPONSE_FIELDS,
+    )
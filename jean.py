@@ -1,5 +1,4 @@
 import logging
-import traceback
 from typing import Dict
 
 try:
@@ -7,7 +6,7 @@ try:
 except ImportError:
     pass
 
-from xlibs import exc, response
+from xlibs import exc, response, telemetry
 from xlibs.jean import constants, utils
 
 
@@ -22,9 +21,14 @@ def handler(event: Dict, context: Dict) -> Dict:
     :arg context: (dict) contextual data provided by the Lambda platform
     '''
     try:
-        result = execute(
-            options=event,
-        )
+        with telemetry.span(
+                'handler',
+                trace=event.get('trace'),
+                stage='jean',
+                ):
+            result = execute(
+                options=event,
+            )
 
         return response.build(
             status=200,
@@ -34,19 +38,19 @@ def handler(event: Dict, context: Dict) -> Dict:
     except Exception as error:
         logger.exception(error)
 
-        return response.build(
-            status=500,
-            error={
-                'type': type(error).__name__,
-                'description': str(error),
-                'trace': traceback.format_exc(),
-            },
-            original_request=event,
-        )
+        return response.build_error(error=error, event=event)
 
 
 def execute(*, options: Dict) -> Dict:
-    '''Execute a request received by the Jean Lambda'''
+    '''Execute a request received by the Jean Lambda
+
+    Accepts either a single function ("metrics" option) or a list of
+    functions under the "functions" option (multi-function mode). Metrics
+    are not sent back, only the forecast of each function.
+    '''
+    if 'functions' in options:
+        return execute_multiple(options=options)
+
     is_request_valid, validation_msg = utils.validate_request(
         options=options,
         required_args=constants.REQUIRED_ARGS,
@@ -55,9 +59,43 @@ def execute(*, options: Dict) -> Dict:
     if not is_request_valid:
         raise exc.XLambdaExceptionInvalidRequest(validation_msg)
 
-    options['forecast'] = utils.forecasting(
+    forecast = utils.forecasting(
         metrics=options['metrics'],
         timeframe=options['timeframe'],
+        confidence_level=options.get(
+            'confidence_level',
+            constants.CONFIDENCE_LEVEL,
+        ),
+    )
+
+    return response.shape(
+        data={**options, 'forecast': forecast},
+        fields=constants.RESPONSE_FIELDS,
+    )
+
+
+def execute_multiple(*, options: Dict) -> Dict:
+    '''Execute a multi-function request received by the Jean Lambda'''
+    for function in options['functions']:
+        is_request_valid, validation_msg = utils.validate_request(
+            options={**options, **function},
+            required_args=constants.REQUIRED_ARGS,
+        )
+
+        if not is_request_valid:
+            raise exc.XLambdaExceptionInvalidRequest(validation_msg)
+
+    forecasts = utils.forecasting_batch(
+        functions=options['functions'],
+        timeframe=options['timeframe'],
     )
 
-    return options
+    return {
+        'functions': [
+            response.shape(
+                data={**function, 'forecast': forecast},
+                fields=constants.RESPONSE_FIELDS,
+            )
+            for function, forecast in zip(options['functions'], forecasts)
+        ],
+    }
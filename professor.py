@@ -1,8 +1,7 @@
 import logging
-import traceback
 from typing import Dict
 
-from xlibs import response, exc
+from xlibs import response, exc, telemetry
 from xlibs.professor import action_mapper, constants, utils
 
 
@@ -27,15 +26,10 @@ def handler(event: Dict, context: Dict) -> Dict:
     except Exception as error:
         logger.exception(error)
 
-        return response.build(
-            status=500,
+        return response.build_error(
+            error=error,
+            event=event,
             msg='Oops, something went wrong!',
-            error={
-                'type': type(error).__name__,
-                'description': str(error),
-                'trace': traceback.format_exc(),
-            },
-            original_request=event,
         )
 
 
@@ -50,11 +44,12 @@ def execute(*, options: Dict) -> Dict:
     if not is_request_valid:
         raise exc.XLambdaExceptionInvalidRequest(validation_msg)
 
-    # Load the configuration params
-    config = utils.get_config(action=options['action'])
+    with telemetry.span('run', action=options['action']):
+        # Load the configuration params
+        config = utils.get_config(action=options['action'])
 
-    action_executor = action_mapper.get_executor(action=config.action)
+        action_executor = action_mapper.get_executor(action=config.action)
 
-    results = action_executor.run(config=config)
+        results = action_executor.run(config=config)
 
     return results
@@ -0,0 +1,551 @@
+'''Test Cyclops'''
+import base64
+import unittest
+from unittest.mock import patch
+
+import cyclops
+from xlibs import storage
+from xlibs.cyclops import (
+    constants,
+    hold_controller,
+    spread_tracker,
+    utils,
+    warm_state,
+)
+from xlibs.wolverine import startup_tracker
+
+
+def ack(*, container_id: str, cold: bool = False):
+    '''Build the response of a function acknowledging a warm-up'''
+    return {'xlambda': {'container_id': container_id, 'cold': cold}}
+
+
+def tail(*, response, init_duration=None):
+    '''Build the response of an invocation with LogType "Tail"'''
+    logs = 'START RequestId: 1 Version: $LATEST\n' \
+        'REPORT RequestId: 1\tDuration: 1.52 ms\tBilled Duration: 100 ms'
+
+    if init_duration:
+        logs += f'\tInit Duration: {init_duration} ms'
+
+    return {
+        'Payload': response,
+        'LogResult': base64.b64encode(f'{logs}\t\n'.encode()).decode(),
+    }
+
+
+class TestCyclopsUtils(unittest.TestCase):
+    '''Test Cyclops utility functions'''
+
+    def test_summarize(self):
+        '''Test summarizing warm-up responses without acknowledgements'''
+        results = [{'status': 200, 'data': {}}] * 8 + [
+            {'status': 500, 'error': f'Throttled {i}'} for i in range(5)
+        ] + [None, {'errorMessage': 'Task timed out'}]
+
+        summary = utils.summarize(results=results)
+
+        self.assertEqual(summary['invocations'], 15)
+        self.assertEqual(summary['succeeded'], 9)
+        self.assertEqual(summary['failed'], 6)
+        self.assertEqual(summary['confirmed'], 9)
+        self.assertIsNone(summary['containers'])
+        self.assertEqual(
+            summary['errors'],
+            ['Throttled 0', 'Throttled 1', 'Throttled 2'],
+        )
+
+    def test_summarize_acks(self):
+        '''Test counting distinct containers acknowledged'''
+        results = [
+            ack(container_id='a', cold=True),
+            ack(container_id='b', cold=True),
+            ack(container_id='a'),
+            ack(container_id='c'),
+            {'status': 200},
+        ]
+
+        summary = utils.summarize(results=results)
+
+        self.assertEqual(summary['acknowledged'], 4)
+        self.assertEqual(summary['containers'], 3)
+        self.assertEqual(summary['confirmed'], 3)
+        self.assertEqual(summary['cold'], 2)
+        self.assertEqual(summary['reused'], 1)
+
+    def test_get_hold_tiers(self):
+        '''Test splitting requests in tiers of decreasing hold times'''
+        margin = constants.HOLD_SPREAD_MARGIN
+
+        # Later tiers hold for less, by the time since the first requests
+        self.assertEqual(
+            utils.get_hold_tiers(hold=1000, count=10, tiers=4,
+                                 request_spread=30 * margin),
+            [(2, 1000), (3, 940), (2, 850), (3, 790)],
+        )
+        self.assertEqual(
+            utils.get_hold_tiers(hold=1000, count=2, tiers=4,
+                                 request_spread=30 * margin),
+            [(1, 1000), (1, 970)],
+        )
+        self.assertEqual(
+            utils.get_hold_tiers(hold=1000, count=1, tiers=4,
+                                 request_spread=30 * margin),
+            [(1, 1000)],
+        )
+
+        # Without a measured spread, all requests share the same hold time
+        self.assertEqual(
+            utils.get_hold_tiers(hold=1000, count=10, tiers=4),
+            [(10, 1000)],
+        )
+
+        # Short holds are not cut below the minimum
+        self.assertEqual(
+            utils.get_hold_tiers(hold=150, count=3, tiers=3,
+                                 request_spread=60 * margin),
+            [(1, 150), (2, constants.HOLD_MIN)],
+        )
+
+    def test_get_init_durations(self):
+        '''Test parsing Init Durations from execution logs'''
+        logs = utils.decode_log_result(
+            log_result=tail(response=None, init_duration=153.48)['LogResult'],
+        )
+
+        self.assertEqual(utils.get_init_durations(logs=logs), [153.48])
+        self.assertEqual(utils.get_init_durations(logs=(
+            'Init Duration: 12 ms printed by the function\n'
+            'REPORT RequestId: 2\tDuration: 3.00 ms\n'
+            'REPORT RequestId: 3\tDuration: 2.00 ms\tInit Duration: 98 ms'
+        )), [98.0])
+        self.assertEqual(utils.decode_log_result(log_result=None), '')
+        self.assertEqual(utils.decode_log_result(log_result='%%%'), '')
+
+
+class TestHoldController(unittest.TestCase):
+    '''Test the feedback controller of warm-up hold times'''
+
+    def setUp(self):
+        self.controller = hold_controller.HoldController(
+            backend=storage.MemoryStorage(),
+            clock=lambda: 1000.0,
+        )
+
+    def summarize(self, *, container_ids):
+        return utils.summarize(results=[
+            ack(container_id=container_id) for container_id in container_ids
+        ])
+
+    def test_adjust(self):
+        '''Test increasing on reuse and decreasing on full overlap'''
+        self.assertEqual(
+            self.controller.adjust(
+                hold=1000,
+                requested=3,
+                summary=self.summarize(container_ids=['a', 'b', 'a']),
+            ),
+            1500,
+        )
+        self.assertEqual(
+            self.controller.adjust(
+                hold=1000,
+                requested=3,
+                summary=self.summarize(container_ids=['a', 'b', 'c']),
+            ),
+            900,
+        )
+        self.assertEqual(
+            self.controller.adjust(
+                hold=constants.HOLD_MIN,
+                requested=3,
+                summary=self.summarize(container_ids=['a', 'b', 'c']),
+            ),
+            constants.HOLD_MIN,
+        )
+
+    def test_adjust_inconclusive(self):
+        '''Test that warm-ups missing acknowledgements are ignored'''
+        self.assertIsNone(self.controller.adjust(
+            hold=1000,
+            requested=3,
+            summary=self.summarize(container_ids=['a', 'a']),
+        ))
+        self.assertIsNone(self.controller.adjust(
+            hold=1000,
+            requested=1,
+            summary=self.summarize(container_ids=['a']),
+        ))
+
+    def test_update(self):
+        '''Test persisting hold times across warm-ups'''
+        options = {'function_name': 'scott', 'region': 'us-east-1'}
+
+        self.assertEqual(self.controller.get_hold(**options, default=800), 800)
+
+        hold = self.controller.update(
+            **options,
+            hold=800,
+            requested=2,
+            summary=self.summarize(container_ids=['a', 'a']),
+            default=800,
+        )
+
+        self.assertEqual(hold, 1200)
+        self.assertEqual(
+            self.controller.get_hold(**options, default=800),
+            1200,
+        )
+
+    def test_get_hold_reset(self):
+        '''Test falling back to the default of stale or moved hold times'''
+        now = 1000.0
+        controller = hold_controller.HoldController(
+            backend=storage.MemoryStorage(),
+            clock=lambda: now,
+        )
+        options = {'function_name': 'jubilee', 'region': 'us-east-1'}
+
+        controller.update(
+            **options,
+            hold=1000,
+            requested=2,
+            summary=self.summarize(container_ids=['a', 'b']),
+            default=1000,
+        )
+
+        self.assertEqual(controller.get_hold(**options, default=1100), 900)
+
+        # The startup time moved, e.g. a slower init was learned
+        self.assertEqual(controller.get_hold(**options, default=2000), 2000)
+
+        # No conclusive warm-up for too long, e.g. acks stopped
+        now += constants.HOLD_MAX_AGE + 1
+        self.assertEqual(controller.get_hold(**options, default=1000), 1000)
+
+
+class TestSpreadTracker(unittest.TestCase):
+    '''Test the spread between warm-up requests'''
+
+    def test_estimate(self):
+        '''Test averaging the spread per request across warm-ups'''
+        now = 1000000.0
+        tracker = spread_tracker.SpreadTracker(
+            backend=storage.MemoryStorage(),
+            clock=lambda: now,
+        )
+        function = {'function_name': 'storm', 'region': 'us-east-1'}
+
+        self.assertEqual(tracker.estimate(**function), 0)
+
+        # Single requests have no spread
+        tracker.record(**function, spread=0, count=1)
+        tracker.record(**function, spread=None, count=10)
+        self.assertEqual(tracker.estimate(**function), 0)
+
+        tracker.record(**function, spread=18, count=10)
+        self.assertEqual(tracker.estimate(**function), 2)
+
+        # A slow burst moves the average only partially
+        tracker.record(**function, spread=36, count=4)
+        self.assertAlmostEqual(
+            tracker.estimate(**function),
+            2 + constants.SPREAD_SMOOTHING * 10,
+        )
+
+        now += constants.SPREAD_MAX_AGE + 1
+        self.assertEqual(tracker.estimate(**function), 0)
+
+
+class TestWarmState(unittest.TestCase):
+    '''Test the estimate of containers still warm'''
+
+    def setUp(self):
+        self.now = 1000000.0
+        self.tracker = warm_state.WarmStateTracker(
+            backend=storage.MemoryStorage(),
+            clock=lambda: self.now,
+        )
+        self.function = {'function_name': 'polaris', 'region': 'us-east-1'}
+
+    def test_survival(self):
+        '''Test the decay of idle containers'''
+        grace = constants.WARM_STATE_GRACE
+        half_life = constants.WARM_STATE_HALF_LIFE
+
+        self.assertEqual(warm_state.survival(age=0), 1)
+        self.assertEqual(warm_state.survival(age=grace), 1)
+        self.assertAlmostEqual(
+            warm_state.survival(age=grace + half_life),
+            0.5,
+        )
+        self.assertGreater(
+            warm_state.survival(age=grace + half_life / 2),
+            warm_state.survival(age=grace + half_life),
+        )
+        self.assertEqual(
+            warm_state.survival(age=constants.WARM_STATE_MAX_AGE),
+            0,
+        )
+
+    def recent(self, *values, period=300):
+        '''Concurrency series of the periods up to the current one'''
+        start = int(self.now) // period * period - (len(values) - 1) * period
+
+        return {'start': start, 'period': period, 'values': list(values)}
+
+    def test_estimate(self):
+        '''Test estimating containers kept warm by warm-ups and traffic'''
+        self.assertIsNone(self.tracker.estimate(**self.function))
+
+        self.tracker.record(**self.function, started_at=self.now,
+                            invocations=10, confirmed=10)
+        self.assertEqual(self.tracker.estimate(**self.function), 10)
+
+        self.now += constants.WARM_STATE_GRACE + constants.WARM_STATE_HALF_LIFE
+        self.assertEqual(self.tracker.estimate(**self.function), 5)
+
+        # Containers serving traffic may be the same ones
+        self.assertEqual(
+            self.tracker.estimate(**self.function,
+                                  recent_concurrency=self.recent(3, 0)),
+            5,
+        )
+        self.assertEqual(
+            self.tracker.estimate(**self.function,
+                                  recent_concurrency=self.recent(7, 2)),
+            7,
+        )
+
+        self.now += constants.WARM_STATE_MAX_AGE
+        self.assertEqual(self.tracker.estimate(**self.function), 0)
+
+        # Successful invocations don't tell how many containers served them
+        self.tracker.record(**self.function, started_at=self.now,
+                            invocations=10)
+        self.assertIsNone(self.tracker.estimate(
+            **self.function,
+            recent_concurrency=self.recent(20, 20),
+        ))
+
+    def test_estimate_own_concurrency(self):
+        '''Test that warm-ups don't count as real traffic'''
+        self.tracker.record(**self.function, started_at=self.now - 5,
+                            invocations=3, confirmed=3)
+
+        # Past the grace period, one of the containers was likely reaped
+        self.now += constants.WARM_STATE_GRACE + 100
+
+        # The only concurrency recorded is the warm-up's
+        self.assertEqual(
+            self.tracker.estimate(**self.function,
+                                  recent_concurrency=self.recent(3, 0)),
+            2,
+        )
+
+        # Traffic on top of the warm-up, or in other periods, still counts
+        self.assertEqual(
+            self.tracker.estimate(**self.function,
+                                  recent_concurrency=self.recent(7, 0)),
+            4,
+        )
+        self.assertEqual(
+            self.tracker.estimate(**self.function,
+                                  recent_concurrency=self.recent(3, 5)),
+            5,
+        )
+
+        # Warm-ups of chunks count as well, without confirming containers
+        self.tracker.record(**self.function, started_at=self.now - 1,
+                            invocations=2, confirmed=2, chunk=0)
+
+        self.assertEqual(
+            self.tracker.estimate(**self.function,
+                                  recent_concurrency=self.recent(3, 2)),
+            2,
+        )
+
+        # Chunks fired concurrently don't overwrite each other's warm-ups
+        self.tracker.record(**self.function, started_at=self.now - 1,
+                            invocations=1, chunk=1)
+
+        self.assertEqual(
+            len(self.tracker.load(**self.function, chunk=0)['warm_ups']),
+            1,
+        )
+        self.assertEqual(
+            self.tracker.estimate(**self.function,
+                                  recent_concurrency=self.recent(3, 5)),
+            2,
+        )
+
+
+class TestCyclops(unittest.TestCase):
+    '''Test the Cyclops Lambda'''
+
+    def setUp(self):
+        self.now = 1000000.0
+        self.warm_state = warm_state.WarmStateTracker(
+            backend=storage.MemoryStorage(),
+            clock=lambda: self.now,
+        )
+
+        patcher = patch(
+            'cyclops.warm_state.WarmStateTracker',
+            return_value=self.warm_state,
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.spreads = spread_tracker.SpreadTracker(
+            backend=storage.MemoryStorage(),
+            clock=lambda: self.now,
+        )
+
+        patcher = patch(
+            'cyclops.spread_tracker.SpreadTracker',
+            return_value=self.spreads,
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def options(self, **options):
+        return {
+            'name': 'emma',
+            'region': 'us-east-1',
+            'settings': {'startup_time': 1500},
+            'forecast': [{'point': 3, 'upper': 3}],
+            'scaling': {
+                'min_containers': 1,
+                'max_containers': 10,
+                'max_concurrency': 10,
+            },
+            **options,
+        }
+
+    @patch('cyclops.StartupTracker')
+    @patch('xlibs.mutant.Cyclops.execute_burst')
+    def test_execute_warm_state(self, execute, StartupTracker):
+        '''Test skipping warm-ups while containers are still warm'''
+        execute.return_value = [
+            {'Payload': ack(container_id=container_id), 'LogResult': None}
+            for container_id in ['a', 'b', 'c']
+        ]
+
+        data = cyclops.execute(options=self.options())
+
+        self.assertEqual(data['warm_count'], 3)
+        self.assertIsNone(data['warm_estimate'])
+
+        # Containers confirmed a few minutes ago are still warm
+        self.now += 300
+
+        data = cyclops.execute(options=self.options())
+
+        self.assertEqual(execute.call_count, 1)
+        self.assertEqual(data['warm_count'], 0)
+        self.assertEqual(data['warm_estimate'], 3)
+
+        # Some of them were likely reaped since, all are warmed again
+        self.now += constants.WARM_STATE_HALF_LIFE
+
+        data = cyclops.execute(options=self.options())
+
+        self.assertEqual(execute.call_count, 2)
+        self.assertEqual(data['warm_count'], 3)
+        self.assertEqual(data['warm_estimate'], 1)
+
+        # Real traffic keeps containers warm as well, unlike the concurrency
+        # of the last warm-up
+        self.now += constants.WARM_STATE_GRACE + 1
+        recent = {
+            'start': int(self.now) // 300 * 300 - 300,
+            'period': 300,
+            'values': [3, 0],
+        }
+
+        data = cyclops.execute(options=self.options(recent_concurrency={
+            **recent,
+            'values': [3, 0],
+        }))
+
+        self.assertEqual(execute.call_count, 3)
+        self.assertEqual(data['warm_estimate'], 2)
+
+        data = cyclops.execute(options=self.options(recent_concurrency={
+            **recent,
+            'values': [3, 4],
+        }))
+
+        self.assertEqual(execute.call_count, 3)
+        self.assertEqual(data['warm_count'], 0)
+
+        # Chunks are always fired
+        data = cyclops.execute(options=self.options(
+            recent_concurrency={**recent, 'values': [3, 4]},
+            chunk={'index': 0, 'count': 2},
+        ))
+
+        self.assertEqual(execute.call_count, 4)
+        self.assertIsNone(data['warm_estimate'])
+
+        # Functions not acknowledging warm-ups are always warmed up
+        execute.return_value = [
+            {'Payload': {'status': 200}, 'LogResult': None}
+        ] * 3
+        self.now += constants.WARM_STATE_MAX_AGE
+
+        for _ in range(2):
+            data = cyclops.execute(options=self.options())
+
+        self.assertEqual(execute.call_count, 6)
+        self.assertIsNone(data['warm_estimate'])
+
+    @patch('xlibs.mutant.Cyclops.execute_burst')
+    def test_execute(self, execute):
+        '''Test warming up with the hold time tuned by the controller'''
+        controller = hold_controller.HoldController(
+            backend=storage.MemoryStorage(),
+        )
+        tracker = startup_tracker.StartupTracker(
+            backend=storage.MemoryStorage(),
+        )
+        execute.return_value = [
+            tail(response=ack(container_id='a', cold=True),
+                 init_duration=812.25),
+            tail(response=ack(container_id='b', cold=True),
+                 init_duration=790.5),
+            tail(response=ack(container_id='b')),
+        ]
+
+        options = self.options(hold_extension=500)
+
+        with patch(
+                'cyclops.hold_controller.HoldController',
+                return_value=controller), \
+                patch('cyclops.StartupTracker', return_value=tracker):
+            data = cyclops.execute(options=dict(options))
+
+            request = execute.call_args[1]['requests'][0]
+
+            self.assertEqual(request['log_type'], 'Tail')
+            self.assertIn(b'"startup_time": 1500', request['payload'].body)
+            self.assertEqual(data['warm_count'], 3)
+            self.assertEqual(data['warm_summary']['containers'], 2)
+            self.assertEqual(data['hold_time'], 1500)
+            self.assertNotIn('forecast', data)
+
+            # The next warm-up holds for longer, plus the extension
+            cyclops.execute(options=dict(options))
+
+            payload = execute.call_args[1]['requests'][0]['payload']
+
+            self.assertIn(b'"startup_time": 2000', payload.body)
+
+        # Init Durations of cold starts are recorded
+        entry = tracker.load(function_name='emma', region='us-east-1')
+
+        self.assertEqual(
+            [duration for _, duration in entry['samples']],
+            [812.25, 790.5] * 2,
+        )
@@ -0,0 +1,365 @@
+'''Test Jean'''
+import datetime
+import math
+from typing import Dict, List
+import unittest
+from unittest.mock import patch
+import warnings
+
+import numpy as np
+
+try:
+    from statsmodels.tsa.holtwinters import SimpleExpSmoothing
+except ImportError:
+    SimpleExpSmoothing = None
+
+import jean
+from xlibs import exc, storage
+from xlibs.jean import constants, forecasters, ses, ses_state, utils
+
+
+def dummy_series(*, count: int, periods: int, seed: int = 42) -> np.ndarray:
+    '''Generate a matrix of random concurrency series'''
+    rng = np.random.default_rng(seed)
+    t = np.arange(periods)
+
+    daily = np.sin(t / 288 * 2 * np.pi)[np.newaxis, :]
+    scale = rng.uniform(0, 3, (count, 1))
+    noise = rng.normal(0, 2, (count, periods))
+
+    return np.maximum(0, 10 + 5 * daily * scale + noise).round()
+
+
+class TestSES(unittest.TestCase):
+    '''Test the vectorized Simple Exponential Smoothing engine'''
+
+    def test_evaluate_initial_level(self):
+        '''Test the closed form of the optimal initial level'''
+        data = dummy_series(count=1, periods=50)
+        alpha = np.array([0.3])
+
+        sse, initial_level, _ = ses.evaluate(data=data, alpha=alpha)
+
+        def brute_sse(l0):
+            level, total = l0, 0
+            for observation in data[0]:
+                total += (observation - level) ** 2
+                level = 0.3 * observation + 0.7 * level
+            return total
+
+        self.assertAlmostEqual(sse[0], brute_sse(initial_level[0]))
+        self.assertLess(sse[0], brute_sse(initial_level[0] + 0.5))
+        self.assertLess(sse[0], brute_sse(initial_level[0] - 0.5))
+
+    @unittest.skipUnless(SimpleExpSmoothing, 'statsmodels is not installed')
+    def test_fit_matches_statsmodels(self):
+        '''Test fitted models against the StatsModels implementation'''
+        data = dummy_series(count=10, periods=288)
+        data[:3] = np.random.default_rng(7).poisson(3, (3, 288))
+
+        fitted = ses.fit(data=data)
+
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+
+            for i, series in enumerate(data):
+                model = SimpleExpSmoothing(
+                    endog=series,
+                    initialization_method='estimated',
+                ).fit()
+
+                self.assertLessEqual(fitted.sse[i], model.sse * 1.001)
+                self.assertAlmostEqual(
+                    fitted.level[i],
+                    model.forecast(1)[0],
+                    delta=0.05,
+                )
+
+    def test_forecast_shape(self):
+        '''Test forecasting a batch of series'''
+        forecasts = ses.forecast(
+            data=dummy_series(count=5, periods=100),
+            timeframe=3,
+        )
+
+        self.assertEqual(forecasts.shape, (5, 3))
+
+
+def dummy_metrics(*, values: List) -> Dict:
+    '''Build metrics dict with one datapoint every 5 minutes'''
+    start = datetime.datetime(2019, 7, 1)
+
+    return {
+        (start + datetime.timedelta(minutes=5 * i)).strftime(
+            '%Y-%m-%d %H:%M:%S'
+        ): value
+        for i, value in enumerate(values)
+    }
+
+
+class TestForecasters(unittest.TestCase):
+    '''Test forecasting backends'''
+
+    def test_get_forecaster(self):
+        self.assertIsInstance(
+            forecasters.get_forecaster(),
+            forecasters.NumpyForecaster,
+        )
+        self.assertRaises(
+            exc.XLambdaExceptionForecasterUnavailable,
+            forecasters.get_forecaster,
+            backend='cerebro',
+        )
+
+    def test_forecast(self):
+        '''Test forecasting a single series'''
+        forecaster = forecasters.NumpyForecaster()
+
+        self.assertEqual(
+            forecaster.forecast(data=[3.0] * 10, timeframe=2),
+            [3.0, 3.0],
+        )
+        self.assertEqual(forecaster.forecast(data=[], timeframe=2), [0, 0])
+
+    @unittest.skipUnless(SimpleExpSmoothing, 'statsmodels is not installed')
+    def test_statsmodels_forecaster(self):
+        '''Test the optional StatsModels backend'''
+        data = dummy_series(count=2, periods=100)
+
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            fitted = forecasters.StatsmodelsForecaster().fit(data=data)
+
+        self.assertEqual(fitted.level.shape, (2,))
+        self.assertEqual(fitted.alpha.shape, (2,))
+
+
+class TestJeanUtils(unittest.TestCase):
+    '''Test Jean utility functions'''
+
+    def setUp(self):
+        self.now = 1562000000.0
+        self.store = ses_state.SESStateStore(
+            backend=storage.MemoryStorage(),
+            clock=lambda: self.now,
+        )
+
+    def forecast(self, functions: List) -> List:
+        return utils.forecasting_batch(
+            functions=functions,
+            timeframe=3,
+            store=self.store,
+        )
+
+    def test_forecasting_batch(self):
+        '''Test forecasting functions with series of different lengths'''
+        functions = [
+            {'metrics': dummy_metrics(values=[4] * 30)},
+            {'metrics': {}},
+            {'metrics': dummy_metrics(values=list(range(20)))},
+            {'metrics': dummy_metrics(values=[9] * 30)},
+        ]
+
+        forecasts = self.forecast(functions)
+
+        points = [[value['point'] for value in f] for f in forecasts]
+
+        self.assertEqual(len(forecasts), 4)
+        self.assertEqual(points[0], [4, 4, 4])
+        self.assertEqual(points[1], [0, 0, 0])
+        self.assertGreaterEqual(points[2][0], 15)
+        self.assertEqual(points[3], [9, 9, 9])
+
+        for forecast in forecasts:
+            for value in forecast:
+                self.assertGreaterEqual(value['upper'], value['point'])
+
+    @patch('xlibs.jean.forecasters.ses.fit', wraps=ses.fit)
+    def test_forecasting_incremental(self, fit):
+        '''Test that persisted states are updated instead of refitted'''
+        values = list(dummy_series(count=1, periods=101)[0])
+        function = {'name': 'psylocke', 'region': 'us-east-1'}
+
+        function['metrics'] = dummy_metrics(values=values[:100])
+        self.forecast([function])
+
+        self.assertEqual(fit.call_count, 1)
+
+        state = self.store.load(function_name='psylocke', region='us-east-1')
+        self.assertEqual(state['last_timestamp'], '2019-07-01 08:10:00')
+
+        # One new datapoint: applied to the state, without refitting
+        self.now += 300
+        function['metrics'] = dummy_metrics(values=values[:101])
+        forecasts = self.forecast([function])
+
+        self.assertEqual(fit.call_count, 1)
+
+        new_state = self.store.load(
+            function_name='psylocke',
+            region='us-east-1',
+        )
+        self.assertEqual(new_state['updates'], 1)
+        self.assertEqual(new_state['alpha'], state['alpha'])
+
+        # Same result as filtering up to the last complete datapoint
+        _, _, level = ses.evaluate(
+            data=np.array([values[:100]]),
+            alpha=np.array([state['alpha']]),
+        )
+        level = level[0] + state['alpha'] * (values[100] - level[0])
+        self.assertEqual(
+            [value['point'] for value in forecasts[0]],
+            [math.ceil(level)] * 3,
+        )
+
+        # Refit once the refit interval has passed
+        self.now += constants.SES_REFIT_INTERVAL + 1
+        self.forecast([function])
+
+        self.assertEqual(fit.call_count, 2)
+
+    def test_prediction_intervals(self):
+        '''Test upper prediction bounds of SES forecasts'''
+        forecast = utils.prediction_intervals(
+            level=10.2,
+            alpha=0.5,
+            mse=4,
+            timeframe=3,
+            confidence_level=0.9,
+        )
+
+        # z(0.9) = 1.2816; h=1: 10.2 + 1.2816 * 2 = 12.76
+        self.assertEqual(forecast[0], {'point': 11, 'upper': 13})
+        self.assertLessEqual(forecast[0]['upper'], forecast[2]['upper'])
+
+        higher = utils.prediction_intervals(
+            level=10.2,
+            alpha=0.5,
+            mse=4,
+            timeframe=3,
+            confidence_level=0.99,
+        )
+
+        self.assertGreater(higher[0]['upper'], forecast[0]['upper'])
+
+    def test_normal_quantile(self):
+        '''Test z-scores against reference values of the normal table'''
+        reference = {
+            0.001: -3.090232,
+            0.01: -2.326348,
+            0.5: 0.0,
+            0.6: 0.253347,
+            0.9: 1.281552,
+            0.95: 1.644854,
+            0.975: 1.959964,
+            0.99: 2.326348,
+            0.999: 3.090232,
+        }
+
+        for p, z in reference.items():
+            self.assertAlmostEqual(utils.normal_quantile(p=p), z, places=5)
+
+        self.assertRaises(ValueError, utils.normal_quantile, p=1)
+
+    def test_forecasting_confidence_level(self):
+        '''Test per-function confidence levels'''
+        values = list(dummy_series(count=1, periods=100)[0])
+
+        forecasts = self.forecast([
+            {'metrics': dummy_metrics(values=values),
+             'confidence_level': 0.6},
+            {'metrics': dummy_metrics(values=values),
+             'confidence_level': 0.99},
+        ])
+
+        self.assertEqual(forecasts[0][0]['point'], forecasts[1][0]['point'])
+        self.assertLess(forecasts[0][0]['upper'], forecasts[1][0]['upper'])
+
+    def test_drift(self):
+        '''Test drift detection on the rolling error'''
+        state = ses_state.new_state(
+            alpha=0.1,
+            level=5,
+            sse=100,
+            observations=100,
+            last_timestamp='2019-07-01 00:00:00',
+            fitted_at=self.now,
+        )
+
+        observations = [
+            (f'2019-07-01 01:{i:02d}:00', 50)
+            for i in range(constants.SES_DRIFT_MIN_UPDATES)
+        ]
+
+        state = ses_state.update(state=state, observations=observations)
+
+        self.assertEqual(state['updates'], constants.SES_DRIFT_MIN_UPDATES)
+        self.assertTrue(ses_state.has_drifted(state=state))
+
+    def test_forecasting_columnar(self):
+        '''Test that both series formats lead to the same forecasts'''
+        values = [int(v) for v in dummy_series(count=1, periods=100)[0]]
+        columnar = {'start': 1561939200, 'period': 300, 'values': values}
+
+        self.assertEqual(
+            self.forecast([{'metrics': columnar}]),
+            self.forecast([{'metrics': dummy_metrics(values=values)}]),
+        )
+        self.assertEqual(
+            utils.forecasting(metrics=columnar, timeframe=3),
+            utils.forecasting(
+                metrics=dummy_metrics(values=values),
+                timeframe=3,
+            ),
+        )
+
+        # States persisted from legacy series are refitted, not mixed up
+        function = {'name': 'nightcrawler', 'region': 'us-east-1'}
+
+        self.forecast([{**function, 'metrics': dummy_metrics(values=values)}])
+        forecast = self.forecast([{**function, 'metrics': columnar}])
+
+        self.assertEqual(forecast, self.forecast([{'metrics': columnar}]))
+
+
+class TestJean(unittest.TestCase):
+    '''Test the Jean Lambda'''
+
+    def test_execute_multiple(self):
+        '''Test a multi-function forecasting request'''
+        options = {
+            'timeframe': 2,
+            'functions': [
+                {'name': 'nightcrawler', 'metrics': {'a': 1, 'b': 1}},
+                {'name': 'iceman', 'metrics': {'a': 5, 'b': 5}},
+            ],
+        }
+
+        result = jean.execute(options=options)
+
+        self.assertEqual(
+            result['functions'][0]['forecast'],
+            [{'point': 1, 'upper': 1}] * 2,
+        )
+        self.assertEqual(
+            result['functions'][1]['forecast'],
+            [{'point': 5, 'upper': 5}] * 2,
+        )
+
+        # Metrics are not sent back
+        self.assertEqual(
+            result['functions'][0],
+            {
+                'name': 'nightcrawler',
+                'forecast': [{'point': 1, 'upper': 1}] * 2,
+            },
+        )
+
+    def test_execute_multiple_invalid(self):
+        '''Test a multi-function request missing the timeframe'''
+        self.assertRaises(
+            jean.exc.XLambdaExceptionInvalidRequest,
+            jean.execute,
+            options={'functions': [{'metrics': {}}]},
+        )
@@ -1,12 +1,20 @@
 '''Test Professor'''
+import asyncio
 import copy
 import json
+from typing import Dict
 import unittest
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 import professor
-from xlibs import exc
+from xlibs import exc, queues, storage
 from xlibs.utils import validate_request
-from xlibs.professor import constants, start_warming
+from xlibs.professor import (
+    constants,
+    packing,
+    pipeline,
+    queue_pipeline,
+    start_warming,
+)
 from xlibs.professor.utils import get_config
 from xlibs.professor.config import XLambdaConfig
 
@@ -31,9 +39,9 @@ class CustomMock():
 
     def dummy_prepare_warm_batches():
         warm_batches = [
-            [{}, {}],  # Batch 1
-            [{}, {}, {}],  # Batch 2
-            [{}],  # Batch 3
+            [{'warm_count': 1}, {'warm_count': 1}],  # Batch 1
+            [{'warm_count': 1}, {'warm_count': 1}, {'warm_count': 1}],  # 2
+            [{'warm_count': 1}],  # Batch 3
         ]
         return MagicMock(return_value=warm_batches)
 
@@ -199,12 +207,81 @@ class TestProfessorConfig(unittest.TestCase):
         '''Test the config object with broken options'''
         pass
 
+    def test_config_confidence_level(self):
+        '''Test validation of forecast confidence levels'''
+        config = XLambdaConfig(
+            action='warm_up',
+            options={
+                'lambda_functions': [
+                    {'name': 'x-men', 'confidence_level': 0.95},
+                ],
+            },
+        )
+
+        self.assertEqual(
+            config.default['confidence_level'],
+            constants.CONFIDENCE_LEVEL,
+        )
+
+        for level in [0, 1, 1.5, '0.9']:
+            self.assertRaises(
+                exc.XLambdaExceptionConfigValidationFailed,
+                XLambdaConfig,
+                action='warm_up',
+                options={
+                    'lambda_functions': [
+                        {'name': 'x-men', 'confidence_level': level},
+                    ],
+                },
+            )
+
+    def test_config_execution(self):
+        '''Test validation of execution options'''
+        config = XLambdaConfig(
+            action='warm_up',
+            options={
+                'lambda_functions': self.functions,
+                'execution': {'concurrency': {'jean': 5}},
+            },
+        )
+
+        self.assertEqual(config.execution['mode'], 'stream')
+        self.assertEqual(config.execution['concurrency']['jean'], 5)
+        self.assertEqual(
+            config.execution['concurrency']['wolverine'],
+            constants.DEFAULT_EXECUTION['concurrency']['wolverine'],
+        )
+
+        self.assertFalse(config.execution['monolith'])
+        self.assertEqual(
+            config.mutant_options,
+            {'local': False, 'regional': False},
+        )
+
+        for execution in [
+                [],
+                {'mode': 'telepathy'},
+                {'monolith': 'yes'},
+                {'regional_workers': 1},
+                {'concurrency': {'jean': 0}},
+                ]:
+            self.assertRaises(
+                exc.XLambdaExceptionConfigValidationFailed,
+                XLambdaConfig,
+                action='warm_up',
+                options={
+                    'lambda_functions': self.functions,
+                    'execution': execution,
+                },
+            )
+
 
 class TestStartWarming(unittest.TestCase):
     '''Test the start_warming scripts'''
 
     def setUp(self):
         self.config = XLambdaConfig(
+            action='warm_up',
             options={
                 'default': {
                     'region': 'us-east-1',
@@ -247,6 +324,7 @@ class TestStartWarming(unittest.TestCase):
         functions = [
             {
                 'name': 'A',
+                'region': 'us-east-1',
                 'forecast': [
                     {'upper': 13},
                     {'upper': 12},
@@ -256,6 +334,7 @@ class TestStartWarming(unittest.TestCase):
             },
             {
                 'name': 'B',
+                'region': 'us-east-1',
                 'forecast': [
                     {'upper': 6},
                     {'upper': 15},
@@ -265,6 +344,7 @@ class TestStartWarming(unittest.TestCase):
             },
             {
                 'name': 'C',
+                'region': 'us-east-1',
                 'forecast': [
                     {'upper': 27},
                     {'upper': 34},
@@ -274,6 +354,7 @@ class TestStartWarming(unittest.TestCase):
             },
             {
                 'name': 'D',
+                'region': 'us-east-1',
                 'forecast': [
                     {'upper': 2},
                     {'upper': 3},
@@ -283,6 +364,7 @@ class TestStartWarming(unittest.TestCase):
             },
             {
                 'name': 'E',
+                'region': 'us-east-1',
                 'forecast': [
                     {'upper': 16},
                     {'upper': 21},
@@ -292,40 +374,135 @@ class TestStartWarming(unittest.TestCase):
             },
         ]
 
-        # Function A: 10 -> batch 1 (10)
-        # Function B: 15 -> batch 1 (25)
-        # Function C: 30 -> batch 2 (30)
-        # Function D: 5  -> batch 1 (30)
-        # Function E: 21 -> batch 3 (21)
+        # C (34) is split in chunks of 30 and 4, then first-fit decreasing:
+        # Batch 1: C (30)
+        # Batch 2: E + D + C (30)
+        # Batch 3: B + A (25)
+        batches = start_warming.prepare_warm_batches(
+            functions=functions,
+            max_concurrency=30,
+        )
+
+        self.assertEqual(
+            [[f['name'] for f in batch] for batch in batches],
+            [['C'], ['E', 'D', 'C'], ['B', 'A']],
+        )
+
+        stats = packing.get_stats(batches=batches, max_concurrency=30)
+
+        self.assertEqual(stats['batches'], stats['min_batches'])
+        self.assertEqual(stats['containers'], 85)
+        self.assertEqual(stats['efficiency'], 0.9444)
+        self.assertEqual(stats['split_functions'], 1)
+
+    def test_prepare_warm_batches_function_concurrency(self):
+        '''Test that a function max_concurrency caps its warm count'''
+        batches = start_warming.prepare_warm_batches(
+            functions=[{
+                'name': 'mimic',
+                'region': 'us-east-1',
+                'forecast': [{'point': 6, 'upper': 8}],
+                'scaling': {'max_containers': 10, 'max_concurrency': 5},
+            }],
+            max_concurrency=30,
+        )
+
+        self.assertEqual(batches[0][0]['warm_count'], 5)
+
+    def test_prepare_warm_batches_split(self):
+        '''Test splitting functions demanding more than max_concurrency'''
+        functions = [
+            {
+                'name': 'juggernaut',
+                'region': 'us-east-1',
+                'settings': {'startup_time': 2000},
+                'forecast': [{'upper': 70}],
+                'scaling': {'max_containers': 100},
+            },
+            {
+                'name': 'iceman',
+                'region': 'us-east-1',
+                'settings': {'startup_time': 500},
+                'forecast': [{'upper': 20}],
+                'scaling': {'max_containers': 100},
+            },
+        ]
 
         batches = start_warming.prepare_warm_batches(
             functions=functions,
             max_concurrency=30,
         )
 
-        self.assertEqual(len(batches), 3)
-        self.assertEqual(len(batches[0]), 3)
-        self.assertEqual(len(batches[1]), 1)
-        self.assertEqual(len(batches[2]), 1)
+        self.assertEqual(
+            [[(f['name'], f['warm_count']) for f in b] for b in batches],
+            [
+                [('juggernaut', 30)],
+                [('juggernaut', 30)],
+                [('iceman', 20), ('juggernaut', 10)],
+            ],
+        )
+
+        # Earlier chunks hold their containers until the last chunk fires
+        duration = 2000 + constants.WARM_BATCH_OVERHEAD
+
+        self.assertEqual(batches[0][0]['hold_extension'], 2 * duration)
+        self.assertEqual(batches[1][0]['hold_extension'], duration)
+        self.assertNotIn('hold_extension', batches[2][1])
+        self.assertEqual(
+            batches[0][0]['settings']['startup_time'],
+            2000 + 2 * duration,
+        )
+        self.assertEqual(batches[2][1]['settings']['startup_time'], 2000)
+
+        stats = packing.get_stats(batches=batches, max_concurrency=30)
+
+        self.assertEqual(stats['efficiency'], 1.0)
+        self.assertEqual(stats['split_functions'], 1)
+
+    @patch('xlibs.professor.packing.constants.WARM_BATCH_OVERHEAD', 0)
+    def test_warm_up(self):
+        '''Test that batches only wait on chunks without extended holds'''
+        events = []
 
-        self.assertEqual(batches[0][0]['name'], 'A')
-        self.assertEqual(batches[0][1]['name'], 'B')
-        self.assertEqual(batches[0][2]['name'], 'D')
-        self.assertEqual(batches[1][0]['name'], 'C')
-        self.assertEqual(batches[2][0]['name'], 'E')
+        async def burn(function):
+            events.append(('start', function['name']))
+            await asyncio.sleep(function.get('hold_extension', 0) / 1000)
+            events.append(('end', function['name']))
+
+            return function
+
+        batches = [
+            [{'name': 'juggernaut', 'hold_extension': 50, 'warm_count': 3}],
+            [{'name': 'iceman', 'warm_count': 2}],
+        ]
+
+        loop = asyncio.new_event_loop()
+        outcome = loop.run_until_complete(
+            packing.warm_up(batches=batches, burn=burn))
+        loop.close()
+
+        self.assertEqual(len(outcome['warm_results']), 2)
+        self.assertLess(
+            events.index(('start', 'iceman')),
+            events.index(('end', 'juggernaut')),
+        )
 
     @patch('xlibs.professor.start_warming.execute_batch')
     def test_run(self, execute_batch):
         '''Test running the warming process'''
+        self.config.execution['mode'] = 'batch'
         functions = start_warming.prepare_functions(config=self.config)
 
         start_warming.run(config=self.config)
 
-        execute_batch.assert_called()
-        execute_batch.assert_called_with(
-            functions=functions,
-            config=self.config,
-        )
+        # Each region is run on its own
+        self.assertEqual(execute_batch.call_count, 2)
+
+        for region in ['us-east-1', 'mars-crater-1']:
+            execute_batch.assert_any_call(
+                functions=[f for f in functions if f['region'] == region],
+                config=self.config,
+            )
 
     @patch('xlibs.professor.start_warming.mutant')
     @patch(
@@ -334,8 +511,9 @@ class TestStartWarming(unittest.TestCase):
     def test_execute_batch(self, prepare_warm_batches, mutant):
         '''Test execution of a batch of functions'''
         functions = start_warming.prepare_functions(config=self.config)
+        mutant.Cyclops().burn_function = AsyncMock(return_value={})
 
-        start_warming.execute_batch(
+        outcome = start_warming.execute_batch(
             functions=functions,
             config=self.config,
         )
@@ -358,4 +536,303 @@ class TestStartWarming(unittest.TestCase):
         )
 
         mutant.Cyclops.assert_called()
-        self.assertEqual(mutant.Cyclops().warm_up.call_count, 3)
+        self.assertEqual(mutant.Cyclops().burn_function.call_count, 6)
+
+        self.assertEqual(len(outcome['warm_results']), 6)
+        self.assertEqual(outcome['packing']['batches'], 3)
+
+    @patch('xlibs.professor.start_warming.pipeline.StreamPipeline')
+    def test_run_stream(self, StreamPipeline):
+        '''Test running the warming process in streaming mode'''
+        functions = start_warming.prepare_functions(config=self.config)
+
+        start_warming.run(config=self.config)
+
+        StreamPipeline.assert_called_with(config=self.config)
+        StreamPipeline().run.assert_called_with(functions=functions)
+
+
+class DummyStages():
+    '''Fake Mutant stages that record the order of events'''
+
+    def __init__(self, delays: Dict):
+        self.delays = delays
+        self.events = []
+        self.invocations = {'wolverine': 0, 'jean': 0}
+        self.in_use = 0
+        self.max_in_use = 0
+
+    async def get_functions_metrics(self, functions):
+        self.invocations['wolverine'] += 1
+
+        await asyncio.sleep(max(
+            self.delays.get(function['name'], 0) for function in functions
+        ))
+
+        results, errors = [], []
+
+        for function in functions:
+            if function['name'] == 'sabretooth':
+                errors.append({
+                    'name': function['name'],
+                    'region': function['region'],
+                    'error': {'type': 'Exception', 'description': 'Bad'},
+                })
+                continue
+
+            self.events.append(('wolverine', function['name']))
+            results.append({**function, 'metrics': {}})
+
+        return {'functions': results, 'errors': errors}
+
+    async def forecast_functions(self, functions, timeframe):
+        self.invocations['jean'] += 1
+
+        for function in functions:
+            self.events.append(('jean', function['name']))
+
+        return [
+            {**function, 'forecast': [{'point': 1, 'upper': 4}]}
+            for function in functions
+        ]
+
+    async def burn_function(self, function):
+        self.in_use += function['warm_count']
+        self.max_in_use = max(self.max_in_use, self.in_use)
+        self.events.append(('cyclops', function['name']))
+
+        await asyncio.sleep(0.01)
+        self.in_use -= function['warm_count']
+
+        return {'name': function['name']}
+
+
+class TestPipeline(unittest.TestCase):
+    '''Test the streaming warming pipeline'''
+
+    def setUp(self):
+        self.config = XLambdaConfig(
+            action='warm_up',
+            options={
+                'default': {
+                    'scaling': {
+                        'max_concurrency': 6,
+                        'min_containers': 1,
+                        'max_containers': 6,
+                    },
+                },
+                'lambda_functions': [
+                    {'name': 'storm'},
+                    {'name': 'rogue'},
+                    {'name': 'gambit'},
+                    {'name': 'sabretooth'},
+                ],
+            },
+        )
+        self.functions = start_warming.prepare_functions(config=self.config)
+
+    def run_pipeline(self, stages: DummyStages) -> Dict:
+        stream = pipeline.StreamPipeline(config=self.config)
+        stream.wolverine = stream.jean = stream.cyclops = stages
+
+        return stream.run(functions=self.functions)
+
+    @patch.object(constants, 'JEAN_BATCH_SIZE', 1)
+    @patch.object(constants, 'WOLVERINE_BATCH_SIZE', 1)
+    def test_flows_are_independent(self):
+        '''Test that functions advance without waiting on slow ones'''
+        stages = DummyStages(delays={'storm': 0.3})
+
+        results = self.run_pipeline(stages=stages)
+
+        self.assertEqual(len(results['warm_results']), 3)
+        self.assertEqual(len(results['errors']), 1)
+        self.assertEqual(results['errors'][0]['name'], 'sabretooth')
+        self.assertEqual(
+            results['errors'][0]['type'],
+            'XLambdaExceptionGetMetricsFailed',
+        )
+
+        # Rogue is warmed before Storm's metrics even arrive
+        self.assertLess(
+            stages.events.index(('cyclops', 'rogue')),
+            stages.events.index(('wolverine', 'storm')),
+        )
+
+    @patch.object(constants, 'JEAN_BATCH_SIZE', 3)
+    @patch.object(constants, 'WOLVERINE_BATCH_SIZE', 3)
+    def test_batched_invocations(self):
+        '''Test that concurrent flows share Wolverine and Jean invocations'''
+        stages = DummyStages(delays={})
+        self.functions = [
+            {**self.functions[0], 'name': f'sentinel-{i}'} for i in range(7)
+        ]
+
+        results = self.run_pipeline(stages=stages)
+
+        self.assertEqual(len(results['warm_results']), 7)
+        self.assertEqual(stages.invocations, {'wolverine': 3, 'jean': 3})
+
+    def test_capacity_budget(self):
+        '''Test that warming stays within the max_concurrency budget'''
+        stages = DummyStages(delays={})
+
+        self.run_pipeline(stages=stages)
+
+        # Each function needs 4 containers out of 6: one at a time
+        self.assertEqual(stages.max_in_use, 4)
+
+    @patch('cyclops.execute')
+    @patch('jean.execute')
+    @patch('wolverine.execute')
+    def test_monolith(self, wolverine, jean, cyclops):
+        '''Test running all stages within the Professor process'''
+        wolverine.side_effect = lambda options: {
+            'functions': [
+                {**function, 'metrics': {}}
+                for function in options['functions']
+            ],
+            'errors': [],
+        }
+        jean.side_effect = lambda options: {
+            'functions': [
+                {**function, 'forecast': [2]}
+                for function in options['functions']
+            ],
+        }
+        cyclops.side_effect = lambda options: {'name': options['name']}
+
+        self.config.execution['monolith'] = True
+
+        with patch('xlibs.mutant.async_lambda.get_dispatcher') as dispatcher:
+            results = pipeline.StreamPipeline(config=self.config).run(
+                functions=self.functions,
+            )
+
+        dispatcher.assert_not_called()
+
+        # Flows are combined into a single Wolverine and Jean invocation
+        self.assertEqual(wolverine.call_count, 1)
+        self.assertEqual(jean.call_count, 1)
+        self.assertEqual(len(results['warm_results']), 4)
+        self.assertEqual(cyclops.call_count, 4)
+        self.assertEqual(cyclops.call_args[1]['options']['warm_count'], 2)
+
+    def test_capacity_limiter(self):
+        '''Test reserving capacity beyond the limit'''
+        async def reserve():
+            limiter = pipeline.CapacityLimiter(capacity=5)
+            reserved = await limiter.acquire(8)
+            self.assertEqual(limiter.in_use, 5)
+            await limiter.release(reserved)
+            self.assertEqual(limiter.in_use, 0)
+
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(reserve())
+        loop.close()
+
+
+@patch(
+    'xlibs.professor.queue_pipeline.storage.get_storage',
+    new=lambda: storage.MemoryStorage(),
+)
+@patch(
+    'xlibs.professor.queue_pipeline.queues.get_queue',
+    new=lambda name, backend: queues.MemoryQueue(),
+)
+class TestQueuePipeline(unittest.TestCase):
+    '''Test the queue-decoupled warming pipeline'''
+
+    def setUp(self):
+        self.config = XLambdaConfig(
+            action='warm_up',
+            options={
+                'lambda_functions': [
+                    {'name': name}
+                    for name in ['cable', 'domino', 'deadpool', 'colossus']
+                ],
+                'execution': {
+                    'mode': 'queue',
+                    'queue': {'workers': 2, 'retry_delay': 0},
+                },
+            },
+        )
+        self.functions = start_warming.prepare_functions(config=self.config)
+        self.calls = []
+
+    def get_metrics(self, functions):
+        self.calls.append(('wolverine', [f['name'] for f in functions]))
+
+        # Deadpool always fails, Domino fails on the first attempt only
+        return [
+            {**f, 'metrics': {}}
+            for f in functions
+            if f['name'] != 'deadpool' and (
+                f['name'] != 'domino' or
+                len([c for c in self.calls if 'domino' in c[1]]) > 1)
+        ]
+
+    def forecast(self, functions_metrics, timeframe):
+        return [{**f, 'forecast': [2]} for f in functions_metrics]
+
+    async def burn_function(self, function):
+        self.calls.append(('cyclops', [function['name']]))
+
+        return {**function, 'warm_results': []}
+
+    def build_pipeline(self) -> queue_pipeline.QueuePipeline:
+        queued = queue_pipeline.QueuePipeline(config=self.config)
+
+        queued.wolverine.get_metrics = self.get_metrics
+        queued.jean.forecast = self.forecast
+        queued.cyclops.burn_function = self.burn_function
+
+        return queued
+
+    def test_run(self):
+        '''Test processing jobs through all stages with retries'''
+        results = self.build_pipeline().run(functions=self.functions)
+
+        self.assertEqual(results['enqueued'], 4)
+        self.assertEqual(
+            sorted(f['name'] for f in results['warm_results']),
+            ['cable', 'colossus', 'domino'],
+        )
+
+        self.assertEqual(len(results['errors']), 1)
+        self.assertEqual(results['errors'][0]['stage'], 'wolverine')
+        self.assertEqual(
+            results['errors'][0]['attempts'],
+            constants.DEFAULT_EXECUTION['queue']['max_attempts'],
+        )
+
+        self.assertEqual(
+            len([c for c in self.calls if 'deadpool' in c[1]]),
+            constants.DEFAULT_EXECUTION['queue']['max_attempts'],
+        )
+
+    def test_idempotency(self):
+        '''Test that duplicate deliveries are not warmed twice'''
+        queued = self.build_pipeline()
+        queued.enqueue(functions=self.functions[:1])
+
+        # The same job is delivered twice (e.g. standard SQS queue)
+        message = queued.queues['wolverine'].receive()[0]
+        queued.queues['wolverine'].release(message)
+        queued.queues['wolverine'].send(message.body)
+
+        queued.drain()
+
+        warmed = [c for c in self.calls if c[0] == 'cyclops']
+        self.assertEqual(warmed, [('cyclops', ['cable'])])
+
+    def test_enqueue_only(self):
+        '''Test leaving jobs to external workers'''
+        self.config.execution['queue']['workers'] = 0
+        queued = self.build_pipeline()
+
+        results = queued.run(functions=self.functions)
+
+        self.assertEqual(results, {'enqueued': 4})
+        self.assertEqual(queued.queues['wolverine'].size(), 4)
+        self.assertEqual(self.calls, [])
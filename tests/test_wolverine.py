@@ -1,7 +1,41 @@
 '''Test Wolverine'''
+import datetime
+from typing import Dict
 import unittest
+from unittest.mock import patch
 
-from xlibs.wolverine import utils
+from xlibs import storage
+from xlibs.wolverine import (
+    aws_api_wrapper,
+    constants,
+    metrics_cache,
+    settings_cache,
+    startup_tracker,
+    utils,
+)
+
+
+def metric_data_response(*, results, next_token=None):
+    '''Build a dummy GetMetricData response'''
+    response = {
+        'ResponseMetadata': {'HTTPStatusCode': 200},
+        'MetricDataResults': [
+            {
+                'Id': query_id,
+                'Timestamps': [
+                    datetime.datetime(2019, 7, 1, 0, 5 * i)
+                    for i in range(len(values))
+                ],
+                'Values': values,
+            }
+            for query_id, values in results.items()
+        ],
+    }
+
+    if next_token:
+        response['NextToken'] = next_token
+
+    return response
 
 
 class TestWolverineUtils(unittest.TestCase):
@@ -51,3 +85,414 @@ class TestWolverineUtils(unittest.TestCase):
                     memory_size=int(memory_size),
                 )
                 self.assertEqual(estimate, expected)
+
+    @patch('xlibs.wolverine.aws_api_wrapper.get_client')
+    def test_get_metric_data_batched(self, get_client):
+        '''Test packing of metric queries and NextToken pagination'''
+        client = get_client()
+        client.get_metric_data.side_effect = [
+            metric_data_response(
+                results={'f0': [1.0, 2.0], 'f1': [3.0]},
+                next_token='page-2',
+            ),
+            metric_data_response(results={'f0': [4.0], 'f1': [5.0, 6.0]}),
+        ]
+
+        now = datetime.datetime.utcnow()
+
+        status, metrics = aws_api_wrapper.get_metric_data(
+            function_names=['cyclops', 'storm'],
+            region_name='us-east-1',
+            period=constants.METRICS_TIME_PERIOD,
+            start_time=now - datetime.timedelta(days=1),
+            end_time=now,
+        )
+
+        self.assertEqual(status, 200)
+        self.assertEqual(client.get_metric_data.call_count, 2)
+
+        first_call, second_call = client.get_metric_data.call_args_list
+        self.assertEqual(len(first_call[1]['MetricDataQueries']), 2)
+        self.assertNotIn('NextToken', first_call[1])
+        self.assertEqual(second_call[1]['NextToken'], 'page-2')
+
+        self.assertEqual(
+            [metric['value'] for metric in metrics['cyclops']],
+            [1, 2, 4],
+        )
+        self.assertEqual(
+            [metric['value'] for metric in metrics['storm']],
+            [3, 5, 6],
+        )
+
+    @patch('xlibs.wolverine.aws_api_wrapper.get_client')
+    def test_get_metric_data_query_limit(self, get_client):
+        '''Test splitting of metric queries across multiple requests'''
+        client = get_client()
+        client.get_metric_data.return_value = metric_data_response(results={})
+
+        function_names = [
+            f'mutant-{i}'
+            for i in range(constants.METRICS_MAX_QUERIES_PER_REQUEST + 1)
+        ]
+
+        now = datetime.datetime.utcnow()
+
+        status, metrics = aws_api_wrapper.get_metric_data(
+            function_names=function_names,
+            region_name='us-east-1',
+            period=constants.METRICS_TIME_PERIOD,
+            start_time=now - datetime.timedelta(days=1),
+            end_time=now,
+        )
+
+        self.assertEqual(client.get_metric_data.call_count, 2)
+        self.assertEqual(set(metrics.keys()), set(function_names))
+
+    @patch('xlibs.wolverine.utils.get_function_settings')
+    @patch('xlibs.wolverine.utils.get_metrics')
+    def test_get_lambdas_info(self, get_metrics, get_function_settings):
+        '''Test retrieving info about multiple functions'''
+        get_metrics.side_effect = lambda function_names, region: {
+            name: {'start': 1561939200, 'period': 300, 'values': [len(name)]}
+            for name in function_names
+        }
+        get_function_settings.side_effect = [
+            {'runtime': 'python'},
+            Exception('Function not found'),
+            {'runtime': 'nodejs'},
+        ]
+
+        functions = [
+            {'name': 'rogue', 'region': 'us-east-1'},
+            {'name': 'gambit', 'region': 'us-east-1'},
+            {'name': 'beast', 'region': 'eu-west-1'},
+        ]
+
+        results, errors = utils.get_lambdas_info(functions=functions)
+
+        self.assertEqual(get_metrics.call_count, 2)
+        self.assertEqual([f['name'] for f in results], ['rogue', 'beast'])
+        self.assertEqual(results[0]['metrics']['values'], [5])
+        self.assertEqual(results[1]['settings'], {'runtime': 'nodejs'})
+        self.assertEqual(results[1]['recent_concurrency']['values'], [5])
+
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(errors[0]['name'], 'gambit')
+        self.assertEqual(errors[0]['error']['type'], 'Exception')
+
+    def test_get_recent_concurrency(self):
+        '''Test getting the peak concurrency of the latest periods'''
+        metrics = {'start': 0, 'period': 300, 'values': [9, 1, 4, 2]}
+        count = constants.RECENT_CONCURRENCY_PERIODS
+
+        self.assertEqual(
+            utils.get_recent_concurrency(metrics=metrics),
+            {
+                'start': (4 - count) * 300,
+                'period': 300,
+                'values': metrics['values'][-count:],
+            },
+        )
+        self.assertEqual(
+            utils.get_recent_concurrency(metrics={**metrics, 'values': []}),
+            {'start': 0, 'period': 300, 'values': []},
+        )
+
+
+class TestMetricsCache(unittest.TestCase):
+    '''Test the incremental metrics cache'''
+
+    def setUp(self):
+        self.cache = metrics_cache.MetricsCache(
+            backend=storage.SQLiteStorage(path=':memory:'),
+        )
+        self.period = constants.METRICS_TIME_PERIOD
+
+    def test_align_time(self):
+        '''Test alignment of timestamps to period boundaries'''
+        self.assertEqual(
+            metrics_cache.align_time(timestamp=1562000123.5, period=300),
+            1562000100,
+        )
+
+    def test_merge(self):
+        '''Test merging of new datapoints into a cached series'''
+        entry = {
+            'period': self.period,
+            'fetched_until': 1200,
+            'series': {'0': 1, '300': 2, '600': 3, '900': 4},
+        }
+
+        merged = self.cache.merge(
+            entry=entry,
+            metrics=[
+                {'timestamp': utils.epoch_to_datetime(timestamp=900),
+                 'value': 7},
+                {'timestamp': utils.epoch_to_datetime(timestamp=1200),
+                 'value': 5},
+            ],
+            window_start=300,
+            fetched_until=1200,
+        )
+
+        self.assertEqual(
+            merged['series'],
+            {'300': 2, '600': 3, '900': 7, '1200': 5},
+        )
+        self.assertEqual(list(merged['series'].keys())[-1], '1200')
+
+    @patch('xlibs.wolverine.utils.aws_api_wrapper.get_metric_data')
+    def test_get_metrics_incremental(self, get_metric_data):
+        '''Test that only the missing tail is retrieved from CloudWatch'''
+        get_metric_data.return_value = (200, {'magneto': [], 'mystique': []})
+
+        utils.get_metrics(
+            function_names=['magneto', 'mystique'],
+            region='us-east-1',
+            cache=self.cache,
+        )
+
+        self.assertEqual(get_metric_data.call_count, 1)
+
+        first_start = get_metric_data.call_args[1]['start_time']
+        first_end = get_metric_data.call_args[1]['end_time']
+
+        self.assertEqual(first_start.timestamp() % self.period, 0)
+        self.assertEqual(first_end.timestamp() % self.period, 0)
+        self.assertEqual(
+            first_end - first_start,
+            datetime.timedelta(
+                days=constants.METRICS_DAYS_AGO,
+                seconds=self.period,
+            ),
+        )
+
+        get_metric_data.return_value = (200, {'magneto': [], 'mystique': []})
+
+        utils.get_metrics(
+            function_names=['magneto', 'mystique'],
+            region='us-east-1',
+            cache=self.cache,
+        )
+
+        self.assertEqual(get_metric_data.call_count, 2)
+        self.assertEqual(
+            get_metric_data.call_args[1]['function_names'],
+            ['magneto', 'mystique'],
+        )
+
+        second_start = get_metric_data.call_args[1]['start_time']
+        refresh = constants.METRICS_CACHE_REFRESH_PERIODS * self.period
+
+        self.assertLessEqual(
+            first_end - second_start,
+            datetime.timedelta(seconds=refresh + 2 * self.period),
+        )
+
+    @patch('xlibs.wolverine.utils.aws_api_wrapper.get_metric_data')
+    def test_get_metrics_columnar(self, get_metric_data):
+        '''Test that metrics are returned as dense columnar series'''
+        now = datetime.datetime.now(tz=datetime.timezone.utc).timestamp()
+        current_bucket = metrics_cache.align_time(
+            timestamp=now,
+            period=self.period,
+        )
+
+        get_metric_data.return_value = (200, {'storm': [
+            {'timestamp': utils.epoch_to_datetime(
+                timestamp=current_bucket - 3 * self.period), 'value': 6.0},
+            {'timestamp': utils.epoch_to_datetime(
+                timestamp=current_bucket - self.period), 'value': 2.0},
+        ]})
+
+        metrics = utils.get_metrics(
+            function_names=['storm'],
+            region='us-east-1',
+            cache=self.cache,
+        )['storm']
+
+        self.assertEqual(metrics['period'], self.period)
+        self.assertEqual(
+            metrics['start'],
+            current_bucket - constants.METRICS_DAYS_AGO * 86400,
+        )
+        self.assertEqual(
+            len(metrics['values']),
+            constants.METRICS_DAYS_AGO * 86400 // self.period,
+        )
+        self.assertEqual(metrics['values'][-3:], [6, 0, 2])
+
+
+def raw_settings(*, memory_size: int = 512, code_sha256: str = 'abc') -> Dict:
+    '''Build dummy settings as returned by GetFunctionConfiguration'''
+    return {
+        'Runtime': 'python3.7',
+        'MemorySize': memory_size,
+        'Timeout': 30,
+        'VpcConfig': {'VpcId': ''},
+        'CodeSha256': code_sha256,
+        'LastModified': '2019-07-01T00:00:00.000+0000',
+    }
+
+
+class TestSettingsCache(unittest.TestCase):
+    '''Test the TTL cache of Lambda settings'''
+
+    def setUp(self):
+        self.now = 1000000.0
+        self.cache = settings_cache.SettingsCache(
+            backend=storage.MemoryStorage(),
+            ttl=600,
+            clock=lambda: self.now,
+        )
+        self.tracker = startup_tracker.StartupTracker(
+            backend=storage.MemoryStorage(),
+            clock=lambda: self.now,
+        )
+
+    def get_settings(self):
+        return utils.get_function_settings(
+            function_name='colossus',
+            region='us-east-1',
+            cache=self.cache,
+            tracker=self.tracker,
+        )
+
+    @patch('xlibs.wolverine.utils.format_settings')
+    @patch('xlibs.wolverine.utils.aws_api_wrapper.get_settings')
+    def test_cache_hit(self, get_settings, format_settings):
+        '''Test that fresh settings are served without API calls'''
+        get_settings.return_value = (200, raw_settings())
+        format_settings.return_value = {'memory_size': 512}
+
+        self.assertEqual(self.get_settings(), {'memory_size': 512})
+        self.now += 300
+        self.assertEqual(self.get_settings(), {'memory_size': 512})
+
+        self.assertEqual(get_settings.call_count, 1)
+        self.assertEqual(format_settings.call_count, 1)
+
+    @patch('xlibs.wolverine.utils.format_settings')
+    @patch('xlibs.wolverine.utils.aws_api_wrapper.get_settings')
+    def test_revalidation(self, get_settings, format_settings):
+        '''Test revalidation of expired settings'''
+        get_settings.return_value = (200, raw_settings())
+        format_settings.return_value = {'memory_size': 512}
+
+        self.get_settings()
+
+        # Expired but unchanged: settings are not formatted again
+        self.now += 1000
+        self.get_settings()
+
+        self.assertEqual(get_settings.call_count, 2)
+        self.assertEqual(format_settings.call_count, 1)
+
+        # Expired and changed: settings are formatted again
+        self.now += 1000
+        get_settings.return_value = (200, raw_settings(code_sha256='xyz'))
+        format_settings.return_value = {'memory_size': 1024}
+
+        self.assertEqual(self.get_settings(), {'memory_size': 1024})
+        self.assertEqual(format_settings.call_count, 2)
+
+    @patch('xlibs.wolverine.utils.aws_api_wrapper.get_settings')
+    def test_observed_startup_time(self, get_settings):
+        '''Test that observed startup times prevail over the regression'''
+        get_settings.return_value = (200, raw_settings())
+
+        estimated = self.get_settings()['startup_time']
+
+        self.tracker.record(
+            function_name='colossus',
+            region='us-east-1',
+            durations=[210.2, 190.0, 250.7, 205.1, 230.4],
+        )
+
+        # Fresh cached settings keep the startup time cached with them,
+        # without looking samples up
+        with patch.object(self.tracker, 'estimate') as estimate:
+            self.assertEqual(self.get_settings()['startup_time'], estimated)
+
+        estimate.assert_not_called()
+
+        # Samples are looked up again on revalidation
+        self.now += 1000
+
+        self.assertEqual(self.get_settings()['startup_time'], 251)
+        self.assertEqual(self.get_settings()['startup_time'], 251)
+        self.assertEqual(get_settings.call_count, 2)
+
+        # Falls back to the regression once samples are too old
+        self.now += constants.STARTUP_SAMPLES_MAX_AGE + 1
+
+        self.assertEqual(self.get_settings()['startup_time'], estimated)
+
+    @patch('xlibs.wolverine.utils.aws_api_wrapper.get_settings')
+    def test_invalidate(self, get_settings):
+        '''Test explicit invalidation of cached settings'''
+        get_settings.return_value = (200, raw_settings())
+
+        self.get_settings()
+        self.cache.invalidate(function_name='colossus', region='us-east-1')
+        self.get_settings()
+
+        self.assertEqual(get_settings.call_count, 2)
+
+
+class TestStartupTracker(unittest.TestCase):
+    '''Test startup times learned from observed Init Durations'''
+
+    def setUp(self):
+        self.now = 1000000.0
+        self.tracker = startup_tracker.StartupTracker(
+            backend=storage.MemoryStorage(),
+            clock=lambda: self.now,
+        )
+        self.function = {'function_name': 'magik', 'region': 'us-east-1'}
+
+    def test_percentile(self):
+        '''Test percentiles with the nearest-rank method'''
+        values = [15, 20, 35, 40, 50]
+
+        self.assertEqual(startup_tracker.percentile(values=values,
+                                                    percent=30), 20)
+        self.assertEqual(startup_tracker.percentile(values=values,
+                                                    percent=100), 50)
+        self.assertEqual(startup_tracker.percentile(values=values,
+                                                    percent=0), 15)
+
+    def test_estimate(self):
+        '''Test estimating only with enough recent samples'''
+        durations = [300.0] * 18 + [320.5, 4000.0]
+
+        self.tracker.record(**self.function, durations=durations[:4])
+        self.assertIsNone(self.tracker.estimate(**self.function))
+
+        self.tracker.record(**self.function, durations=durations[4:])
+
+        # A single outlier doesn't drive the estimate
+        self.assertEqual(self.tracker.estimate(**self.function), 300)
+
+    def test_samples_bounds(self):
+        '''Test that only the most recent samples are kept'''
+        self.tracker.record(**self.function, durations=[100.0] * 10)
+
+        self.now += constants.STARTUP_SAMPLES_MAX_AGE / 2
+        self.tracker.record(
+            **self.function,
+            durations=[200.0] * constants.STARTUP_SAMPLES_MAX,
+        )
+
+        entry = self.tracker.load(**self.function)
+
+        self.assertEqual(
+            len(entry['samples']),
+            constants.STARTUP_SAMPLES_MAX,
+        )
+        self.assertEqual(self.tracker.estimate(**self.function), 200)
+
+        # Samples expire after the max age
+        self.now += constants.STARTUP_SAMPLES_MAX_AGE + 1
+        self.assertIsNone(self.tracker.estimate(**self.function))
@@ -1,9 +1,34 @@
 '''Test xlibs'''
+import asyncio
+import datetime
+import json
+import tempfile
 from typing import Dict
 import unittest
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 
-from xlibs import constants, mutant, utils
+from aiohttp import web
+from botocore import auth, awsrequest
+from botocore.credentials import ReadOnlyCredentials
+from botocore.exceptions import ClientError
+from botocore.stub import Stubber
+
+from xlibs import (
+    async_lambda,
+    aws_clients,
+    exc,
+    mutant,
+    queues,
+    rate_limiter,
+    response,
+    sigv4,
+    storage,
+    telemetry,
+    timeseries,
+    utils,
+)
+from xlibs.cyclops import constants as cyclops_constants
+from xlibs.professor import constants
 from xlibs.response import build
 
 
@@ -60,6 +85,45 @@ class TestResponse(unittest.TestCase):
         self.assertEqual(r['error'], error)
         self.assertEqual(r['original_request'], original_request)
 
+    def test_shape(self):
+        '''Test keeping only the fields the next stage needs'''
+        self.assertEqual(
+            response.shape(
+                data={'name': 'cypher', 'metrics': {}, 'forecast': [1]},
+                fields=['name', 'region', 'forecast'],
+            ),
+            {'name': 'cypher', 'forecast': [1]},
+        )
+
+    def test_build_error(self):
+        '''Test error responses with bounded detail and opt-in echo'''
+        event = {'name': 'mimic', 'metrics': {'values': [1] * 1000}}
+
+        try:
+            raise ValueError('x' * 10000)
+
+        except ValueError as error:
+            r = response.build_error(error=error, event=event)
+            echoed = response.build_error(
+                error=error,
+                event={**event, 'echo_request': True},
+            )
+
+        self.assertEqual(r['status'], 500)
+        self.assertIsNone(r['original_request'])
+        self.assertEqual(r['error']['type'], 'ValueError')
+        self.assertLessEqual(
+            len(r['error']['description']),
+            constants.RESPONSE_MAX_DESCRIPTION + 3,
+        )
+        self.assertLessEqual(
+            len(r['error']['trace']),
+            constants.RESPONSE_MAX_TRACE + 3,
+        )
+        self.assertTrue(r['error']['trace'].endswith('x' * 100 + '\n'))
+
+        self.assertEqual(echoed['original_request']['name'], 'mimic')
+
 
 class TestUtils(unittest.TestCase):
     '''Test utility functions'''
@@ -85,6 +149,127 @@ class TestUtils(unittest.TestCase):
             Key='Xavier School',
         )
 
+    @patch('xlibs.aws_clients.boto3')
+    def test_get_client(self, boto3):
+        '''Test reuse of pooled boto3 clients'''
+        aws_clients.reset()
+
+        session = boto3.session.Session()
+        session.client.side_effect = lambda service, **kwargs: MagicMock()
+
+        client = aws_clients.get_client(service='lambda', region='us-east-1')
+
+        self.assertIs(
+            client,
+            aws_clients.get_client(service='lambda', region='us-east-1'),
+        )
+        self.assertIsNot(
+            client,
+            aws_clients.get_client(service='lambda', region='eu-west-1'),
+        )
+        self.assertEqual(session.client.call_count, 2)
+
+        config = session.client.call_args[1]['config']
+        self.assertEqual(
+            config.max_pool_connections,
+            constants.AWS_MAX_POOL_CONNECTIONS,
+        )
+
+        aws_clients.reset()
+
+    def test_get_client_rate_limited(self):
+        '''Test that rate-limited clients leave retries to the limiter'''
+        aws_clients.reset()
+
+        client = aws_clients.get_client(
+            service='lambda',
+            region='us-east-1',
+            rate_limited=True,
+        )
+
+        self.assertIsNot(
+            client,
+            aws_clients.get_client(service='lambda', region='us-east-1'),
+        )
+
+        # Recent botocore versions count the first attempt in the total
+        retries = client.meta.config.retries
+        self.assertEqual(
+            retries.get('total_max_attempts', retries.get('max_attempts', 0)
+                        + 1),
+            1,
+        )
+
+        limiter = rate_limiter.RateLimiter(rate=10, sleep=lambda _: None)
+
+        with Stubber(client) as stubber:
+            stubber.add_client_error(
+                'get_function_configuration',
+                service_error_code='ThrottlingException',
+                http_status_code=429,
+            )
+            stubber.add_response(
+                'get_function_configuration',
+                {'FunctionName': 'storm'},
+            )
+
+            response = limiter.call(
+                client.get_function_configuration,
+                FunctionName='storm',
+            )
+
+        self.assertEqual(response['FunctionName'], 'storm')
+        self.assertEqual(limiter.throttles, 1)
+        self.assertEqual(limiter.retries, 1)
+
+        aws_clients.reset()
+
+    @patch('xlibs.utils.get_client')
+    def test_invoke_lambda(self, get_client):
+        '''Test invoking a Lambda with a pooled client'''
+        get_client().invoke.return_value = {
+            'Payload': MagicMock(read=MagicMock(return_value=b'{"x": 1}')),
+        }
+
+        response = utils.invoke_lambda(
+            function='cerebro',
+            region='eu-west-1',
+            invocation_type='RequestResponse',
+            payload={'find': 'mutants'},
+        )
+
+        get_client.assert_called_with(service='lambda', region='eu-west-1')
+        self.assertEqual(response['Payload'], {'x': 1})
+
+    def test_get_forecast_peak(self):
+        '''Test peak demand of forecasts with and without upper bounds'''
+        self.assertEqual(utils.get_forecast_peak(forecast=[4, 15, 2]), 15)
+        self.assertEqual(
+            utils.get_forecast_peak(forecast=[
+                {'point': 4, 'upper': 6},
+                {'point': 5, 'upper': 9},
+            ]),
+            9,
+        )
+
+    def test_get_warm_count(self):
+        '''Test bounding the forecast peak with the function scaling'''
+        function = {
+            'forecast': [{'point': 6, 'upper': 8}],
+            'scaling': {'min_containers': 1, 'max_containers': 10},
+        }
+
+        self.assertEqual(utils.get_warm_count(function=function), 8)
+
+        function['scaling']['max_concurrency'] = 5
+        self.assertEqual(utils.get_warm_count(function=function), 5)
+
+        function['scaling']['max_containers'] = 4
+        self.assertEqual(utils.get_warm_count(function=function), 4)
+
+        function['scaling'].update(min_containers=12, max_containers=20)
+        self.assertEqual(utils.get_warm_count(function=function), 5)
+
     def test_get_function_name(self):
         '''Test script that gets a function name from serverless.yml'''
         function_name = utils.get_function_name(function='wolverine')
@@ -92,6 +277,748 @@ class TestUtils(unittest.TestCase):
         self.assertEqual(function_name, f'xlambda-wolverine-{constants.STAGE}')
 
 
+class TestStorage(unittest.TestCase):
+    '''Test key-value storage backends'''
+
+    def check_backend(self, backend: storage.Storage):
+        self.assertIsNone(backend.get('phoenix'))
+
+        backend.put('phoenix', {'name': 'Jean Grey', 'powers': [1, 2]})
+        self.assertEqual(
+            backend.get('phoenix'),
+            {'name': 'Jean Grey', 'powers': [1, 2]},
+        )
+
+        backend.put('phoenix', {'name': 'Dark Phoenix'})
+        self.assertEqual(backend.get('phoenix'), {'name': 'Dark Phoenix'})
+
+        backend.delete('phoenix')
+        self.assertIsNone(backend.get('phoenix'))
+
+    def test_memory_storage(self):
+        self.check_backend(storage.MemoryStorage())
+
+    def test_file_storage(self):
+        with tempfile.TemporaryDirectory() as path:
+            self.check_backend(storage.FileStorage(path=path))
+
+    def test_sqlite_storage(self):
+        self.check_backend(storage.SQLiteStorage(path=':memory:'))
+
+    def test_get_storage(self):
+        '''Test reuse of storage instances and unknown backends'''
+        self.assertIs(
+            storage.get_storage(backend='memory'),
+            storage.get_storage(backend='memory'),
+        )
+
+        self.assertRaises(
+            exc.XLambdaExceptionInvalidStorageBackend,
+            storage.get_storage,
+            backend='cerebro',
+        )
+
+
+class TestTimeseries(unittest.TestCase):
+    '''Test the columnar format of metric series'''
+
+    def test_from_points(self):
+        '''Test filling gaps between sparse datapoints'''
+        metrics = timeseries.from_points(
+            points={'600': 3.0, '1500': 1, '3000': 9},
+            period=300,
+            start=300,
+            end=1800,
+        )
+
+        self.assertEqual(
+            metrics,
+            {'start': 300, 'period': 300, 'values': [0, 3, 0, 0, 1, 0]},
+        )
+        self.assertEqual(
+            timeseries.get_observations(metrics)[:2],
+            [(300, 0.0), (600, 3.0)],
+        )
+
+    def test_packed(self):
+        '''Test packing values into a base64 string'''
+        values = [0, 7, 2 ** 20, 1]
+        metrics = timeseries.from_points(
+            points={str(i * 60): value for i, value in enumerate(values)},
+            period=60,
+            start=0,
+            end=180,
+            packed=True,
+        )
+
+        self.assertNotIn('values', metrics)
+        self.assertIsInstance(metrics['packed'], str)
+        self.assertEqual(timeseries.get_values(metrics), values)
+
+    def test_legacy(self):
+        '''Test reading series in the legacy datetime-keyed format'''
+        metrics = {'2019-07-01 00:00:00': 2, '2019-07-01 00:05:00': 4}
+
+        self.assertFalse(timeseries.is_columnar(metrics))
+        self.assertEqual(timeseries.get_values(metrics), [2.0, 4.0])
+        self.assertEqual(
+            timeseries.get_observations(metrics)[1],
+            ('2019-07-01 00:05:00', 4.0),
+        )
+
+
+class FakeClock():
+    '''Clock that only moves forward when sleeping'''
+
+    def __init__(self):
+        self.now = 0.0
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class TestQueues(unittest.TestCase):
+    '''Test work queue backends'''
+
+    def check_backend(self, queue: queues.Queue, clock: FakeClock):
+        self.assertTrue(queue.send({'mutant': 'storm'}, dedup_key='storm'))
+        self.assertFalse(queue.send({'mutant': 'storm'}, dedup_key='storm'))
+        self.assertTrue(queue.send({'mutant': 'rogue'}))
+        self.assertEqual(queue.size(), 2)
+
+        messages = queue.receive(max_messages=1, visibility_timeout=60)
+        self.assertEqual(len(messages), 1)
+        self.assertEqual(messages[0].body, {'mutant': 'storm'})
+        self.assertEqual(messages[0].attempts, 1)
+
+        # Received messages are invisible until the timeout expires
+        messages = queue.receive(visibility_timeout=60)
+        self.assertEqual([m.body for m in messages], [{'mutant': 'rogue'}])
+        self.assertEqual(queue.receive(), [])
+
+        clock.sleep(61)
+        messages = queue.receive(visibility_timeout=60)
+        self.assertEqual(len(messages), 2)
+        self.assertEqual(messages[0].attempts, 2)
+
+        # Acknowledged messages are gone, released ones come back
+        queue.delete(messages[0])
+        queue.release(messages[1], delay=10)
+        self.assertEqual(queue.receive(), [])
+
+        clock.sleep(10)
+        messages = queue.receive()
+        self.assertEqual([m.body for m in messages], [{'mutant': 'rogue'}])
+
+        queue.delete(messages[0])
+        self.assertEqual(queue.size(), 0)
+
+        # Keys can be reused once a message is deleted
+        self.assertTrue(queue.send({'mutant': 'storm'}, dedup_key='storm'))
+
+    def test_memory_queue(self):
+        clock = FakeClock()
+        self.check_backend(queues.MemoryQueue(clock=clock.time), clock)
+
+    def test_sqlite_queue(self):
+        clock = FakeClock()
+        queue = queues.SQLiteQueue(
+            name='wolverine',
+            path=':memory:',
+            clock=clock.time,
+        )
+        self.check_backend(queue, clock)
+
+    def test_get_queue(self):
+        '''Test reuse of queue instances and unknown backends'''
+        self.assertIs(
+            queues.get_queue(name='jean', backend='memory'),
+            queues.get_queue(name='jean', backend='memory'),
+        )
+
+        self.assertRaises(
+            exc.XLambdaExceptionInvalidQueueBackend,
+            queues.get_queue,
+            name='jean',
+            backend='cerebro',
+        )
+
+
+@patch('xlibs.telemetry.write')
+class TestTelemetry(unittest.TestCase):
+    '''Test timing spans and their EMF records'''
+
+    def test_span(self, write):
+        '''Test nested spans and the EMF records they emit'''
+        with telemetry.span('run', action='warm_up') as run:
+            with telemetry.span('stage', stage='jean') as stage:
+                stage.describe(function='polaris')
+                stage.set(payload_bytes=1024)
+                telemetry.add(retries=1)
+                telemetry.add(retries=1)
+
+        self.assertIsNone(telemetry.current())
+        self.assertEqual(write.call_count, 2)
+
+        record = write.call_args_list[0][0][0]
+
+        self.assertEqual(record['Span'], 'stage')
+        self.assertEqual(record['Stage'], 'jean')
+        self.assertEqual(record['Function'], 'polaris')
+        self.assertEqual(record['Retries'], 2)
+        self.assertEqual(record['PayloadBytes'], 1024)
+        self.assertEqual(record['Parent'], 'run')
+        self.assertEqual(record['TraceId'], run.trace_id)
+        self.assertGreaterEqual(record['Duration'], 0)
+
+        emf = record['_aws']['CloudWatchMetrics'][0]
+
+        self.assertEqual(emf['Namespace'], constants.TELEMETRY_NAMESPACE)
+        self.assertEqual(emf['Dimensions'], [['Span', 'Stage']])
+        self.assertIn(
+            {'Name': 'PayloadBytes', 'Unit': 'Bytes'},
+            emf['Metrics'],
+        )
+
+        # The record is valid JSON, as written to the logs
+        json.dumps(record)
+
+    def test_span_error(self, write):
+        '''Test that spans are emitted with the error raised'''
+        with self.assertRaises(ValueError):
+            with telemetry.span('api', api='GetMetricData'):
+                raise ValueError('Sabretooth')
+
+        self.assertEqual(write.call_args[0][0]['Error'], 'ValueError')
+
+    def test_sampling(self, write):
+        '''Test that sampling is decided once for a whole trace'''
+        with patch('xlibs.telemetry.constants.TELEMETRY_SAMPLE_RATE', 0):
+            with telemetry.span('run'):
+                with telemetry.span('stage', stage='cyclops'):
+                    pass
+
+        write.assert_not_called()
+
+    def test_async_spans(self, write):
+        '''Test that spans started in asyncio tasks nest in their parent'''
+        async def invoke(name: str):
+            with telemetry.span('invoke') as span:
+                span.describe(function=name)
+                await asyncio.sleep(0)
+
+        async def run():
+            with telemetry.span('stage', stage='cyclops') as stage:
+                await asyncio.gather(invoke('pixie'), invoke('armor'))
+
+            return stage
+
+        stage = async_lambda.get_loop().run_until_complete(run())
+
+        records = [call[0][0] for call in write.call_args_list]
+
+        self.assertEqual(
+            [(r['Span'], r['Parent']) for r in records],
+            [('invoke', 'stage'), ('invoke', 'stage'), ('stage', None)],
+        )
+        self.assertEqual({r['TraceId'] for r in records}, {stage.trace_id})
+
+    def test_aggregate_leaves(self, write):
+        '''Test that leaf spans are emitted as one record per dimensions'''
+        with telemetry.span('fire', region='us-east-1'):
+            for i in range(constants.TELEMETRY_MAX_VALUES + 5):
+                with telemetry.span(
+                        'invoke',
+                        aggregate=True,
+                        region='us-east-1',
+                        ) as invoke:
+                    invoke.set(payload_bytes=i)
+
+        records = [call[0][0] for call in write.call_args_list]
+
+        self.assertEqual([r['Span'] for r in records], ['fire', 'invoke'])
+
+        leaves = records[1]
+
+        self.assertEqual(leaves['Spans'], constants.TELEMETRY_MAX_VALUES + 5)
+        self.assertEqual(leaves['Parent'], 'fire')
+        self.assertEqual(
+            len(leaves['PayloadBytes']),
+            constants.TELEMETRY_MAX_VALUES,
+        )
+        self.assertEqual(
+            len(leaves['Duration']),
+            constants.TELEMETRY_MAX_VALUES,
+        )
+
+    def test_trace_propagation(self, write):
+        '''Test that Mutant handlers continue the trace of the invoker'''
+        with telemetry.span('run') as run:
+            payload = mutant.Jean().traced({'functions': []})
+
+        self.assertEqual(
+            payload['trace'],
+            {'id': run.trace_id, 'sampled': True},
+        )
+
+        write.reset_mock()
+
+        # Sampling was decided by the invoker
+        with patch('xlibs.telemetry.constants.TELEMETRY_SAMPLE_RATE', 0):
+            with telemetry.span('handler', trace=payload['trace']):
+                pass
+
+        self.assertEqual(write.call_args[0][0]['TraceId'], run.trace_id)
+
+        with telemetry.span('handler', trace={'id': 'x', 'sampled': False}):
+            pass
+
+        self.assertEqual(write.call_count, 1)
+
+    def test_rate_limiter_retries(self, write):
+        '''Test that AWS API calls record their retries'''
+        clock = FakeClock()
+        limiter = rate_limiter.RateLimiter(
+            rate=10,
+            clock=clock.time,
+            sleep=clock.sleep,
+            api='GetFunctionConfiguration',
+            region='us-east-1',
+        )
+
+        limiter.call(MagicMock(side_effect=[throttling_error(), 'Kitty']))
+
+        record = write.call_args[0][0]
+
+        self.assertEqual(record['Api'], 'GetFunctionConfiguration')
+        self.assertEqual(record['Region'], 'us-east-1')
+        self.assertEqual(record['Retries'], 1)
+
+
+def throttling_error():
+    return ClientError(
+        {'Error': {'Code': 'ThrottlingException', 'Message': 'Slow down'}},
+        'GetMetricData',
+    )
+
+
+class TestRateLimiter(unittest.TestCase):
+    '''Test the client-side rate limiter'''
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.limiter = rate_limiter.RateLimiter(
+            rate=10,
+            clock=self.clock.time,
+            sleep=self.clock.sleep,
+        )
+
+    def test_acquire(self):
+        '''Test that requests beyond the burst size wait for tokens'''
+        for _ in range(30):
+            self.limiter.acquire()
+
+        self.assertEqual(self.limiter.waits, 20)
+        self.assertAlmostEqual(self.clock.now, 2.0)
+
+    def test_call_retries_throttles(self):
+        '''Test retries and AIMD rate decrease on throttling errors'''
+        func = MagicMock(side_effect=[
+            throttling_error(),
+            throttling_error(),
+            'Logan',
+        ])
+
+        self.assertEqual(self.limiter.call(func, name='wolverine'), 'Logan')
+
+        func.assert_called_with(name='wolverine')
+        self.assertEqual(self.limiter.throttles, 2)
+        self.assertEqual(self.limiter.retries, 2)
+        self.assertLess(self.limiter.rate, self.limiter.max_rate)
+
+        rate = self.limiter.rate
+        self.limiter.on_success()
+        self.assertGreater(self.limiter.rate, rate)
+
+    def test_call_gives_up(self):
+        '''Test that errors are raised once retries are exhausted'''
+        func = MagicMock(side_effect=throttling_error())
+
+        self.assertRaises(ClientError, self.limiter.call, func)
+        self.assertEqual(func.call_count, self.limiter.max_retries + 1)
+        self.assertEqual(self.limiter.rate, self.limiter.min_rate)
+
+    def test_call_other_errors(self):
+        '''Test that non-throttling errors are not retried'''
+        func = MagicMock(side_effect=ClientError(
+            {'Error': {'Code': 'ResourceNotFoundException'}},
+            'GetFunctionConfiguration',
+        ))
+
+        self.assertRaises(ClientError, self.limiter.call, func)
+        self.assertEqual(func.call_count, 1)
+        self.assertEqual(self.limiter.throttles, 0)
+
+    def test_get_rate_limiter(self):
+        '''Test sharing of limiters per API and region'''
+        limiter = rate_limiter.get_rate_limiter(
+            api='GetMetricData',
+            region='us-east-1',
+        )
+
+        self.assertIs(
+            limiter,
+            rate_limiter.get_rate_limiter(
+                api='GetMetricData',
+                region='us-east-1',
+            ),
+        )
+        self.assertIsNot(
+            limiter,
+            rate_limiter.get_rate_limiter(
+                api='GetMetricData',
+                region='eu-west-1',
+            ),
+        )
+        self.assertEqual(limiter.max_rate, 50)
+        self.assertIn('GetMetricData:us-east-1', rate_limiter.get_stats())
+
+
+class TestSigV4(unittest.TestCase):
+    '''Test signing of Lambda invocation requests'''
+
+    url = 'https://lambda.us-east-1.amazonaws.com/2015-03-31/functions/' \
+        'storm/invocations'
+    payload = {'xlambda': {'action': 'warm_up', 'settings': {}}}
+    now = datetime.datetime(2020, 1, 6, 12, 30, 15)
+
+    def botocore_headers(self, credentials):
+        request = awsrequest.AWSRequest(
+            method='POST',
+            url=self.url,
+            data=json.dumps(self.payload),
+        )
+
+        with patch('botocore.auth.get_current_datetime',
+                   return_value=self.now):
+            auth.SigV4Auth(credentials, 'lambda', 'us-east-1').add_auth(
+                request)
+
+        return dict(request.headers.items())
+
+    def test_sign_headers(self):
+        '''Test that signatures match the ones from botocore'''
+        for token in [None, 'forge-session-token']:
+            credentials = ReadOnlyCredentials(
+                'AKIAMAGNETO', 'cerebro-secret', token)
+
+            headers = sigv4.sign_headers(
+                url=self.url,
+                payload=sigv4.serialize(self.payload),
+                credentials=credentials,
+                now=self.now,
+            )
+
+            self.assertEqual(headers, self.botocore_headers(credentials))
+
+    def test_serialize_once(self):
+        '''Test that payloads are serialized and signed only once'''
+        payload = sigv4.serialize(self.payload)
+
+        self.assertIs(sigv4.serialize(payload), payload)
+        self.assertEqual(json.loads(payload.body), self.payload)
+
+        credentials = ReadOnlyCredentials('AKIAPSYLOCKE', 'secret', None)
+        sigv4.signing_key.cache_clear()
+
+        with patch('xlibs.sigv4.hmac.new', wraps=sigv4.hmac.new) as hmac:
+            first = sigv4.sign_headers(
+                url=self.url,
+                payload=payload,
+                credentials=credentials,
+                now=self.now,
+            )
+            calls = hmac.call_count
+
+            # Identical request within the same second reuses the headers
+            second = sigv4.sign_headers(
+                url=self.url,
+                payload=payload,
+                credentials=credentials,
+                now=self.now,
+            )
+            self.assertEqual(first, second)
+            self.assertIsNot(first, second)
+            self.assertEqual(hmac.call_count, calls)
+
+            # One second later, only the final signature is recomputed
+            sigv4.sign_headers(
+                url=self.url,
+                payload=payload,
+                credentials=credentials,
+                now=self.now + datetime.timedelta(seconds=1),
+            )
+            self.assertEqual(hmac.call_count, calls + 1)
+
+        self.assertEqual(sigv4.signing_key.cache_info().misses, 1)
+
+
+class DummyLambdaServer():
+    '''Local HTTP server mimicking the Lambda invoke endpoint'''
+
+    def __init__(self, delay: float = 0.01):
+        self.delay = delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.requests = []
+
+    async def invoke(self, request):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+        payload = await request.json()
+        self.requests.append((request.match_info['name'], payload))
+
+        await asyncio.sleep(self.delay)
+        self.in_flight -= 1
+
+        headers = {}
+
+        if request.headers.get('X-Amz-Log-Type') == 'Tail':
+            headers['X-Amz-Log-Result'] = 'UkVQT1JUIFJlcXVlc3RJZDogMQ=='
+
+        return web.json_response(
+            {'status': 200, 'data': payload},
+            headers=headers,
+        )
+
+    async def start(self) -> str:
+        app = web.Application()
+        app.router.add_post('/functions/{name}/invocations', self.invoke)
+
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+
+        port = self.runner.addresses[0][1]
+
+        return f'http://127.0.0.1:{port}/functions'
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+
+@patch('xlibs.async_lambda.sign_headers', return_value={})
+class TestAsyncLambda(unittest.TestCase):
+    '''Test asynchronous Lambda invocations'''
+
+    def setUp(self):
+        self.loop = async_lambda.get_loop()
+        self.server = DummyLambdaServer()
+        self.base_url = self.loop.run_until_complete(self.server.start())
+
+    def tearDown(self):
+        self.loop.run_until_complete(self.server.stop())
+
+    def test_dispatcher_concurrency(self, sign_headers):
+        '''Test that in-flight invocations stay within the limit'''
+        dispatcher = async_lambda.Dispatcher(
+            region='us-east-1',
+            concurrency=3,
+            base_url=self.base_url,
+        )
+
+        requests = (
+            {'function_name': 'angel', 'payload': {'i': i}}
+            for i in range(10)
+        )
+
+        responses = self.loop.run_until_complete(
+            dispatcher.gather(requests=requests),
+        )
+
+        self.assertEqual(len(responses), 10)
+        self.assertEqual(
+            sorted(r['data']['i'] for r in responses),
+            list(range(10)),
+        )
+        self.assertEqual(self.server.max_in_flight, 3)
+
+        # The HTTP session is reused across batches
+        session = dispatcher._sessions[self.loop]
+
+        self.loop.run_until_complete(dispatcher.gather(requests=[
+            {'function_name': 'angel', 'payload': {'i': 10}},
+        ]))
+
+        self.assertIs(session, dispatcher._sessions[self.loop])
+        self.loop.run_until_complete(dispatcher.close())
+
+    def test_dispatcher_log_tail(self, sign_headers):
+        '''Test returning the tail of execution logs with the payload'''
+        dispatcher = async_lambda.Dispatcher(
+            region='us-east-1',
+            base_url=self.base_url,
+        )
+
+        responses = self.loop.run_until_complete(dispatcher.gather(requests=[
+            {'function_name': 'angel', 'payload': {'i': 0}},
+            {'function_name': 'angel', 'payload': {'i': 1},
+             'log_type': 'Tail'},
+        ]))
+
+        tailed = [r for r in responses if 'LogResult' in r]
+
+        self.assertEqual(len(tailed), 1)
+        self.assertEqual(tailed[0]['Payload']['data'], {'i': 1})
+        self.assertEqual(
+            utils.decode_log_result(log_result=tailed[0]['LogResult']),
+            'REPORT RequestId: 1',
+        )
+        self.loop.run_until_complete(dispatcher.close())
+
+    def test_dispatcher_burst(self, sign_headers):
+        '''Test releasing all requests of a burst together'''
+        dispatcher = async_lambda.Dispatcher(
+            region='us-east-1',
+            concurrency=5,
+            base_url=self.base_url,
+        )
+
+        responses, report = self.loop.run_until_complete(dispatcher.burst(
+            requests=[
+                {'function_name': 'angel', 'payload': {'i': i}}
+                for i in range(5)
+            ],
+        ))
+
+        self.assertEqual([r['data']['i'] for r in responses], list(range(5)))
+        self.assertEqual(self.server.max_in_flight, 5)
+        self.assertEqual(report['requests'], 5)
+        self.assertEqual(report['connections'], 5)
+        self.assertEqual(report['released'], 5)
+        self.assertGreaterEqual(report['send_spread'], 0)
+
+        # Requests beyond the concurrency limit follow as slots free up,
+        # outside of the burst
+        self.server.max_in_flight = 0
+
+        with self.assertLogs('xlibs.async_lambda', level='WARNING'):
+            responses, report = self.loop.run_until_complete(
+                dispatcher.burst(requests=[
+                    {'function_name': 'angel', 'payload': {'i': i}}
+                    for i in range(8)
+                ]),
+            )
+
+        self.assertEqual(len(responses), 8)
+        self.assertEqual(self.server.max_in_flight, 5)
+        self.assertEqual(report['connections'], 5)
+        self.assertEqual(report['released'], 5)
+
+        # The burst is released as it is when it can't fill up
+        async def burst_with_slot_taken():
+            _, semaphore = dispatcher.session()
+
+            async with semaphore:
+                return await dispatcher.burst(requests=[
+                    {'function_name': 'angel', 'payload': {'i': i}}
+                    for i in range(5)
+                ])
+
+        with patch.object(async_lambda.constants,
+                          'DISPATCHER_BURST_READY_TIMEOUT', 0.01):
+            responses, report = self.loop.run_until_complete(
+                burst_with_slot_taken(),
+            )
+
+        self.assertEqual(len(responses), 5)
+        self.assertEqual(report['released'], 4)
+        self.loop.run_until_complete(dispatcher.close())
+
+    def test_invoke_all(self, sign_headers):
+        '''Test invoking functions through the shared dispatchers'''
+        dispatcher = async_lambda.get_dispatcher(region='us-east-1')
+        base_url = dispatcher.base_url
+        dispatcher.base_url = self.base_url
+
+        responses = async_lambda.invoke_all(
+            requests=[
+                {'function_name': 'bishop', 'payload': {'i': i}}
+                for i in range(5)
+            ],
+            region='us-east-1',
+        )
+
+        self.assertEqual(len(responses), 5)
+        self.assertEqual(len(self.server.requests), 5)
+        self.assertEqual(self.server.requests[0][0], 'bishop')
+        self.assertIs(
+            async_lambda.get_dispatcher(region='us-east-1'),
+            dispatcher,
+        )
+
+        # Worker threads use their own loop while this one is running
+        def invoke():
+            try:
+                return async_lambda.invoke_all(
+                    requests=[{'function_name': 'blink', 'payload': {}}],
+                    region='us-east-1',
+                )
+
+            finally:
+                async_lambda.close_loop()
+
+        async def invoke_from_thread():
+            return await self.loop.run_in_executor(None, invoke)
+
+        responses = self.loop.run_until_complete(invoke_from_thread())
+
+        self.assertEqual(responses[0]['status'], 200)
+        self.assertEqual(self.server.requests[-1][0], 'blink')
+
+        self.loop.run_until_complete(dispatcher.close())
+        dispatcher.base_url = base_url
+
+    def test_invoke_regions(self, sign_headers):
+        '''Test invoking functions in multiple regions concurrently'''
+        regions = ['us-east-1', 'eu-west-1']
+        dispatchers = {
+            region: async_lambda.get_dispatcher(region=region)
+            for region in regions
+        }
+        base_urls = {
+            region: dispatcher.base_url
+            for region, dispatcher in dispatchers.items()
+        }
+
+        for dispatcher in dispatchers.values():
+            dispatcher.base_url = self.base_url
+
+        responses = async_lambda.invoke_regions(requests={
+            region: [
+                {'function_name': name, 'payload': {'region': region}}
+                for name in ['forge', 'gambit']
+            ]
+            for region in regions
+        })
+
+        self.assertEqual(len(responses), 4)
+        self.assertEqual(
+            [r['data']['region'] for r in responses],
+            ['us-east-1', 'us-east-1', 'eu-west-1', 'eu-west-1'],
+        )
+
+        for region, dispatcher in dispatchers.items():
+            self.loop.run_until_complete(dispatcher.close())
+            dispatcher.base_url = base_urls[region]
+
+
 class TestMutants(unittest.TestCase):
     '''Test Mutant classes'''
 
@@ -116,6 +1043,184 @@ class TestMutants(unittest.TestCase):
             region=constants.REGION,
         )
 
+    @patch('xlibs.mutant.async_lambda')
+    def test_merge(self, async_lambda):
+        '''Test merging slim Mutant responses into the functions sent'''
+        functions = [
+            {'name': 'havok', 'region': 'us-east-1', 'metrics': {},
+             'scaling': {'max_concurrency': 5}},
+            {'name': 'havok', 'region': 'eu-west-1', 'metrics': {}},
+        ]
+
+        async_lambda.invoke_all.return_value = [{
+            'status': 200,
+            'data': {'functions': [
+                {'name': 'havok', 'region': 'eu-west-1', 'forecast': [1]},
+                {'name': 'havok', 'region': 'us-east-1', 'forecast': [2]},
+            ]},
+        }]
+
+        forecasts = mutant.Jean().forecast(
+            functions_metrics=functions,
+            timeframe=1,
+        )
+
+        self.assertEqual(forecasts, [
+            {'name': 'havok', 'region': 'eu-west-1', 'forecast': [1]},
+            {'name': 'havok', 'region': 'us-east-1', 'forecast': [2],
+             'scaling': {'max_concurrency': 5}},
+        ])
+
+    @patch('xlibs.mutant.async_lambda')
+    def test_execute_regions(self, async_lambda):
+        '''Test invoking Mutants in the region of each function'''
+        functions = [
+            {'name': 'psylocke', 'region': 'us-east-1'},
+            {'name': 'rogue', 'region': 'eu-west-1'},
+            {'name': 'sunfire', 'region': 'us-east-1'},
+        ]
+
+        async_lambda.invoke_regions.return_value = []
+
+        mutant.Cyclops(regional=True).burn(functions_demand=functions)
+
+        requests = async_lambda.invoke_regions.call_args[1]['requests']
+
+        self.assertEqual(sorted(requests), ['eu-west-1', 'us-east-1'])
+        self.assertEqual(
+            [r['payload']['name'] for r in requests['us-east-1']],
+            ['psylocke', 'sunfire'],
+        )
+        async_lambda.invoke_all.assert_not_called()
+
+        # Without regional workers, the X-Lambda region serves all
+        mutant.Cyclops().burn(functions_demand=functions)
+
+        async_lambda.invoke_all.assert_called_once()
+        self.assertEqual(
+            async_lambda.invoke_all.call_args[1]['region'],
+            constants.REGION,
+        )
+        self.assertEqual(
+            len(async_lambda.invoke_all.call_args[1]['requests']),
+            3,
+        )
+
+    @patch('xlibs.mutant.async_lambda.invoke_all')
+    @patch('jean.execute')
+    def test_execute_local(self, jean_execute, invoke_all):
+        '''Test running a Mutant's logic in-process (monolith mode)'''
+        def forecast(options):
+            if options['functions'][0]['name'] == 'mystique':
+                raise exc.XLambdaExceptionInvalidRequest('Shapeshifter')
+
+            return {'functions': options['functions']}
+
+        jean_execute.side_effect = forecast
+
+        jean = mutant.Jean(local=True)
+        responses = jean.execute(requests=[
+            {'function_name': 'jean', 'payload': {'functions': [{'name': n}]}}
+            for n in ['beast', 'mystique']
+        ])
+
+        invoke_all.assert_not_called()
+        self.assertEqual(jean_execute.call_count, 2)
+        self.assertEqual(
+            responses[0],
+            {'status': 200, 'data': {'functions': [{'name': 'beast'}]}},
+        )
+        self.assertEqual(responses[1]['status'], 500)
+        self.assertEqual(
+            responses[1]['error']['type'],
+            'XLambdaExceptionInvalidRequest',
+        )
+
+        # Async calls raise on errors
+        loop = async_lambda.get_loop()
+
+        functions = loop.run_until_complete(jean.forecast_functions(
+            functions=[{'name': 'beast'}],
+            timeframe=15,
+        ))
+        self.assertEqual(functions, [{'name': 'beast'}])
+
+        self.assertRaises(
+            exc.XLambdaExceptionMutantFailed,
+            loop.run_until_complete,
+            jean.forecast_functions(
+                functions=[{'name': 'mystique'}],
+                timeframe=1,
+            ),
+        )
+
+    @patch('xlibs.mutant.Mutant.execute')
+    def test_wolverine_get_metrics(self, execute):
+        '''Test packing of functions in multi-function Wolverine requests'''
+        functions = [
+            {'name': f'sentinel-{i}', 'region': 'us-east-1'}
+            for i in range(constants.WOLVERINE_BATCH_SIZE + 1)
+        ]
+
+        execute.return_value = [
+            {'status': 200, 'data': {'functions': [{}, {}], 'errors': []}},
+            {'status': 500, 'data': None},
+        ]
+
+        wolverine = mutant.Wolverine()
+        results = wolverine.get_metrics(functions=functions)
+
+        requests = execute.call_args[1]['requests']
+
+        self.assertEqual(len(requests), 2)
+        self.assertEqual(
+            len(requests[0]['payload']['functions']),
+            constants.WOLVERINE_BATCH_SIZE,
+        )
+        self.assertEqual(len(requests[1]['payload']['functions']), 1)
+        self.assertEqual(len(results), 2)
+
+    @patch('xlibs.mutant.async_lambda')
+    def test_cyclops_fire(self, async_lambda):
+        '''Test that warm-up requests of a tier share a serialized payload'''
+        async_lambda.burst_all.return_value = (
+            [], {'send_spread': 1.5, 'released': 8},
+        )
+
+        cyclops = mutant.Cyclops()
+        cyclops.aim(target={
+            'name': 'nightcrawler',
+            'region': 'us-east-1',
+            'settings': {'startup_time': 1000},
+            'forecast': [8, 2],
+            'scaling': {
+                'min_containers': 1,
+                'max_containers': 10,
+                'max_concurrency': 10,
+            },
+            'hold_extension': 500,
+            'request_spread': 50 * cyclops_constants.HOLD_SPREAD_MARGIN,
+        }).fire()
+
+        requests = async_lambda.burst_all.call_args[1]['requests']
+        payloads = {id(request['payload']) for request in requests}
+
+        self.assertEqual(len(requests), 8)
+        self.assertEqual(len(payloads), 4)
+        self.assertIsInstance(requests[0]['payload'], sigv4.Payload)
+
+        # Requests dispatched later hold for less, plus the extension
+        holds = [
+            json.loads(request['payload'].body)
+            ['xlambda']['settings']['startup_time']
+            for request in requests
+        ]
+
+        self.assertEqual(holds, [1500] * 2 + [1400] * 2 + [1300] * 2 +
+                         [1200] * 2)
+        self.assertEqual(cyclops.send_spread, 1.5)
+        self.assertEqual(cyclops.burst_size, 8)
+
     def test_cyclops_container_count(self):
         '''Test counting of how many containers should be warmed up'''
         target = {
@@ -138,6 +1243,18 @@ class TestMutants(unittest.TestCase):
         cyclops._target.scaling = get_scaling(1, 20, 8)
         self.assertEqual(cyclops.containers_to_warm, 8)
 
+        # Forecasts with prediction intervals are sized on upper bounds
+        cyclops._target.forecast = [
+            {'point': 4, 'upper': 7},
+            {'point': 12, 'upper': 17},
+        ]
+        cyclops._target.scaling = get_scaling(1, 20, 50)
+        self.assertEqual(cyclops.containers_to_warm, 17)
+
+        # Counts packed by Professor (e.g. chunks of a split demand) prevail
+        cyclops._target.warm_count = 30
+        self.assertEqual(cyclops.containers_to_warm, 30)
+
 
 def get_scaling(
         min_containers: int = 1,
@@ -1,5 +1,4 @@
 import logging
-import traceback
 from typing import Dict
 
 try:
@@ -7,9 +6,9 @@ try:
 except ImportError:
     pass
 
-from xlibs import exc, response
+from xlibs import exc, rate_limiter, response, telemetry
 from xlibs.wolverine import utils
-from xlibs.wolverine.constants import REQUIRED_ARGS
+from xlibs.wolverine.constants import REQUIRED_ARGS, RESPONSE_FIELDS
 
 
 logger = logging.getLogger()
@@ -23,9 +22,14 @@ def handler(event: Dict, context: Dict) -> Dict:
     :arg context: (dict) contextual data provided by the Lambda platform
     '''
     try:
-        result = execute(
-            options=event,
-        )
+        with telemetry.span(
+                'handler',
+                trace=event.get('trace'),
+                stage='wolverine',
+                ):
+            result = execute(
+                options=event,
+            )
 
         return response.build(
             status=200,
@@ -35,19 +39,19 @@ def handler(event: Dict, context: Dict) -> Dict:
     except Exception as error:
         logger.exception(error)
 
-        return response.build(
-            status=500,
-            error={
-                'type': type(error).__name__,
-                'description': str(error),
-                'trace': traceback.format_exc(),
-            },
-            original_request=event,
-        )
+        return response.build_error(error=error, event=event)
 
 
 def execute(*, options):
-    '''Execute a request received by the Wolverine Lambda'''
+    '''Execute a request received by the Wolverine Lambda
+
+    Accepts either a single function ("name" and "region" options) or a list
+    of functions under the "functions" option (multi-function mode). Only
+    the fields needed by Jean are returned for each function.
+    '''
+    if 'functions' in options:
+        return execute_multiple(options=options)
+
     is_request_valid, validation_msg = utils.validate_request(
         options=options,
         required_args=REQUIRED_ARGS,
@@ -61,7 +65,39 @@ def execute(*, options):
         region=options['region'],
     )
 
-    options['metrics'] = metrics
-    options['settings'] = settings
+    return response.shape(
+        data={
+            **options,
+            'metrics': metrics,
+            'settings': settings,
+            'recent_concurrency': utils.get_recent_concurrency(
+                metrics=metrics,
+            ),
+        },
+        fields=RESPONSE_FIELDS,
+    )
+
+
+def execute_multiple(*, options):
+    '''Execute a multi-function request received by the Wolverine Lambda'''
+    for function in options['functions']:
+        is_request_valid, validation_msg = utils.validate_request(
+            options=function,
+            required_args=REQUIRED_ARGS,
+        )
+
+        if not is_request_valid:
+            raise exc.XLambdaExceptionInvalidRequest(validation_msg)
+
+    functions, errors = utils.get_lambdas_info(
+        functions=options['functions'],
+    )
 
-    return options
+    return {
+        'functions': [
+            response.shape(data=function, fields=RESPONSE_FIELDS)
+            for function in functions
+        ],
+        'errors': errors,
+        'rate_limits': rate_limiter.get_stats(),
+    }
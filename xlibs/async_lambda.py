@@ -4,70 +4,495 @@ https://www.mathewmarcus.com/blog/
 http://archive.is/nXkCb
 
 Small syntax and organization modifications were made to the original code.
+
+Requests are signed with xlibs.sigv4, which serializes each payload once and
+caches the signing key, so identical warm-up requests are cheap to sign.
+
+Invocations are sent through a long-lived Dispatcher for each region, which
+keeps a pool of connections open across invocations of a warm container and
+caps how many requests are in flight at once.
 '''
 import asyncio
 import json
+import logging
 import os
-from typing import Dict, List
-import urllib
+import threading
+import time
+from typing import (
+    AsyncIterator,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
 
 import aiohttp
-from botocore import session, awsrequest, auth
+from botocore import session
+from botocore.exceptions import NoCredentialsError
+
+from xlibs import constants, sigv4, telemetry
 
-from xlibs import constants
 
+logger = logging.getLogger(__name__)
 
 AWS_CREDENTIALS = session.Session().get_credentials()
 
 
-def sign_headers(*, url: str, payload: Dict):
+def sign_headers(*, url: str, payload: sigv4.Payload) -> Dict:
     '''Sign AWS API request headers'''
-    segments = urllib.parse.urlparse(url).netloc.split('.')
-    service = segments[0]
-    region = segments[1]
+    if AWS_CREDENTIALS is None:
+        raise NoCredentialsError()
 
-    request = awsrequest.AWSRequest(
-        method='POST',
+    return sigv4.sign_headers(
         url=url,
-        data=json.dumps(payload),
+        payload=payload,
+        credentials=AWS_CREDENTIALS.get_frozen_credentials(),
     )
 
-    auth.SigV4Auth(AWS_CREDENTIALS, service, region).add_auth(request)
 
-    return dict(request.headers.items())
+def trace_sent() -> aiohttp.TraceConfig:
+    '''Record when request bodies are sent, for requests traced in a dict'''
+    async def on_request_chunk_sent(session, context, params):
+        trace = context.trace_request_ctx
 
+        if isinstance(trace, dict) and 'sent_at' not in trace:
+            trace['sent_at'] = time.perf_counter()
 
-async def invoke(*, url: str, payload: Dict, session):
-    '''Invoke a Lambda function'''
-    signed_headers = sign_headers(url=url, payload=payload)
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_chunk_sent.append(on_request_chunk_sent)
 
-    async with session.post(url, json=payload, headers=signed_headers) \
-            as response:
-        return await response.json()
+    return trace_config
 
 
-def run_invocations(*, requests: List, base_url: str, session):
-    for request in requests:
-        url = os.path.join(base_url, request['function_name'], 'invocations')
+class Dispatcher():
+    '''Dispatch Lambda invocations to a region over pooled connections
 
-        yield invoke(url=url, payload=request['payload'], session=session)
+    :arg region: AWS region of the Lambda endpoint
+    :arg concurrency: maximum number of invocations in flight at once
+    :arg base_url: Lambda functions endpoint, derived from the region if
+        not provided
+    '''
 
+    def __init__(
+            self,
+            region: str,
+            concurrency: int = constants.DISPATCHER_CONCURRENCY,
+            base_url: Optional[str] = None,
+            *args,
+            **kwargs,
+            ):
+        self.region = region
+        self.concurrency = concurrency
+        self.base_url = base_url or \
+            constants.LAMBDA_ENDPOINT.format(region=region)
 
-def invoke_all(*, requests: List, region: str = 'us-east-1'):
-    base_url = constants.LAMBDA_ENDPOINT.format(region=region)
-
-    async def wrapper():
-        async with aiohttp.ClientSession(raise_for_status=True) as session:
-            invocations = run_invocations(
-                requests=requests,
-                base_url=base_url,
-                session=session,
+        # Sessions and semaphores are bound to an event loop, so each thread
+        # running its own loop gets its own pair (see get_loop)
+        self._sessions = {}
+
+    def session(self) -> Tuple[aiohttp.ClientSession, asyncio.Semaphore]:
+        '''Get the HTTP session and semaphore bound to the current loop'''
+        loop = asyncio.get_event_loop()
+        session, semaphore = self._sessions.get(loop, (None, None))
+
+        if session is None or session.closed:
+            semaphore = asyncio.Semaphore(self.concurrency)
+            session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=constants.DISPATCHER_CONNECTION_LIMIT,
+                    ttl_dns_cache=constants.DISPATCHER_DNS_CACHE_TTL,
+                    keepalive_timeout=constants.DISPATCHER_KEEPALIVE_TIMEOUT,
+                ),
+                timeout=aiohttp.ClientTimeout(
+                    total=constants.DISPATCHER_REQUEST_TIMEOUT,
+                ),
+                raise_for_status=True,
+                trace_configs=[trace_sent()],
+            )
+            self._sessions[loop] = (session, semaphore)
+
+        return session, semaphore
+
+    def url(self, *, function_name: str) -> str:
+        return os.path.join(self.base_url, function_name, 'invocations')
+
+    def prepare(
+            self,
+            *,
+            function_name: str,
+            payload: Union[Dict, sigv4.Payload],
+            log_type: str = 'None',
+            ) -> Dict:
+        '''Serialize and sign an invocation request ahead of sending it'''
+        url = self.url(function_name=function_name)
+        payload = sigv4.serialize(payload)
+
+        return {
+            'function_name': function_name,
+            'url': url,
+            'payload': payload,
+            'log_type': log_type,
+            'headers': {
+                'Content-Type': 'application/json',
+                'X-Amz-Log-Type': log_type,
+                **sign_headers(url=url, payload=payload),
+            },
+        }
+
+    async def send(
+            self,
+            *,
+            session: aiohttp.ClientSession,
+            prepared: Dict,
+            trace: Optional[Dict] = None,
+            ) -> Dict:
+        '''Send a prepared invocation request
+
+        :arg trace: dictionary in which the time the request body was sent
+            is recorded, under "sent_at" (see trace_sent)
+        '''
+        async with session.post(
+                prepared['url'],
+                data=prepared['payload'].body,
+                headers=prepared['headers'],
+                trace_request_ctx=trace) as response:
+            body = await response.read()
+            log_result = response.headers.get('X-Amz-Log-Result')
+
+        telemetry.add(response_bytes=len(body))
+
+        if prepared['log_type'] == 'Tail':
+            return {'Payload': json.loads(body), 'LogResult': log_result}
+
+        return json.loads(body)
+
+    async def invoke(
+            self,
+            *,
+            function_name: str,
+            payload: Union[Dict, sigv4.Payload],
+            log_type: str = 'None',
+            ) -> Dict:
+        '''Invoke a Lambda function
+
+        :arg payload: dictionary or payload already serialized with
+            sigv4.serialize, which is preferred for repeated requests
+        :arg log_type: 'Tail' to include the last 4 KB of execution logs,
+            the response is then a dictionary with the returned "Payload"
+            and the base64-encoded logs under "LogResult"
+        '''
+        session, semaphore = self.session()
+        payload = sigv4.serialize(payload)
+
+        with telemetry.span(
+                'invoke',
+                aggregate=True,
+                region=self.region,
+                ) as span:
+            span.describe(function=function_name)
+            span.set(payload_bytes=len(payload.body))
+
+            async with semaphore:
+                prepared = self.prepare(
+                    function_name=function_name,
+                    payload=payload,
+                    log_type=log_type,
+                )
+
+                return await self.send(session=session, prepared=prepared)
+
+    async def open_connections(self, *, count: int) -> None:
+        '''Open and handshake connections ahead of a burst
+
+        Concurrent lightweight requests each establish a connection, which
+        is kept alive in the pool for the requests that follow. Failures
+        are not fatal: connections are then opened by the burst itself.
+        '''
+        session, _ = self.session()
+
+        async def open_connection():
+            try:
+                async with session.head(self.base_url) as response:
+                    await response.read()
+
+            except aiohttp.ClientError:
+                pass
+
+        await asyncio.gather(*[open_connection() for _ in range(count)])
+
+    async def burst(self, *, requests: List[Dict]) -> Tuple[List, Dict]:
+        '''Invoke Lambda functions as close together as possible
+
+        Connections are opened and all requests are signed beforehand, then
+        requests are released at once: nothing but sending is left between
+        the first and the last request. Requests beyond the concurrency
+        limit are sent as soon as earlier ones complete, outside of the
+        burst.
+
+        :return: tuple (responses in the order of requests, report), the
+            report has the number of requests, connections opened and
+            requests released in the burst, and the spread between the
+            first and last send of the burst, in milliseconds
+        '''
+        session, semaphore = self.session()
+        size = min(len(requests), self.concurrency)
+
+        if len(requests) > self.concurrency:
+            logger.warning(
+                f'Burst of {len(requests)} requests exceeds the concurrency '
+                f'limit ({self.concurrency}), the remaining requests are '
+                'sent as earlier ones complete'
+            )
+
+        await self.open_connections(count=size)
+
+        prepared = [
+            self.prepare(
+                function_name=request['function_name'],
+                payload=request['payload'],
+                log_type=request.get('log_type', 'None'),
             )
+            for request in requests
+        ]
+        traces = [{} for _ in prepared]
+
+        ready = []
+        all_ready = asyncio.Event()
+        release = asyncio.Event()
+
+        async def send(request: Dict, trace: Dict) -> Dict:
+            async with semaphore:
+                ready.append(request)
+                trace['burst'] = not release.is_set()
+
+                if len(ready) == size:
+                    all_ready.set()
+
+                await release.wait()
+
+                trace['released_at'] = time.perf_counter()
+
+                with telemetry.span(
+                        'invoke',
+                        aggregate=True,
+                        region=self.region,
+                        ) as span:
+                    span.describe(function=request['function_name'])
+                    span.set(payload_bytes=len(request['payload'].body))
+
+                    return await self.send(
+                        session=session,
+                        prepared=request,
+                        trace=trace,
+                    )
+
+        tasks = [
+            asyncio.ensure_future(send(request, trace))
+            for request, trace in zip(prepared, traces)
+        ]
+        filled = asyncio.ensure_future(all_ready.wait())
+
+        try:
+            # Slots of the semaphore held by other invocations could keep
+            # the burst from filling up, it is then released as it is
+            if tasks:
+                await asyncio.wait(
+                    [filled],
+                    timeout=constants.DISPATCHER_BURST_READY_TIMEOUT,
+                )
+
+            release.set()
+
+            responses = await asyncio.gather(*tasks)
+
+        finally:
+            filled.cancel()
+
+            for task in tasks:
+                task.cancel()
+
+        # Requests sent after the burst would stretch its spread
+        sent = [
+            trace.get('sent_at', trace.get('released_at'))
+            for trace in traces
+            if trace.get('burst')
+        ]
+        sent = [sent_at for sent_at in sent if sent_at is not None]
+
+        return responses, {
+            'requests': len(requests),
+            'connections': size,
+            'released': len(sent),
+            'send_spread': round((max(sent) - min(sent)) * 1000, 3)
+            if sent else 0,
+        }
+
+    async def stream(self, *, requests: Iterable) -> AsyncIterator[Dict]:
+        '''Invoke Lambda functions, yielding responses as they complete
+
+        Requests are consumed lazily and at most `concurrency` of them are
+        scheduled at once, so memory is bounded by the concurrency instead
+        of the number of requests.
+        '''
+        requests = iter(requests)
+        pending = set()
+
+        try:
+            while True:
+                for request in requests:
+                    pending.add(asyncio.ensure_future(self.invoke(
+                        function_name=request['function_name'],
+                        payload=request['payload'],
+                        log_type=request.get('log_type', 'None'),
+                    )))
+
+                    if len(pending) >= self.concurrency:
+                        break
+
+                if not pending:
+                    return
+
+                done, pending = await asyncio.wait(
+                    pending,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+
+                for task in done:
+                    yield task.result()
+
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def gather(self, *, requests: Iterable) -> List[Dict]:
+        '''Invoke Lambda functions, responses are in order of completion'''
+        return [
+            response
+            async for response in self.stream(requests=requests)
+        ]
+
+    async def close(self) -> None:
+        '''Close the HTTP session bound to the current loop'''
+        session, _ = self._sessions.pop(
+            asyncio.get_event_loop(),
+            (None, None),
+        )
+
+        if session is not None and not session.closed:
+            await session.close()
+
+
+_dispatchers = {}
+_dispatchers_lock = threading.Lock()
+_thread_state = threading.local()
+
+
+def get_dispatcher(*, region: str) -> Dispatcher:
+    '''Get the dispatcher shared by all invocations in a region'''
+    with _dispatchers_lock:
+        if region not in _dispatchers:
+            _dispatchers[region] = Dispatcher(region=region)
+
+        return _dispatchers[region]
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    '''Get an event loop that outlives each batch of invocations
+
+    Dispatcher sessions are bound to the loop they were created in, so the
+    same loop is reused across invocations of a warm container. Each thread
+    gets its own loop, which lets worker threads invoke Lambdas while
+    another thread's loop is running.
+    '''
+    loop = getattr(_thread_state, 'loop', None)
+
+    if loop is None or loop.is_closed():
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        _thread_state.loop = loop
+
+    return loop
+
+
+def close_loop() -> None:
+    '''Close the current thread's loop and the sessions bound to it'''
+    loop = getattr(_thread_state, 'loop', None)
+
+    if loop is None or loop.is_closed():
+        return
+
+    with _dispatchers_lock:
+        dispatchers = list(_dispatchers.values())
+
+    for dispatcher in dispatchers:
+        loop.run_until_complete(dispatcher.close())
+
+    loop.close()
+
+
+def invoke_all(*, requests: List, region: str = 'us-east-1'):
+    '''Invoke Lambda functions concurrently
+
+    :return: list of responses, in order of completion
+    '''
+    loop = get_loop()
+
+    if loop.is_running():
+        raise RuntimeError(
+            'invoke_all cannot block the event loop it is running on, '
+            'use Dispatcher.gather instead'
+        )
+
+    dispatcher = get_dispatcher(region=region)
+
+    return loop.run_until_complete(dispatcher.gather(requests=requests))
+
+
+def burst_all(*, requests: List, region: str = 'us-east-1') -> Tuple:
+    '''Invoke Lambda functions in a single burst (see Dispatcher.burst)
+
+    :return: tuple (responses in the order of requests, burst report)
+    '''
+    loop = get_loop()
+
+    if loop.is_running():
+        raise RuntimeError(
+            'burst_all cannot block the event loop it is running on, '
+            'use Dispatcher.burst instead'
+        )
+
+    dispatcher = get_dispatcher(region=region)
+
+    return loop.run_until_complete(dispatcher.burst(requests=requests))
+
+
+def invoke_regions(*, requests: Dict[str, List]) -> List:
+    '''Invoke Lambda functions in multiple regions concurrently
+
+    Each region is served by its own dispatcher, so regions do not wait on
+    each other and their throughput adds up.
 
-            return await asyncio.gather(*invocations)
+    :arg requests: lists of requests by region
+    :return: list of responses, regions in the order provided
+    '''
+    loop = get_loop()
 
-    loop = asyncio.get_event_loop()
+    if loop.is_running():
+        raise RuntimeError(
+            'invoke_regions cannot block the event loop it is running on, '
+            'use Dispatcher.gather instead'
+        )
 
-    results = loop.run_until_complete(wrapper())
+    async def gather_regions():
+        return await asyncio.gather(*[
+            get_dispatcher(region=region).gather(requests=region_requests)
+            for region, region_requests in requests.items()
+        ])
 
-    return results
+    return [
+        response
+        for responses in loop.run_until_complete(gather_regions())
+        for response in responses
+    ]
@@ -0,0 +1,68 @@
+'''Registry of boto3 clients reused across invocations of a warm container
+
+Creating a client resolves endpoints and loads credentials, and each client
+keeps its own HTTP connection pool. Reusing clients per service and region
+saves that setup and lets subsequent requests reuse open connections.
+'''
+import threading
+
+import boto3
+from botocore.config import Config
+
+from xlibs import constants
+
+
+_session = None
+_clients = {}
+_lock = threading.Lock()
+
+
+def get_client(*, service: str, region: str, rate_limited: bool = False):
+    '''Get a boto3 client for a service and region
+
+    Clients are thread-safe once created, but client creation is not, so it
+    is serialized with a lock.
+
+    :arg rate_limited: whether requests are sent through a rate limiter
+        (see xlibs.rate_limiter), which retries throttled requests itself.
+        These clients don't retry, so that the limiter sees every throttle.
+    '''
+    key = (service, region, rate_limited)
+
+    client = _clients.get(key)
+
+    if client:
+        return client
+
+    global _session
+
+    with _lock:
+        if key not in _clients:
+            if not _session:
+                _session = boto3.session.Session()
+
+            options = {}
+
+            if rate_limited:
+                options['retries'] = {'max_attempts': 0}
+
+            _clients[key] = _session.client(
+                service,
+                region_name=region,
+                config=Config(
+                    max_pool_connections=constants.AWS_MAX_POOL_CONNECTIONS,
+                    tcp_keepalive=constants.AWS_TCP_KEEPALIVE,
+                    **options,
+                ),
+            )
+
+        return _clients[key]
+
+
+def reset() -> None:
+    '''Discard all clients, e.g. after credentials were rotated'''
+    global _session
+
+    with _lock:
+        _session = None
+        _clients.clear()
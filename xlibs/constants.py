@@ -11,9 +11,76 @@ REGION = os.environ.get('REGION', DEFAULT_REGION)
 # AWS API constants
 LAMBDA_ENDPOINT = 'https://lambda.{region}.amazonaws.com/2015-03-31/functions'
 
+# Dispatcher of asynchronous Lambda invocations (one per region)
+DISPATCHER_CONCURRENCY = int(os.environ.get('DISPATCHER_CONCURRENCY', 100))
+DISPATCHER_CONNECTION_LIMIT = DISPATCHER_CONCURRENCY
+DISPATCHER_DNS_CACHE_TTL = 300  # Seconds
+DISPATCHER_KEEPALIVE_TIMEOUT = 60  # Seconds
+DISPATCHER_REQUEST_TIMEOUT = 900  # Seconds, the maximum Lambda duration
+DISPATCHER_BURST_READY_TIMEOUT = 1  # Seconds to wait for a burst to fill up
+
+# Cached SigV4 signing keys and parsed endpoints
+SIGV4_CACHE_SIZE = 128
+
+# Pooled boto3 clients
+AWS_MAX_POOL_CONNECTIONS = int(os.environ.get('AWS_MAX_POOL_CONNECTIONS', 50))
+AWS_TCP_KEEPALIVE = os.environ.get('AWS_TCP_KEEPALIVE', 'true') == 'true'
+
+# Client-side rate limits for AWS APIs (requests per second)
+API_RATE_LIMITS = {
+    'GetMetricData': 50,
+    'GetFunctionConfiguration': 15,
+    'default': 10,
+}
+THROTTLING_ERROR_CODES = [
+    'Throttling',
+    'ThrottlingException',
+    'TooManyRequestsException',
+    'RequestLimitExceeded',
+]
+RATE_LIMIT_MIN_RATE = 1
+RATE_LIMIT_INCREASE_STEP = 0.5
+RATE_LIMIT_DECREASE_FACTOR = 0.5
+RATE_LIMIT_MAX_RETRIES = 5
+RATE_LIMIT_BACKOFF_BASE = 0.2  # Seconds
+RATE_LIMIT_BACKOFF_CAP = 10  # Seconds
+
+# Persistent state storage (memory, file, sqlite or dynamodb)
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'file')
+STORAGE_PATH = os.environ.get('STORAGE_PATH', '/tmp/xlambda')
+STORAGE_SQLITE_PATH = os.environ.get(
+    'STORAGE_SQLITE_PATH',
+    os.path.join(STORAGE_PATH, 'xlambda.sqlite3'),
+)
+STORAGE_TABLE = os.environ.get('STORAGE_TABLE', f'xlambda-state-{STAGE}')
+
+# Work queues between warming stages (memory, sqlite or sqs)
+QUEUE_BACKEND = os.environ.get('QUEUE_BACKEND', 'memory')
+QUEUE_SQLITE_PATH = os.environ.get(
+    'QUEUE_SQLITE_PATH',
+    os.path.join(STORAGE_PATH, 'xlambda-queues.sqlite3'),
+)
+QUEUE_NAME = os.environ.get('QUEUE_NAME', f'xlambda-{{name}}-{STAGE}')
+QUEUE_BATCH_SIZE = 10  # Messages received at once (SQS maximum)
+QUEUE_VISIBILITY_TIMEOUT = 900  # Seconds
+QUEUE_MAX_ATTEMPTS = 3
+QUEUE_RETRY_DELAY = 30  # Seconds, doubled on every attempt
+QUEUE_POLL_INTERVAL = 1  # Seconds to wait when all messages are in flight
+
 # Miscellaneous
 BASE_FUNCTION_NAME = 'xlambda-{function}-{stage}'
 
 # Forecasting
 CONFIDENCE_LEVEL = 0.9
 FORECAST_TIMEFRAME = 3  # How many periods of 5 minutes to forecast
+
+# Response envelopes (see xlibs.response)
+RESPONSE_ECHO_REQUEST = \
+    os.environ.get('RESPONSE_ECHO_REQUEST', 'false') == 'true'
+RESPONSE_MAX_DESCRIPTION = 1000  # Characters
+RESPONSE_MAX_TRACE = 2000  # Characters, from the end of the traceback
+
+# Telemetry spans logged in CloudWatch Embedded Metric Format
+TELEMETRY_NAMESPACE = os.environ.get('TELEMETRY_NAMESPACE', 'XLambda')
+TELEMETRY_SAMPLE_RATE = float(os.environ.get('TELEMETRY_SAMPLE_RATE', 1.0))
+TELEMETRY_MAX_VALUES = 100  # Values per metric in an EMF record (EMF limit)
@@ -1,4 +1,6 @@
 '''Constant values for Cyclops Lambda'''
+import os
+
 from xlibs.constants import *  # NOQA
 
 
@@ -9,3 +11,49 @@ REQUIRED_ARGS = [
     'forecast',
     'scaling',
 ]
+
+# Fields sent back to the invoker
+RESPONSE_FIELDS = [
+    'name',
+    'region',
+    'chunk',
+    'warm_count',
+    'warm_summary',
+    'hold_time',
+    'send_spread',
+    'warm_estimate',
+]
+
+# Errors from warm-up invocations detailed in the summary
+SUMMARY_MAX_ERRORS = 3
+
+# Hold time controller (see hold_controller)
+HOLD_MIN = 100  # Milliseconds
+HOLD_MAX = 60000  # Milliseconds
+HOLD_INCREASE_FACTOR = 1.5  # Applied when containers were reused
+HOLD_DECREASE_FACTOR = 0.9  # Applied when all containers were distinct
+HOLD_MIN_CONTAINERS = 2  # Warm-ups with fewer containers can't overlap
+HOLD_MAX_AGE = 3600  # Seconds a tuned hold time lasts without conclusive data
+HOLD_DEFAULT_DRIFT = 0.25  # Relative change of the default that resets it
+
+# Requests of a warm-up are split in this many tiers, in dispatch order, each
+# holding for less than the previous one (see utils.get_hold_tiers)
+HOLD_TIERS = 4
+HOLD_SPREAD_MARGIN = 1.5  # Divides the time elapsed since the first requests
+
+# Send spread between warm-up requests (see spread_tracker)
+SPREAD_SMOOTHING = 0.3  # Weight of the latest warm-up in the average
+SPREAD_MAX_AGE = 86400  # Seconds after which a measured spread is dropped
+
+# Request the tail of execution logs with warm-ups, to learn startup times
+# from the Init Duration of cold starts (see wolverine.startup_tracker)
+WARM_LOG_TAIL = os.environ.get('WARM_LOG_TAIL', 'true') == 'true'
+
+# Release warm-up requests together, over connections opened beforehand
+WARM_BURST = os.environ.get('WARM_BURST', 'true') == 'true'
+
+# Skip warm-ups while containers are estimated to be still warm
+WARM_STATE = os.environ.get('WARM_STATE', 'true') == 'true'
+WARM_STATE_GRACE = 300  # Seconds during which idle containers are not reaped
+WARM_STATE_HALF_LIFE = 1800  # Seconds for half of them to be reaped after
+WARM_STATE_MAX_AGE = 3600  # Seconds after which no idle container is warm
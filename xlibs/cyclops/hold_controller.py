@@ -0,0 +1,157 @@
+'''Feedback controller of the time warm-up requests hold their containers
+
+Containers must be kept busy until the last warm-up request of a function is
+fired, otherwise Lambda reuses them instead of starting new ones. Functions
+acknowledging warm-ups report their container ID (see docs/ADAPT_FUNCTIONS),
+so reused containers show up as duplicate IDs within a warm-up.
+
+The hold time of each function is adjusted after every warm-up: increased
+multiplicatively when containers were reused, and decreased slowly while all
+containers requested were distinct, so that it converges to just long enough
+for all requests to overlap. Functions not acknowledging warm-ups keep the
+estimated startup time.
+
+Tuned hold times are anchored to the default they were tuned from. They are
+dropped, starting over from the default, when the default moved materially
+(e.g. a new startup time was learned) or when no warm-up was conclusive for
+HOLD_MAX_AGE (e.g. the function stopped acknowledging warm-ups).
+'''
+import logging
+import math
+import time
+from typing import Callable, Dict, Optional
+
+from xlibs import storage
+from xlibs.cyclops import constants
+
+
+logger = logging.getLogger(__name__)
+
+
+class HoldController():
+    '''Adjust and persist the hold time of functions in a storage backend'''
+
+    def __init__(
+            self,
+            backend: Optional[storage.Storage] = None,
+            clock: Callable = time.time,
+            *args,
+            **kwargs,
+            ):
+        self._backend = backend
+        self._clock = clock
+
+    @property
+    def backend(self) -> storage.Storage:
+        if not self._backend:
+            self._backend = storage.get_storage()
+
+        return self._backend
+
+    def key(self, *, function_name: str, region: str) -> str:
+        return f'hold:{region}:{function_name}'
+
+    def load(self, *, function_name: str, region: str) -> Optional[Dict]:
+        '''Load the state of a function, None if missing or unavailable'''
+        try:
+            return self.backend.get(
+                self.key(function_name=function_name, region=region),
+            )
+
+        except Exception as error:
+            logger.warning(f'Failed to load hold time: {error}')
+            return None
+
+    def save(self, *, function_name: str, region: str, state: Dict) -> None:
+        '''Save the state of a function, failures are not fatal'''
+        try:
+            self.backend.put(
+                self.key(function_name=function_name, region=region),
+                state,
+            )
+
+        except Exception as error:
+            logger.warning(f'Failed to save hold time: {error}')
+
+    def get_hold(self, *, function_name: str, region: str, default: int) \
+            -> int:
+        '''Get the hold time of a function, in milliseconds
+
+        :arg default: hold time to use until the function acknowledges
+            warm-ups, e.g. its estimated startup time
+        '''
+        state = self.load(function_name=function_name, region=region)
+
+        if not state or not self.is_current(state=state, default=default):
+            return default
+
+        return state['hold']
+
+    def is_current(self, *, state: Dict, default: int) -> bool:
+        '''Check whether a tuned hold time still applies'''
+        if self._clock() - state['updated_at'] > constants.HOLD_MAX_AGE:
+            return False
+
+        anchor = state.get('default')
+
+        if not anchor:
+            return False
+
+        return abs(default - anchor) / anchor <= constants.HOLD_DEFAULT_DRIFT
+
+    def adjust(self, *, hold: int, requested: int, summary: Dict) \
+            -> Optional[int]:
+        '''Compute the next hold time from the outcome of a warm-up
+
+        :arg hold: hold time used for the warm-up, in milliseconds
+        :arg requested: number of containers requested
+        :arg summary: summary of the warm-up (see utils.summarize)
+        :return: next hold time, None if the warm-up is not conclusive
+        '''
+        if requested < constants.HOLD_MIN_CONTAINERS:
+            return None
+
+        # Only conclusive if every request was acknowledged
+        if summary['acknowledged'] < requested:
+            return None
+
+        if summary['containers'] < requested:
+            hold = math.ceil(hold * constants.HOLD_INCREASE_FACTOR)
+        else:
+            hold = math.floor(hold * constants.HOLD_DECREASE_FACTOR)
+
+        return min(max(hold, constants.HOLD_MIN), constants.HOLD_MAX)
+
+    def update(
+            self,
+            *,
+            function_name: str,
+            region: str,
+            hold: int,
+            requested: int,
+            summary: Dict,
+            default: int,
+            ) -> int:
+        '''Adjust and persist the hold time of a function after a warm-up
+
+        :arg default: default hold time the hold time was tuned from
+        :return: hold time for the next warm-up, in milliseconds
+        '''
+        next_hold = self.adjust(hold=hold, requested=requested,
+                                summary=summary)
+
+        if next_hold is None:
+            return hold
+
+        self.save(
+            function_name=function_name,
+            region=region,
+            state={
+                'hold': next_hold,
+                'default': default,
+                'updated_at': self._clock(),
+                'reused': summary['reused'],
+            },
+        )
+
+        return next_hold
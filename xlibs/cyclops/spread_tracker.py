@@ -0,0 +1,108 @@
+'''Per-function spread between the warm-up requests sent by Cyclops
+
+Warm-up requests are sent one after the other, so containers started by the
+first requests must hold until the last one lands, while later requests have
+less to wait for (see utils.get_hold_tiers). The time between the first and
+the last request sent is measured by each burst (see xlibs.async_lambda).
+
+The spread per request is recorded here for each function, smoothed with an
+exponentially weighted moving average across warm-ups, so that hold times of
+the next warm-ups follow the actual dispatch speed without jumping on a
+single slow burst.
+'''
+import logging
+import time
+from typing import Callable, Dict, Optional
+
+from xlibs import storage
+from xlibs.cyclops import constants
+
+
+logger = logging.getLogger(__name__)
+
+
+class SpreadTracker():
+    '''Record the send spread of warm-ups in a storage backend'''
+
+    def __init__(
+            self,
+            backend: Optional[storage.Storage] = None,
+            clock: Callable = time.time,
+            *args,
+            **kwargs,
+            ):
+        self._backend = backend
+        self._clock = clock
+
+    @property
+    def backend(self) -> storage.Storage:
+        if not self._backend:
+            self._backend = storage.get_storage()
+
+        return self._backend
+
+    def key(self, *, function_name: str, region: str) -> str:
+        return f'spread:{region}:{function_name}'
+
+    def load(self, *, function_name: str, region: str) -> Optional[Dict]:
+        '''Load the state of a function, None if missing or unavailable'''
+        try:
+            return self.backend.get(
+                self.key(function_name=function_name, region=region),
+            )
+
+        except Exception as error:
+            logger.warning(f'Failed to load send spread: {error}')
+            return None
+
+    def record(
+            self,
+            *,
+            function_name: str,
+            region: str,
+            spread: Optional[float],
+            count: int,
+            ) -> None:
+        '''Record the send spread of a warm-up, failures are not fatal
+
+        :arg spread: milliseconds between the first and the last request
+            sent, None if not measured
+        :arg count: number of requests the spread was measured over
+        '''
+        if spread is None or count < 2:
+            return
+
+        request_spread = spread / (count - 1)
+        state = self.load(function_name=function_name, region=region)
+
+        if state:
+            request_spread = (
+                constants.SPREAD_SMOOTHING * request_spread +
+                (1 - constants.SPREAD_SMOOTHING) * state['request_spread']
+            )
+
+        try:
+            self.backend.put(
+                self.key(function_name=function_name, region=region),
+                {
+                    'request_spread': request_spread,
+                    'updated_at': self._clock(),
+                },
+            )
+
+        except Exception as error:
+            logger.warning(f'Failed to save send spread: {error}')
+
+    def estimate(self, *, function_name: str, region: str) -> float:
+        '''Estimate the milliseconds between consecutive warm-up requests
+
+        Functions not measured recently are estimated at zero, which keeps
+        the full hold time for all their requests.
+        '''
+        state = self.load(function_name=function_name, region=region)
+
+        if not state or \
+                self._clock() - state['updated_at'] > constants.SPREAD_MAX_AGE:
+            return 0.0
+
+        return state['request_spread']
@@ -1,2 +1,122 @@
 '''Utility functions for the Cyclops Lambda'''
+import math
+from typing import Dict, List, Optional, Tuple
+
 from xlibs.utils import *  # NOQA
+from xlibs import response
+from xlibs.cyclops import constants
+
+
+def get_ack(result) -> Optional[Dict]:
+    '''Get the warm-up acknowledgement returned by a function, if any
+
+    Functions acknowledge warm-ups by returning their container ID and
+    whether the container was cold (see docs/ADAPT_FUNCTIONS.md):
+
+        {"xlambda": {"container_id": "...", "cold": true}}
+    '''
+    if not isinstance(result, dict):
+        return None
+
+    ack = result.get('xlambda')
+
+    if not isinstance(ack, dict) or not ack.get('container_id'):
+        return None
+
+    return ack
+
+
+def is_failed(result) -> bool:
+    '''Whether a warm-up invocation returned an error'''
+    if not isinstance(result, dict):
+        return False
+
+    return 'errorMessage' in result or result.get('status', 200) != 200
+
+
+def summarize(*, results: List) -> Dict:
+    '''Summarize the responses of warm-up invocations
+
+    - containers: distinct containers acknowledged, None if no function
+      acknowledged the warm-up
+    - cold: distinct containers acknowledged as cold starts
+    - reused: acknowledgements from containers already counted
+    - confirmed: containers known to be warm, distinct when acknowledged
+
+    Only a few of the errors are detailed, with their description capped.
+    '''
+    failed = [result for result in results if is_failed(result)]
+    acks = [ack for ack in map(get_ack, results) if ack]
+
+    containers = {}
+
+    for ack in acks:
+        containers[ack['container_id']] = \
+            containers.get(ack['container_id'], False) or bool(ack.get('cold'))
+
+    succeeded = len(results) - len(failed)
+
+    return {
+        'invocations': len(results),
+        'succeeded': succeeded,
+        'failed': len(failed),
+        'acknowledged': len(acks),
+        'containers': len(containers) if acks else None,
+        'cold': sum(containers.values()),
+        'reused': len(acks) - len(containers),
+        'confirmed': len(containers) if acks else succeeded,
+        'errors': [
+            response.truncate(
+                text=str(result.get('errorMessage', result.get('error'))),
+                size=constants.RESPONSE_MAX_DESCRIPTION,
+            )
+            for result in failed[:constants.SUMMARY_MAX_ERRORS]
+        ],
+    }
+
+
+def get_hold_tiers(
+        *,
+        hold: int,
+        count: int,
+        request_spread: float = 0.0,
+        tiers: int = constants.HOLD_TIERS,
+        ) -> List[Tuple[int, int]]:
+    '''Split the requests of a warm-up in tiers of decreasing hold times
+
+    Containers only need to stay busy until the last request of the warm-up
+    lands. Requests are sent in order, so later ones have less to wait for:
+    each tier holds for the hold time of the first requests, shortened by
+    the time elapsed since they were sent, estimated from the measured
+    spread between requests (see spread_tracker). The estimate is divided
+    by HOLD_SPREAD_MARGIN, so that a burst slower than measured still
+    overlaps.
+
+    Requests in the same tier share the same payload, which is serialized
+    and signed only once. Consecutive tiers holding for the same time are
+    merged.
+
+    :arg hold: hold time of the first requests, in milliseconds
+    :arg count: number of requests in the warm-up
+    :arg request_spread: milliseconds between consecutive requests sent
+    :return: list of tuples (number of requests, hold time), in dispatch
+        order
+    '''
+    tiers = max(1, min(tiers, count))
+    result = []
+
+    for tier in range(tiers):
+        first = (count * tier) // tiers
+        size = (count * (tier + 1)) // tiers - first
+        elapsed = first * request_spread / constants.HOLD_SPREAD_MARGIN
+        tier_hold = max(
+            hold - math.floor(elapsed),
+            min(hold, constants.HOLD_MIN),
+        )
+
+        if result and result[-1][1] == tier_hold:
+            result[-1] = (result[-1][0] + size, tier_hold)
+        else:
+            result.append((size, tier_hold))
+
+    return result
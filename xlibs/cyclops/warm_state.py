@@ -0,0 +1,238 @@
+'''Estimate of the containers of a function still warm since its last warm-up
+
+Containers confirmed by a warm-up (see utils.summarize) stay warm while idle
+until Lambda reaps them, after a period the platform doesn't disclose. All of
+them are assumed to survive a grace period, after which their survival is
+modeled with an exponential decay of the confirmed count. No container is
+assumed to outlive WARM_STATE_MAX_AGE.
+
+Containers serving real traffic are kept warm by it: the peak concurrency of
+the function in its most recent periods (see wolverine.utils) also counts.
+ConcurrentExecutions includes warm-up invocations as well, so the recent
+warm-ups of each function are recorded, and their invocations subtracted
+from the periods they overlap: otherwise a warm-up would count as traffic
+and skip the next ones by itself.
+
+Lambda routes requests to idle warm containers first, so a warm-up smaller
+than the containers already warm would only ping some of them, without
+starting new ones. Warm-ups are therefore skipped when the estimate covers
+the containers to warm, and fired in full otherwise, which refreshes the
+containers still warm and tops them up to the target. Only functions
+acknowledging warm-ups (see docs/ADAPT_FUNCTIONS) are estimated: otherwise
+successful invocations could have been served by fewer containers.
+
+Chunks of a function are fired concurrently (see professor.packing), so each
+chunk records its warm-ups under its own key, instead of overwriting those of
+the other chunks.
+'''
+import itertools
+import logging
+import math
+import time
+from typing import Callable, Dict, List, Optional
+
+from xlibs import storage, timeseries
+from xlibs.cyclops import constants
+
+
+logger = logging.getLogger(__name__)
+
+
+def survival(*, age: float) -> float:
+    '''Estimate the share of idle containers still warm after a period
+
+    :arg age: seconds since the containers were last warmed
+    '''
+    if age >= constants.WARM_STATE_MAX_AGE:
+        return 0.0
+
+    decaying = max(age - constants.WARM_STATE_GRACE, 0)
+
+    return 0.5 ** (decaying / constants.WARM_STATE_HALF_LIFE)
+
+
+class WarmStateTracker():
+    '''Track containers confirmed warm for functions in a storage backend'''
+
+    def __init__(
+            self,
+            backend: Optional[storage.Storage] = None,
+            clock: Callable = time.time,
+            *args,
+            **kwargs,
+            ):
+        self._backend = backend
+        self._clock = clock
+
+    @property
+    def backend(self) -> storage.Storage:
+        if not self._backend:
+            self._backend = storage.get_storage()
+
+        return self._backend
+
+    def key(
+            self,
+            *,
+            function_name: str,
+            region: str,
+            chunk: Optional[int] = None,
+            ) -> str:
+        if chunk is not None:
+            return f'warm:{region}:{function_name}:{chunk}'
+
+        return f'warm:{region}:{function_name}'
+
+    def load(
+            self,
+            *,
+            function_name: str,
+            region: str,
+            chunk: Optional[int] = None,
+            ) -> Optional[Dict]:
+        '''Load the state of a function, or of one of its chunks, None if
+        missing or unavailable'''
+        try:
+            return self.backend.get(self.key(
+                function_name=function_name,
+                region=region,
+                chunk=chunk,
+            ))
+
+        except Exception as error:
+            logger.warning(f'Failed to load warm state: {error}')
+            return None
+
+    def now(self) -> float:
+        return self._clock()
+
+    def record(
+            self,
+            *,
+            function_name: str,
+            region: str,
+            started_at: float,
+            invocations: int,
+            confirmed: Optional[int] = None,
+            chunk: Optional[int] = None,
+            ) -> None:
+        '''Record a warm-up of a function, failures are not fatal
+
+        :arg started_at: epoch time the warm-up was fired
+        :arg invocations: number of warm-up invocations
+        :arg confirmed: distinct containers acknowledged, None if the
+            function doesn't acknowledge warm-ups
+        :arg chunk: index of the chunk fired, if the warm-up only covered
+            part of the function, whose containers are then not confirmed
+        '''
+        key = {
+            'function_name': function_name,
+            'region': region,
+            'chunk': chunk,
+        }
+        state = self.load(**key) or {}
+        now = self._clock()
+
+        state['warm_ups'] = [
+            warm_up for warm_up in state.get('warm_ups', [])
+            if warm_up[1] > now - constants.WARM_STATE_MAX_AGE
+        ] + [[started_at, now, invocations]]
+
+        if chunk is None and confirmed is not None:
+            state.update(confirmed=confirmed, warmed_at=now)
+
+        elif chunk is None:
+            state.pop('confirmed', None)
+            state.pop('warmed_at', None)
+
+        try:
+            self.backend.put(self.key(**key), state)
+
+        except Exception as error:
+            logger.warning(f'Failed to save warm state: {error}')
+
+    def load_warm_ups(self, *, function_name: str, region: str) -> List:
+        '''Load the recent warm-ups recorded by the chunks of a function
+
+        Chunks are numbered from zero, their keys are read in order until a
+        missing one.
+        '''
+        warm_ups = []
+
+        for chunk in itertools.count():
+            state = self.load(
+                function_name=function_name,
+                region=region,
+                chunk=chunk,
+            )
+
+            if not state:
+                return warm_ups
+
+            warm_ups += state.get('warm_ups', [])
+
+    def get_traffic(
+            self,
+            *,
+            warm_ups: List,
+            recent_concurrency: Optional[Dict],
+            ) -> int:
+        '''Get the peak concurrency of real traffic in recent periods
+
+        :arg warm_ups: recent warm-ups of the function, as lists of
+            [started_at, ended_at, invocations]
+        :arg recent_concurrency: columnar series of the concurrency of the
+            function in its most recent periods
+        '''
+        if not recent_concurrency:
+            return 0
+
+        period = recent_concurrency['period']
+
+        return int(max(
+            (
+                max(concurrency - sum(
+                    invocations
+                    for started_at, ended_at, invocations in warm_ups
+                    if started_at < timestamp + period
+                    and ended_at >= timestamp
+                ), 0)
+                for timestamp, concurrency in
+                timeseries.get_observations(recent_concurrency)
+            ),
+            default=0,
+        ))
+
+    def estimate(
+            self,
+            *,
+            function_name: str,
+            region: str,
+            recent_concurrency: Optional[Dict] = None,
+            ) -> Optional[int]:
+        '''Estimate how many containers of a function are still warm
+
+        :arg recent_concurrency: columnar series of the concurrency of the
+            function in its most recent periods
+        :return: number of containers, None unless the last warm-up of the
+            function was acknowledged
+        '''
+        state = self.load(function_name=function_name, region=region)
+
+        if not state or 'confirmed' not in state:
+            return None
+
+        warmed = math.floor(state['confirmed'] * survival(
+            age=self._clock() - state['warmed_at'],
+        ))
+
+        traffic = self.get_traffic(
+            warm_ups=state.get('warm_ups', []) + self.load_warm_ups(
+                function_name=function_name,
+                region=region,
+            ),
+            recent_concurrency=recent_concurrency,
+        )
+
+        # Warm-ups and traffic may have kept the same containers warm
+        return max(warmed, traffic)
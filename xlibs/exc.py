@@ -21,14 +21,6 @@ class XLambdaExceptionFanOutError(Exception):
     pass
 
 
-class XLambdaExceptionExhaustedWarmBatches(Exception):
-    '''Exhausted available warming batches
-
-    Use in loop: professor.start_warming.prepare_warm_batches
-    '''
-    pass
-
-
 class XLambdaExceptionGetMetricsFailed(Exception):
     '''Failed to get CloudWatch metrics for a Lambda function'''
     pass
@@ -37,3 +29,23 @@ class XLambdaExceptionGetMetricsFailed(Exception):
 class XLambdaExceptionGetSettingsFailed(Exception):
     '''Failed to get settings about a Lambda function'''
     pass
+
+
+class XLambdaExceptionInvalidStorageBackend(Exception):
+    '''Storage backend requested is not recognized'''
+    pass
+
+
+class XLambdaExceptionInvalidQueueBackend(Exception):
+    '''Queue backend requested is not recognized'''
+    pass
+
+
+class XLambdaExceptionForecasterUnavailable(Exception):
+    '''Forecasting backend requested is not recognized or not installed'''
+    pass
+
+
+class XLambdaExceptionMutantFailed(Exception):
+    '''A Mutant Lambda returned an error response'''
+    pass
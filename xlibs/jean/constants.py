@@ -1,4 +1,6 @@
 '''Constant values for Jean Lambda'''
+import os
+
 from xlibs.constants import *  # NOQA
 
 
@@ -7,8 +9,31 @@ REQUIRED_ARGS = [
     'timeframe',
 ]
 
+# Fields of each function sent back to the invoker
+RESPONSE_FIELDS = [
+    'name',
+    'region',
+    'forecast',
+]
+
+# Forecasting backend: numpy (default) or statsmodels (optional dependency)
+FORECASTER_BACKEND = os.environ.get('FORECASTER_BACKEND', 'numpy')
+
+# Fitting parameters for the statsmodels backend
 EXP_SMOOTH_PARAMS = {
     'smoothing_level': 0.5,
     'optimized': True,
     'use_brute': False,
 }
+
+# Vectorized SES engine
+SES_GRID_SIZE = 10
+SES_TOLERANCE = 1e-3
+SES_SCALAR_THRESHOLD = 16  # Evaluate with Python floats up to this size
+
+# Online SES state
+SES_REFIT_INTERVAL = 6 * 3600  # Seconds between full refits
+SES_ERROR_DECAY = 0.05  # Weight of each new error in the rolling MSE
+SES_DRIFT_THRESHOLD = 2.0  # Refit when rolling MSE exceeds baseline by this
+SES_DRIFT_MIN_UPDATES = 12  # Minimum updates before checking for drift
+SES_DRIFT_MIN_MSE = 1.0  # Baseline MSE floor, avoids refitting flat series
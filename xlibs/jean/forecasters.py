@@ -0,0 +1,105 @@
+'''Pluggable forecasting backends for the Jean Lambda
+
+The default backend is the vectorized NumPy SES engine. StatsModels is an
+optional backend, imported only when selected, since it pulls in SciPy and
+pandas, which weigh on the deployment package and the cold start time.
+'''
+import inspect
+from typing import List
+
+import numpy as np
+
+from xlibs import exc
+from xlibs.jean import constants, ses
+
+
+class Forecaster():
+    '''Boilerplate for a Simple Exponential Smoothing forecasting backend'''
+
+    name = None
+
+    def fit(self, *, data: np.ndarray) -> ses.SESFit:
+        '''Fit SES models to a matrix of series (series x periods)'''
+        raise NotImplementedError()
+
+    def forecast(self, *, data: List, timeframe: int) -> List:
+        '''Forecast a single series'''
+        if not data:
+            return [0.0] * timeframe
+
+        fitted = self.fit(data=np.array([data], dtype=float))
+
+        return [float(fitted.level[0])] * timeframe
+
+
+class NumpyForecaster(Forecaster):
+    '''Vectorized SES implemented with NumPy'''
+
+    name = 'numpy'
+
+    def fit(self, *, data: np.ndarray) -> ses.SESFit:
+        return ses.fit(data=data)
+
+
+class StatsmodelsForecaster(Forecaster):
+    '''SES implemented by StatsModels, fitting one series at a time'''
+
+    name = 'statsmodels'
+
+    def fit(self, *, data: np.ndarray) -> ses.SESFit:
+        try:
+            from statsmodels.tsa.holtwinters import SimpleExpSmoothing
+
+        except ImportError as error:
+            raise exc.XLambdaExceptionForecasterUnavailable(
+                'The statsmodels package must be installed to use the '
+                '"statsmodels" forecasting backend.'
+            ) from error
+
+        # Newer StatsModels releases require an explicit initialization method
+        model_params = {}
+
+        if 'initialization_method' in \
+                inspect.signature(SimpleExpSmoothing).parameters:
+            model_params['initialization_method'] = 'estimated'
+
+        fitted = [
+            SimpleExpSmoothing(endog=series, **model_params).fit(
+                **constants.EXP_SMOOTH_PARAMS,
+            )
+            for series in np.atleast_2d(data)
+        ]
+
+        return ses.SESFit(
+            alpha=np.array([f.params['smoothing_level'] for f in fitted]),
+            initial_level=np.array(
+                [f.params['initial_level'] for f in fitted],
+            ),
+            level=np.array([f.forecast(1)[0] for f in fitted]),
+            sse=np.array([f.sse for f in fitted]),
+        )
+
+
+FORECASTERS = {
+    NumpyForecaster.name: NumpyForecaster,
+    StatsmodelsForecaster.name: StatsmodelsForecaster,
+}
+
+
+def get_forecaster(*, backend: str = None) -> Forecaster:
+    '''Get a forecasting backend
+
+    :arg backend: name of the backend, defaults to the FORECASTER_BACKEND
+        env var
+    '''
+    if not backend:
+        backend = constants.FORECASTER_BACKEND
+
+    try:
+        return FORECASTERS[backend]()
+
+    except KeyError as error:
+        raise exc.XLambdaExceptionForecasterUnavailable(
+            f'Forecasting backend "{backend}" is not recognized, expected: '
+            f'{", ".join(FORECASTERS.keys())}.'
+        ) from error
@@ -0,0 +1,197 @@
+'''Vectorized Simple Exponential Smoothing (SES) engine
+
+Fits SES models for a batch of series at once, represented as a 2-D matrix
+(series x periods). For a given smoothing level (alpha), the initial level
+minimizing the sum of squared errors (SSE) has a closed form, since one-step
+predictions are affine in the initial level:
+
+    prediction[t] = a[t] + (1 - alpha) ** t * initial_level
+
+where a[t] are the predictions obtained with a zero initial level. Alpha is
+optimized by evaluating the SSE of all series over a grid of values and then
+refining each series with a vectorized golden-section search.
+'''
+import math
+from typing import NamedTuple
+
+import numpy as np
+
+from xlibs.jean import constants
+
+
+GOLDEN_RATIO = (math.sqrt(5) - 1) / 2
+
+
+class SESFit(NamedTuple):
+    '''Fitted SES parameters, one element per series'''
+    alpha: np.ndarray
+    initial_level: np.ndarray
+    level: np.ndarray
+    sse: np.ndarray
+
+
+def evaluate(*, data: np.ndarray, alpha: np.ndarray) -> tuple:
+    '''Evaluate SES with optimal initial levels for an array of alphas
+
+    :arg data: matrix of observations with shape (series, periods)
+    :arg alpha: smoothing levels broadcastable against (..., series)
+    :return: tuple with SSE, initial level and final level arrays
+    '''
+    alpha = np.asarray(alpha, dtype=float)
+    shape = np.broadcast_shapes(alpha.shape, data.shape[:1])
+
+    # NumPy call overhead dominates with a handful of series
+    if np.prod(shape) <= constants.SES_SCALAR_THRESHOLD:
+        return evaluate_scalar(data=data, alpha=alpha, shape=shape)
+
+    beta = 1 - alpha
+
+    prediction = np.zeros(shape)  # a[t]
+    weight = np.ones(shape)  # (1 - alpha) ** t
+    residual = np.empty(shape)
+    buffer = np.empty(shape)
+    sum_rr = np.zeros(shape)
+    sum_wr = np.zeros(shape)
+
+    # Iterate over contiguous rows of observations, updating arrays in place
+    for observation in np.ascontiguousarray(data.T):
+        np.subtract(observation, prediction, out=residual)
+        sum_rr += np.multiply(residual, residual, out=buffer)
+        sum_wr += np.multiply(weight, residual, out=buffer)
+
+        prediction += np.multiply(alpha, residual, out=buffer)
+        weight *= beta
+
+    # Sum of (1 - alpha) ** (2 * t) over all periods, in closed form
+    decay = 1 - beta * beta
+    sum_ww = np.where(
+        decay > 0,
+        (1 - weight * weight) / np.where(decay > 0, decay, 1),
+        data.shape[1],
+    )
+
+    initial_level = sum_wr / sum_ww
+    sse = np.maximum(sum_rr - sum_wr * initial_level, 0)
+    level = prediction + weight * initial_level
+
+    return sse, initial_level, level
+
+
+def evaluate_scalar(
+        *,
+        data: np.ndarray,
+        alpha: np.ndarray,
+        shape: tuple,
+        ) -> tuple:
+    '''Evaluate SES one series at a time, using Python floats'''
+    alphas = np.broadcast_to(alpha, shape)
+    rows = np.broadcast_to(np.arange(data.shape[0]), shape)
+
+    sse = np.empty(shape)
+    initial_level = np.empty(shape)
+    level = np.empty(shape)
+
+    for index in np.ndindex(*shape):
+        a = float(alphas[index])
+        b = 1 - a
+
+        prediction, weight = 0.0, 1.0
+        sum_rr = sum_wr = sum_ww = 0.0
+
+        for observation in data[rows[index]].tolist():
+            residual = observation - prediction
+            sum_rr += residual * residual
+            sum_wr += weight * residual
+            sum_ww += weight * weight
+
+            prediction += a * residual
+            weight *= b
+
+        initial_level[index] = sum_wr / sum_ww
+        sse[index] = max(sum_rr - sum_wr * initial_level[index], 0)
+        level[index] = prediction + weight * initial_level[index]
+
+    return sse, initial_level, level
+
+
+def fit(
+        *,
+        data: np.ndarray,
+        grid_size: int = constants.SES_GRID_SIZE,
+        tolerance: float = constants.SES_TOLERANCE,
+        ) -> SESFit:
+    '''Fit SES models to a batch of series
+
+    :arg data: matrix of observations with shape (series, periods)
+    :arg grid_size: number of alpha values in the initial grid search
+    :arg tolerance: precision of the golden-section search on alpha
+    '''
+    data = np.atleast_2d(np.asarray(data, dtype=float))
+    rows = np.arange(data.shape[0])
+
+    # Grid search: evaluate every alpha for every series at once
+    grid = np.linspace(0, 1, grid_size + 1)[1:]
+    grid_sse, grid_initial_level, grid_level = evaluate(
+        data=data,
+        alpha=grid[:, np.newaxis],
+    )
+    best = np.argmin(grid_sse, axis=0)
+
+    # Golden-section search within the bracket around the best grid point
+    step = 1 / grid_size
+    lower = np.clip(grid[best] - step, 0, 1)
+    upper = np.clip(grid[best] + step, 0, 1)
+
+    x1 = upper - GOLDEN_RATIO * (upper - lower)
+    x2 = lower + GOLDEN_RATIO * (upper - lower)
+    f1, _, _ = evaluate(data=data, alpha=x1)
+    f2, _, _ = evaluate(data=data, alpha=x2)
+
+    while np.max(upper - lower) > tolerance:
+        left = f1 < f2
+
+        upper = np.where(left, x2, upper)
+        lower = np.where(left, lower, x1)
+
+        new_x = np.where(
+            left,
+            upper - GOLDEN_RATIO * (upper - lower),
+            lower + GOLDEN_RATIO * (upper - lower),
+        )
+        new_f, _, _ = evaluate(data=data, alpha=new_x)
+
+        x1, x2, f1, f2 = (
+            np.where(left, new_x, x2),
+            np.where(left, x1, new_x),
+            np.where(left, new_f, f2),
+            np.where(left, f1, new_f),
+        )
+
+    alpha = (lower + upper) / 2
+    sse, initial_level, level = evaluate(data=data, alpha=alpha)
+
+    # Keep the best grid point if the refinement did not improve on it
+    use_grid = grid_sse[best, rows] < sse
+
+    return SESFit(
+        alpha=np.where(use_grid, grid[best], alpha),
+        initial_level=np.where(
+            use_grid,
+            grid_initial_level[best, rows],
+            initial_level,
+        ),
+        level=np.where(use_grid, grid_level[best, rows], level),
+        sse=np.where(use_grid, grid_sse[best, rows], sse),
+    )
+
+
+def forecast(*, data: np.ndarray, timeframe: int) -> np.ndarray:
+    '''Forecast a batch of series with SES
+
+    :arg data: matrix of observations with shape (series, periods)
+    :arg timeframe: how many periods to forecast
+    :return: matrix of forecasts with shape (series, timeframe)
+    '''
+    fitted = fit(data=data)
+
+    return np.repeat(fitted.level[:, np.newaxis], timeframe, axis=1)
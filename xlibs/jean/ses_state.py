@@ -0,0 +1,154 @@
+'''Online Simple Exponential Smoothing (SES) state per Lambda function
+
+SES is a recursive filter: once fitted, its level can be updated in O(1) for
+each new observation. The state stored for each function holds the smoothing
+level, the fitted alpha, the timestamp of the last observation applied and
+rolling error statistics. The model is only refitted from scratch on a slower
+cadence, or when the rolling error drifts away from the error measured when
+it was fitted.
+
+The most recent datapoint of a series may belong to a partial CloudWatch
+period, so it is never persisted in the state: it is only applied on the fly
+to produce forecasts, and persisted in a later run once complete.
+'''
+import logging
+import time
+from typing import Callable, Dict, List, Optional, Union
+
+from xlibs import storage
+from xlibs.jean import constants
+
+
+logger = logging.getLogger(__name__)
+
+
+class SESStateStore():
+    '''Persist SES states in a storage backend'''
+
+    def __init__(
+            self,
+            backend: Optional[storage.Storage] = None,
+            clock: Callable = time.time,
+            *args,
+            **kwargs,
+            ):
+        self._backend = backend
+        self.clock = clock
+
+    @property
+    def backend(self) -> storage.Storage:
+        if not self._backend:
+            self._backend = storage.get_storage()
+
+        return self._backend
+
+    def key(self, *, function_name: str, region: str) -> str:
+        return f'ses:{region}:{function_name}'
+
+    def load(self, *, function_name: str, region: str) -> Optional[Dict]:
+        '''Load the state of a function, None if missing or unavailable'''
+        try:
+            return self.backend.get(
+                self.key(function_name=function_name, region=region),
+            )
+
+        except Exception as error:
+            logger.warning(f'Failed to load SES state: {error}')
+            return None
+
+    def save(self, *, function_name: str, region: str, state: Dict) -> None:
+        '''Save the state of a function, failures are not fatal'''
+        try:
+            self.backend.put(
+                self.key(function_name=function_name, region=region),
+                state,
+            )
+
+        except Exception as error:
+            logger.warning(f'Failed to save SES state: {error}')
+
+
+def new_state(
+        *,
+        alpha: float,
+        level: float,
+        sse: float,
+        observations: int,
+        last_timestamp: Union[str, int],
+        fitted_at: float,
+        ) -> Dict:
+    '''Build the state of a freshly fitted SES model'''
+    mse = sse / observations if observations else 0.0
+
+    return {
+        'alpha': float(alpha),
+        'level': float(level),
+        'last_timestamp': last_timestamp,
+        'fitted_at': fitted_at,
+        'updates': 0,
+        'mse': mse,
+        'baseline_mse': mse,
+    }
+
+
+def update(*, state: Dict, observations: List[tuple]) -> Dict:
+    '''Apply new observations to an SES state
+
+    :arg state: current SES state
+    :arg observations: list of (timestamp, value) tuples in ascending order;
+        observations already applied to the state are skipped
+    '''
+    state = dict(state)
+
+    for timestamp, value in observations:
+        if timestamp <= state['last_timestamp']:
+            continue
+
+        error = float(value) - state['level']
+
+        state['level'] += state['alpha'] * error
+        state['mse'] += constants.SES_ERROR_DECAY * \
+            (error * error - state['mse'])
+        state['updates'] += 1
+        state['last_timestamp'] = timestamp
+
+    return state
+
+
+def needs_refit(
+        *,
+        state: Optional[Dict],
+        observations: List[tuple],
+        now: float,
+        ) -> bool:
+    '''Check whether an SES model needs to be refitted from scratch
+
+    :arg state: current SES state (None if there's no state yet)
+    :arg observations: list of (timestamp, value) tuples in ascending order
+    :arg now: current epoch time
+    '''
+    if not state or not observations:
+        return True
+
+    # Timestamps of another series format can't be compared
+    if type(state['last_timestamp']) is not type(observations[0][0]):
+        return True
+
+    # The state is too old to be continued with the observations available
+    if state['last_timestamp'] < observations[0][0]:
+        return True
+
+    if now - state['fitted_at'] > constants.SES_REFIT_INTERVAL:
+        return True
+
+    return has_drifted(state=state)
+
+
+def has_drifted(*, state: Dict) -> bool:
+    '''Check whether the rolling error drifted from the fitted error'''
+    if state['updates'] < constants.SES_DRIFT_MIN_UPDATES:
+        return False
+
+    baseline = max(state['baseline_mse'], constants.SES_DRIFT_MIN_MSE)
+
+    return state['mse'] > constants.SES_DRIFT_THRESHOLD * baseline
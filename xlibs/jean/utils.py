@@ -1,23 +1,239 @@
 '''Utility functions for the Jean Lambda'''
 import math
-from typing import List
+from typing import Dict, List, Optional
 
-from statsmodels.tsa.holtwinters import SimpleExpSmoothing
+import numpy as np
 
-from xlibs.jean.constants import EXP_SMOOTH_PARAMS
+from xlibs import timeseries
+from xlibs.jean import constants, forecasters, ses_state
 from xlibs.utils import *  # NOQA
 
 
-def forecasting(*, metrics: List, timeframe: int) -> List:
-    '''Estimate forecasting for Lambda container demand'''
-    data = [float(val) for val in metrics.values()]
+def forecasting(
+        *,
+        metrics: List,
+        timeframe: int,
+        confidence_level: float = constants.CONFIDENCE_LEVEL,
+        ) -> List:
+    '''Estimate forecasting for Lambda container demand
 
-    model = SimpleExpSmoothing(endog=data)
-    fitted_model = model.fit(**EXP_SMOOTH_PARAMS)
+    :return: list of dicts with the point forecast and the upper prediction
+        bound at the confidence level requested, for each period
+    '''
+    data = timeseries.get_values(metrics)
 
-    forecasts = fitted_model.predict(
-        start=len(data),
-        end=len(data) + timeframe - 1,
+    if not data:
+        return prediction_intervals(
+            level=0,
+            alpha=0,
+            mse=0,
+            timeframe=timeframe,
+            confidence_level=confidence_level,
+        )
+
+    forecaster = forecasters.get_forecaster()
+
+    fitted = forecaster.fit(data=np.array([data]))
+
+    return prediction_intervals(
+        level=fitted.level[0],
+        alpha=fitted.alpha[0],
+        mse=fitted.sse[0] / len(data),
+        timeframe=timeframe,
+        confidence_level=confidence_level,
+    )
+
+
+def normal_quantile(*, p: float) -> float:
+    '''Inverse of the standard normal CDF (z-score of a probability)
+
+    statistics.NormalDist is only available from Python 3.8, while Lambdas
+    run on Python 3.7. This is Acklam's rational approximation, with a
+    relative error below 1.15e-9 for 0 < p < 1.
+    '''
+    a = (-3.969683028665376e+01, 2.209460984245205e+02,
+         -2.759285104469687e+02, 1.383577518672690e+02,
+         -3.066479806614716e+01, 2.506628277459239e+00)
+    b = (-5.447609879822406e+01, 1.615858368580409e+02,
+         -1.556989798598866e+02, 6.680131188771972e+01,
+         -1.328068155288572e+01)
+    c = (-7.784894002430293e-03, -3.223964580411365e-01,
+         -2.400758277161838e+00, -2.549732539343734e+00,
+         4.374664141464968e+00, 2.938163982698783e+00)
+    d = (7.784695709041462e-03, 3.224671290700398e-01,
+         2.445134137142996e+00, 3.754408661907416e+00)
+
+    if not 0 < p < 1:
+        raise ValueError(f'Probability must be within (0, 1), got {p!r}')
+
+    def tail(q: float) -> float:
+        return (
+            (((((c[0] * q + c[1]) * q + c[2]) * q + c[3]) * q + c[4]) * q
+             + c[5])
+            / ((((d[0] * q + d[1]) * q + d[2]) * q + d[3]) * q + 1)
+        )
+
+    if p < 0.02425:
+        return tail(math.sqrt(-2 * math.log(p)))
+
+    if p > 1 - 0.02425:
+        return -tail(math.sqrt(-2 * math.log(1 - p)))
+
+    q = p - 0.5
+    r = q * q
+
+    return (
+        (((((a[0] * r + a[1]) * r + a[2]) * r + a[3]) * r + a[4]) * r + a[5])
+        * q
+        / (((((b[0] * r + b[1]) * r + b[2]) * r + b[3]) * r + b[4]) * r + 1)
     )
 
-    return [math.ceil(val) for val in forecasts]
+
+def prediction_intervals(
+        *,
+        level: float,
+        alpha: float,
+        mse: float,
+        timeframe: int,
+        confidence_level: float,
+        ) -> List:
+    '''Forecast SES point values and upper prediction bounds
+
+    The variance of the SES forecast error h periods ahead is:
+
+        mse * (1 + (h - 1) * alpha ** 2)
+
+    Values are rounded up, since they represent container counts.
+
+    :arg level: smoothing level, which is the SES point forecast
+    :arg alpha: smoothing parameter of the SES model
+    :arg mse: mean squared one-step forecast error
+    :arg timeframe: how many periods to forecast
+    :arg confidence_level: one-sided confidence level of the upper bound
+    '''
+    z = normal_quantile(p=confidence_level)
+    point = max(float(level), 0)
+
+    return [
+        {
+            'point': math.ceil(point),
+            'upper': math.ceil(
+                point + z * math.sqrt(mse * (1 + (h - 1) * alpha ** 2))
+            ),
+        }
+        for h in range(1, timeframe + 1)
+    ]
+
+
+def forecasting_batch(
+        *,
+        functions: List[Dict],
+        timeframe: int,
+        store: Optional[ses_state.SESStateStore] = None,
+        ) -> List:
+    '''Estimate forecasting for multiple Lambdas with the vectorized SES
+
+    Functions with a persisted SES state only have their new datapoints
+    applied to it. Functions without a usable state (or due for a refit) are
+    stacked in matrices by series length and fitted at once.
+
+    :arg functions: list of function dicts with "metrics" (in either format
+        supported by xlibs.timeseries) and, optionally,
+        "name" and "region" to persist their SES states and
+        "confidence_level" for the upper prediction bounds
+    :arg timeframe: how many periods to forecast
+    :arg store: where SES states are persisted
+    :return: list of forecasts, in the same order as the functions provided
+    '''
+    if not store:
+        store = ses_state.SESStateStore()
+
+    forecaster = forecasters.get_forecaster()
+    now = store.clock()
+
+    # The last datapoint may be partial, so it's kept out of the SES states
+    series = [
+        timeseries.get_observations(function['metrics'])
+        for function in functions
+    ]
+    history = [observations[:-1] for observations in series]
+    states = [None] * len(functions)
+
+    lengths = {}
+
+    for i, function in enumerate(functions):
+        if not history[i]:
+            continue
+
+        state = None
+
+        if 'name' in function:
+            state = store.load(
+                function_name=function['name'],
+                region=function.get('region'),
+            )
+
+        if not ses_state.needs_refit(
+                state=state,
+                observations=history[i],
+                now=now,
+                ):
+            state = ses_state.update(state=state, observations=history[i])
+
+            if not ses_state.has_drifted(state=state):
+                states[i] = state
+                continue
+
+        lengths.setdefault(len(history[i]), []).append(i)
+
+    for indexes in lengths.values():
+        fitted = forecaster.fit(
+            data=np.array([
+                [float(val) for _, val in history[i]]
+                for i in indexes
+            ]),
+        )
+
+        for j, i in enumerate(indexes):
+            states[i] = ses_state.new_state(
+                alpha=fitted.alpha[j],
+                level=fitted.level[j],
+                sse=fitted.sse[j],
+                observations=len(history[i]),
+                last_timestamp=history[i][-1][0],
+                fitted_at=now,
+            )
+
+    forecasts = []
+
+    for function, observations, state in zip(functions, series, states):
+        confidence_level = function.get(
+            'confidence_level',
+            constants.CONFIDENCE_LEVEL,
+        )
+
+        if not observations:
+            level, alpha, mse = 0, 0, 0
+        elif not state:
+            level, alpha, mse = float(observations[-1][1]), 0, 0
+        else:
+            if 'name' in function:
+                store.save(
+                    function_name=function['name'],
+                    region=function.get('region'),
+                    state=state,
+                )
+
+            alpha, mse = state['alpha'], state['mse']
+            level = state['level'] + alpha * \
+                (float(observations[-1][1]) - state['level'])
+
+        forecasts.append(prediction_intervals(
+            level=level,
+            alpha=alpha,
+            mse=mse,
+            timeframe=timeframe,
+            confidence_level=confidence_level,
+        ))
+
+    return forecasts
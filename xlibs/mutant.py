@@ -1,21 +1,39 @@
 '''Mutant Classes'''
+import asyncio
+import functools
+import importlib
+import logging
 from typing import Dict, List, Optional
-from pprint import PrettyPrinter
 
-from xlibs import async_lambda
-from xlibs.utils import get_function_name
+from xlibs import async_lambda, exc, sigv4, telemetry
+from xlibs.cyclops import constants as cyclops_constants
+from xlibs.cyclops import utils as cyclops_utils
+from xlibs.utils import get_forecast_peak, get_function_name, split_list
 from xlibs.professor import constants
 
-
-pp = PrettyPrinter(indent=2)
+logger = logging.getLogger()
 
 
 class Mutant():
-    '''Boilerplate for a Mutant class representing a Lambda worker'''
+    '''Boilerplate for a Mutant class representing a Lambda worker
 
-    def __init__(self, *args, **kwargs):
+    :arg local: run the Mutant logic within the current process (monolith
+        mode) instead of invoking its Lambda function
+    :arg regional: invoke the Mutant Lambda deployed in the same region as
+        the functions it works on, instead of the X-Lambda region
+    '''
+
+    def __init__(
+            self,
+            *args,
+            local: bool = False,
+            regional: bool = False,
+            **kwargs,
+            ):
         self._name = None
         self._function_name = None
+        self._local = local
+        self._regional = regional
 
     @property
     def function_name(self) -> str:
@@ -24,8 +42,104 @@ class Mutant():
 
         return self._function_name
 
+    @property
+    def module(self):
+        '''Module with the Mutant Lambda handler, e.g. wolverine.py'''
+        return importlib.import_module(self._name)
+
+    def get_region(self, function: Dict) -> str:
+        '''Get the region of the Mutant Lambda to work on a function'''
+        if self._regional:
+            return function.get('region') or constants.REGION
+
+        return constants.REGION
+
+    def traced(self, payload: Dict) -> Dict:
+        '''Add the telemetry trace in progress to a Mutant payload
+
+        The handler of the Mutant continues the trace, instead of starting
+        one of its own (see telemetry.get_trace).
+        '''
+        trace = telemetry.get_trace()
+
+        if self._local or not trace:
+            return payload
+
+        return {**payload, 'trace': trace}
+
+    def group_by_region(self, functions: List) -> Dict[str, List]:
+        '''Group functions by the region of the Mutant Lambda to invoke'''
+        groups = {}
+
+        for function in functions:
+            groups.setdefault(self.get_region(function), []).append(function)
+
+        return groups
+
+    def execute_regions(self, requests: Dict[str, List]) -> List:
+        '''Invoke a Mutant Lambda in multiple regions concurrently
+
+        :arg requests: lists of requests by region
+        '''
+        with telemetry.span('stage', stage=self._name) as span:
+            span.set(requests=sum(len(r) for r in requests.values()))
+
+            if self._local or len(requests) <= 1:
+                return [
+                    response
+                    for region, region_requests in requests.items()
+                    for response in self.execute(
+                        requests=region_requests,
+                        region=region,
+                    )
+                ]
+
+            return async_lambda.invoke_regions(requests=requests)
+
+    def merge(
+            self,
+            *,
+            functions: List,
+            results: List,
+            drop: Optional[List] = None,
+            ) -> List:
+        '''Merge fields returned by a Mutant into the functions sent to it
+
+        Mutants only return the fields they produce, so that functions are
+        not echoed back in full at every stage.
+
+        :arg drop: fields of the functions not needed past this stage
+        '''
+        sent = {
+            (function.get('region'), function.get('name')): function
+            for function in functions
+        }
+
+        return [
+            {
+                **{
+                    key: value
+                    for key, value in sent.get(
+                        (result.get('region'), result.get('name')),
+                        {},
+                    ).items()
+                    if key not in (drop or [])
+                },
+                **result,
+            }
+            for result in results
+        ]
+
     def execute(self, requests: List, region: Optional[str] = None) -> List:
         '''Invoke a Mutant Lambda'''
+        if self._local:
+            return async_lambda.get_loop().run_until_complete(
+                asyncio.gather(*[
+                    self.execute_local(payload=request['payload'])
+                    for request in requests
+                ]),
+            )
+
         if not region:
             region = constants.REGION
 
@@ -34,6 +148,65 @@ class Mutant():
             region=region,
         )
 
+    async def execute_local(self, *, payload: Dict) -> Dict:
+        '''Run the Mutant logic in a worker thread of the current process
+
+        Payloads are handed over as in-memory objects, skipping the
+        serialization and the response envelope of Lambda invocations.
+        '''
+        run = functools.partial(self.module.execute, options=payload)
+
+        try:
+            data = await asyncio.get_event_loop().run_in_executor(None, run)
+
+            return {'status': 200, 'data': data}
+
+        except Exception as error:
+            logger.exception(error)
+
+            return {
+                'status': 500,
+                'error': {
+                    'type': type(error).__name__,
+                    'description': str(error),
+                },
+            }
+
+    async def execute_one(
+            self,
+            *,
+            payload: Dict,
+            region: Optional[str] = None,
+            ) -> Dict:
+        '''Invoke a Mutant Lambda without waiting on other requests
+
+        :return: data returned by the Mutant
+        :raise: XLambdaExceptionMutantFailed, if the Mutant returned an error
+        '''
+        with telemetry.span('stage', stage=self._name) as span:
+            span.set(requests=1)
+
+            if self._local:
+                response = await self.execute_local(payload=payload)
+
+            else:
+                dispatcher = async_lambda.get_dispatcher(
+                    region=region or constants.REGION,
+                )
+
+                response = await dispatcher.invoke(
+                    function_name=self.function_name,
+                    payload=self.traced(payload),
+                )
+
+        if response['status'] != 200:
+            raise exc.XLambdaExceptionMutantFailed(
+                f'{self._name} returned status {response["status"]}: '
+                f'{response.get("error")}'
+            )
+
+        return response['data']
+
 
 class Wolverine(Mutant):
 
@@ -42,26 +215,63 @@ class Wolverine(Mutant):
         self._name = 'wolverine'
 
     def get_metrics(self, functions: List) -> List:
-        '''Get metrics from CloudWatch'''
-        requests = [
-            {
-                'function_name': self.function_name,
-                'payload': function,
-            }
-            for function in functions
-        ]
+        '''Get metrics from CloudWatch
+
+        Functions are packed into multi-function Wolverine requests, each
+        covering up to WOLVERINE_BATCH_SIZE functions.
+        '''
+        requests = {
+            region: [
+                {
+                    'function_name': self.function_name,
+                    'payload': self.traced({'functions': batch}),
+                }
+                for batch in split_list(
+                    list_=region_functions,
+                    n=constants.WOLVERINE_BATCH_SIZE,
+                )
+            ]
+            for region, region_functions in
+            self.group_by_region(functions).items()
+        }
 
-        pp.pprint(requests)
+        response = self.execute_regions(requests=requests)
+
+        for payload in response:
+            if payload['status'] == 200 and payload['data']['errors']:
+                logger.warning(
+                    'Failed to get metrics for functions: '
+                    f"{payload['data']['errors']}"
+                )
+
+        return self.merge(
+            functions=functions,
+            results=[
+                function
+                for payload in response
+                if payload['status'] == 200
+                for function in payload['data']['functions']
+            ],
+        )
 
-        response = self.execute(requests=requests)
+    async def get_functions_metrics(self, functions: List) -> Dict:
+        '''Get CloudWatch metrics for a batch of functions of one region
 
-        pp.pprint(response)
+        :return: dictionary with the functions extended with their metrics
+            and the errors of those that failed
+        '''
+        data = await self.execute_one(
+            payload={'functions': functions},
+            region=self.get_region(functions[0]),
+        )
 
-        return [
-            payload['data']
-            for payload in response
-            if payload['status'] == 200
-        ]
+        return {
+            'functions': self.merge(
+                functions=functions,
+                results=data['functions'],
+            ),
+            'errors': data['errors'],
+        }
 
 
 class Jean(Mutant):
@@ -71,22 +281,59 @@ class Jean(Mutant):
         self._name = 'jean'
 
     def forecast(self, functions_metrics: List, timeframe: int) -> List:
-        '''Forecast future demand for a list of Lambda functions'''
-        requests = [
-            {
-                'function_name': self.function_name,
-                'payload': {**function, **{'timeframe': timeframe}},
-            }
-            for function in functions_metrics
-        ]
+        '''Forecast future demand for a list of Lambda functions
+
+        Functions are packed into multi-function Jean requests, each covering
+        up to JEAN_BATCH_SIZE functions.
+        '''
+        requests = {
+            region: [
+                {
+                    'function_name': self.function_name,
+                    'payload': self.traced({
+                        'functions': batch,
+                        'timeframe': timeframe,
+                    }),
+                }
+                for batch in split_list(
+                    list_=region_functions,
+                    n=constants.JEAN_BATCH_SIZE,
+                )
+            ]
+            for region, region_functions in
+            self.group_by_region(functions_metrics).items()
+        }
 
-        response = self.execute(requests=requests)
+        response = self.execute_regions(requests=requests)
+
+        # Metrics are superseded by the forecast, Cyclops doesn't need them
+        return self.merge(
+            functions=functions_metrics,
+            results=[
+                function
+                for payload in response
+                if payload['status'] == 200
+                for function in payload['data']['functions']
+            ],
+            drop=['metrics'],
+        )
 
-        return [
-            payload['data']
-            for payload in response
-            if payload['status'] == 200
-        ]
+    async def forecast_functions(
+            self,
+            functions: List,
+            timeframe: int,
+            ) -> List:
+        '''Forecast future demand for a batch of functions of one region'''
+        data = await self.execute_one(
+            payload={'functions': functions, 'timeframe': timeframe},
+            region=self.get_region(functions[0]),
+        )
+
+        return self.merge(
+            functions=functions,
+            results=data['functions'],
+            drop=['metrics'],
+        )
 
 
 class Cyclops(Mutant):
@@ -96,15 +343,44 @@ class Cyclops(Mutant):
         self._name = 'cyclops'
         self._target = None
         self._results = None
+        self._init_durations = None
+        self._burst = None
 
     @property
     def results(self):
         return self._results
 
+    @property
+    def send_spread(self) -> Optional[float]:
+        '''Milliseconds between the first and last requests of the burst'''
+        return self._burst['send_spread'] if self._burst else None
+
+    @property
+    def burst_size(self) -> Optional[int]:
+        '''Number of requests released together in the burst'''
+        return self._burst['released'] if self._burst else None
+
+    @property
+    def init_durations(self) -> List[float]:
+        '''Init Durations reported by cold starts of the last warm-up'''
+        return self._init_durations or []
+
+    @property
+    def summary(self) -> Dict:
+        '''Summary of the warm-up results, with distinct containers'''
+        return cyclops_utils.summarize(results=self._results or [])
+
     @property
     def containers_to_warm(self):
-        '''Calculate number of containers to warm up'''
-        forecast = max(self._target.forecast)
+        '''Calculate number of containers to warm up
+
+        Professor provides the count in "warm_count" when it packs warm
+        batches (possibly a chunk of the function demand).
+        '''
+        if self._target.warm_count is not None:
+            return self._target.warm_count
+
+        forecast = get_forecast_peak(forecast=self._target.forecast)
         min_containers = self._target.scaling['min_containers']
         max_containers = min(
             self._target.scaling['max_containers'],
@@ -118,15 +394,19 @@ class Cyclops(Mutant):
 
     def burn(self, functions_demand: List) -> List:
         '''Warm up a list of Lambdas'''
-        requests = [
-            {
-                'function_name': self.function_name,
-                'payload': function,
-            }
-            for function in functions_demand
-        ]
+        requests = {
+            region: [
+                {
+                    'function_name': self.function_name,
+                    'payload': self.traced(function),
+                }
+                for function in region_functions
+            ]
+            for region, region_functions in
+            self.group_by_region(functions_demand).items()
+        }
 
-        response = self.execute(requests=requests)
+        response = self.execute_regions(requests=requests)
 
         return [
             payload['data']
@@ -134,6 +414,28 @@ class Cyclops(Mutant):
             if payload['status'] == 200
         ]
 
+    async def burn_function(self, function: Dict) -> Dict:
+        '''Warm up a single Lambda'''
+        return await self.execute_one(
+            payload=function,
+            region=self.get_region(function),
+        )
+
+    def execute_burst(self, requests: List, region: str) -> List:
+        '''Invoke a Lambda with requests released together
+
+        Falls back to regular invocations when the burst mode is disabled.
+        '''
+        if self._local or not cyclops_constants.WARM_BURST:
+            return self.execute(requests=requests, region=region)
+
+        responses, self._burst = async_lambda.burst_all(
+            requests=requests,
+            region=region,
+        )
+
+        return responses
+
     def aim(self, target: Dict):
         '''Set a Lambda and its settings as target for the Cyclops laser'''
         self._target = CyclopsTarget(**target)
@@ -143,24 +445,63 @@ class Cyclops(Mutant):
     def fire(self):
         '''Activate Cyclops laser on the target Lambda'''
         self._results = []
+        self._init_durations = []
+        self._burst = None
+
+        log_type = 'Tail' if cyclops_constants.WARM_LOG_TAIL else 'None'
+
+        tiers = cyclops_utils.get_hold_tiers(
+            hold=self._target.settings['startup_time'],
+            count=self.containers_to_warm,
+            request_spread=self._target.request_spread,
+        )
 
+        # Requests of a tier share the same body, serialized and hashed once
         requests = [
             {
                 'function_name': self._target.name,
-                'payload': self._target.payload,
+                'payload': payload,
+                'log_type': log_type,
             }
-            for i in range(0, self.containers_to_warm)
+            for count, hold in tiers
+            for payload in [sigv4.serialize(self._target.get_payload(
+                hold=hold,
+            ))]
+            for i in range(0, count)
         ]
 
-        print(
-            f'Warming up {self.containers_to_warm} containers for '
-            f'{self._target.name} function in {self._target.region}.'
-        )
-
-        self._results = self.execute(
-            requests=requests,
-            region=self._target.region,
-        )
+        with telemetry.span('fire', region=self._target.region) as span:
+            span.describe(function=self._target.name)
+
+            responses = self.execute_burst(
+                requests=requests,
+                region=self._target.region,
+            )
+
+            if log_type == 'Tail':
+                self._results = [r['Payload'] for r in responses]
+                self._init_durations = [
+                    duration
+                    for r in responses
+                    for duration in cyclops_utils.get_init_durations(
+                        logs=cyclops_utils.decode_log_result(
+                            log_result=r['LogResult'],
+                        ),
+                    )
+                ]
+
+            else:
+                self._results = responses
+
+            span.set(
+                containers_requested=len(requests),
+                containers_confirmed=self.summary['confirmed'],
+                hold_duration=sum(
+                    count * (hold + self._target.hold_extension)
+                    for count, hold in tiers
+                ),
+                send_spread=self.send_spread,
+            )
 
         return self
 
@@ -174,6 +515,9 @@ class CyclopsTarget():
             settings: Dict,
             forecast: List,
             scaling: Dict,
+            warm_count: Optional[int] = None,
+            hold_extension: int = 0,
+            request_spread: float = 0.0,
             *args,
             **kwargs,
             ):
@@ -182,13 +526,27 @@ class CyclopsTarget():
         self.settings = settings
         self.forecast = forecast
         self.scaling = scaling
+        self.warm_count = warm_count
+        self.hold_extension = hold_extension
+        self.request_spread = request_spread
 
     @property
     def payload(self):
         '''Provide target payload in dictionary format'''
+        return self.get_payload(hold=self.settings['startup_time'])
+
+    def get_payload(self, *, hold: int) -> Dict:
+        '''Provide the payload of a warm-up request holding for a period
+
+        :arg hold: hold time of the request, in milliseconds, extended by
+            the hold extension of chunked functions (see professor.packing)
+        '''
         return {
             'xlambda': {
                 'action': 'warm_up',
-                'settings': self.settings,
+                'settings': {
+                    **self.settings,
+                    'startup_time': hold + self.hold_extension,
+                },
             },
         }
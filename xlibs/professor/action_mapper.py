@@ -1,10 +1,11 @@
 '''Map Professor actions to execution functions'''
 from xlibs import exc
-from xlibs.professor import start_warming
+from xlibs.professor import queue_pipeline, start_warming
 
 
 ACTION_MAP = {
     'warm_up': start_warming,
+    'process_queues': queue_pipeline,
 }
 
 
@@ -1,7 +1,7 @@
 import copy
 from typing import Dict
 
-from xlibs import exc
+from xlibs import exc, queues
 from xlibs.professor import constants
 
 
@@ -27,6 +27,18 @@ class XLambdaConfig():
     def max_concurrency(self):
         return self.default['scaling']['max_concurrency']
 
+    @property
+    def execution(self):
+        return self.options['execution']
+
+    @property
+    def mutant_options(self):
+        '''Options for instantiating Mutants'''
+        return {
+            'local': self.execution['monolith'],
+            'regional': self.execution['regional_workers'],
+        }
+
     def validate_options(self, options: Dict) -> Dict:
         if 'default' not in options:
             options['default'] = {}
@@ -82,6 +94,13 @@ class XLambdaConfig():
                 'Config "lambda_functions" must be a list of dictionaries.'
             )
 
+        for options_ in [default, *functions]:
+            self.validate_confidence_level(options=options_)
+
+        options['execution'] = self.validate_execution(
+            execution=options.get('execution', {}),
+        )
+
         if not all([type('name' in lambda_f) for lambda_f in functions]):
             raise exc.XLambdaExceptionConfigValidationFailed(
                 'Missing \'name\' attribute for one or more Lambdas in '
@@ -90,6 +109,79 @@ class XLambdaConfig():
 
         return options
 
+    def validate_confidence_level(self, options: Dict) -> None:
+        '''Validate the confidence level of forecast prediction bounds'''
+        if 'confidence_level' not in options:
+            return
+
+        level = options['confidence_level']
+
+        if type(level) not in [int, float] or not 0 < level < 1:
+            raise exc.XLambdaExceptionConfigValidationFailed(
+                f"Config 'confidence_level' was provided as {level!r}, "
+                'expected a number between 0 and 1.'
+            )
+
+    def validate_execution(self, execution: Dict) -> Dict:
+        '''Validate execution options, filling in the missing ones'''
+        if type(execution) is not dict:
+            raise exc.XLambdaExceptionConfigValidationFailed(
+                f"Config 'execution' is of type {type(execution).__name__}, "
+                'expected Dict.'
+            )
+
+        execution = {
+            **constants.DEFAULT_EXECUTION,
+            **execution,
+            'concurrency': {
+                **constants.DEFAULT_EXECUTION['concurrency'],
+                **execution.get('concurrency', {}),
+            },
+            'queue': {
+                **constants.DEFAULT_EXECUTION['queue'],
+                **execution.get('queue', {}),
+            },
+        }
+
+        if execution['mode'] not in constants.EXECUTION_MODES:
+            raise exc.XLambdaExceptionConfigValidationFailed(
+                f"Config 'execution.mode' was provided as "
+                f"{execution['mode']!r}, expected one of: "
+                f"{', '.join(constants.EXECUTION_MODES)}."
+            )
+
+        for option in ['monolith', 'regional_workers']:
+            if type(execution[option]) is not bool:
+                raise exc.XLambdaExceptionConfigValidationFailed(
+                    f"Config 'execution.{option}' was provided as type "
+                    f'{type(execution[option]).__name__}, expected Boolean.'
+                )
+
+        for stage, limit in execution['concurrency'].items():
+            if type(limit) is not int or limit < 1:
+                raise exc.XLambdaExceptionConfigValidationFailed(
+                    f"Config 'execution.concurrency.{stage}' was provided "
+                    f'as {limit!r}, expected a positive Integer.'
+                )
+
+        queue = execution['queue']
+
+        if queue['backend'] not in queues.BACKENDS:
+            raise exc.XLambdaExceptionConfigValidationFailed(
+                f"Config 'execution.queue.backend' was provided as "
+                f"{queue['backend']!r}, expected one of: "
+                f"{', '.join(queues.BACKENDS.keys())}."
+            )
+
+        for option, value in queue.items():
+            if option != 'backend' and (type(value) is not int or value < 0):
+                raise exc.XLambdaExceptionConfigValidationFailed(
+                    f"Config 'execution.queue.{option}' was provided as "
+                    f'{value!r}, expected a non-negative Integer.'
+                )
+
+        return execution
+
     def fill_default(self, default: Dict) -> Dict:
         '''Fill default config dict with missing options that are mandatory
 
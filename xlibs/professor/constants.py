@@ -8,8 +8,54 @@ REQUIRED_ARGS = [
 
 CONFIG_FILENAME = 'xlambda-config.yml'
 
+# How many functions to pack in a single Wolverine invocation
+WOLVERINE_BATCH_SIZE = 100
+
+# How many functions to pack in a single Jean invocation
+JEAN_BATCH_SIZE = 100
+
+# Seconds the stream pipeline waits for more functions to reach Wolverine or
+# Jean before invoking it with a partial batch
+STREAM_BATCH_WAIT = 0.05
+
+# Milliseconds added to the longest hold of a warm batch to estimate how
+# long the batch takes, accounting for invocation overheads
+WARM_BATCH_OVERHEAD = 1000
+
+# How functions flow through the Wolverine > Jean > Cyclops stages:
+# - batch: each stage waits for the whole batch before the next one starts
+# - stream: each function advances as soon as its upstream result arrives
+# - queue: per-function jobs flow through work queues consumed by workers
+EXECUTION_MODES = ['batch', 'stream', 'queue']
+
+# Maximum invocations in flight per stage in streaming mode. With monolith
+# enabled, the Mutants' logic runs within the Professor process instead of
+# separate Lambda invocations. With regional_workers enabled, Mutants are
+# invoked in the region of the functions they work on (X-Lambda must be
+# deployed to each of those regions).
+DEFAULT_EXECUTION = {
+    'mode': 'stream',
+    'monolith': False,
+    'regional_workers': False,
+    'concurrency': {
+        'wolverine': 20,
+        'jean': 20,
+        'cyclops': 10,
+    },
+    'queue': {
+        'backend': QUEUE_BACKEND,  # NOQA
+        'workers': 4,  # In-process workers, 0 leaves jobs to external ones
+        'batch_size': QUEUE_BATCH_SIZE,  # NOQA
+        'visibility_timeout': QUEUE_VISIBILITY_TIMEOUT,  # NOQA
+        'max_attempts': QUEUE_MAX_ATTEMPTS,  # NOQA
+        'retry_delay': QUEUE_RETRY_DELAY,  # NOQA
+        'worker_timeout': 840,  # Seconds, within the Lambda timeout
+    },
+}
+
 DEFAULT_CONFIG = {
     'region': 'us-east-1',
+    'confidence_level': CONFIDENCE_LEVEL,  # NOQA
     'scaling': {
         'max_concurrency': 50,
         'min_containers': 1,
@@ -0,0 +1,214 @@
+'''Pack warm-up demand into sequential batches within max_concurrency
+
+Functions are packed first-fit decreasing: sorted by container demand, each
+one goes into the first batch with enough room left, so the number of
+batches fired one after the other stays close to the minimum.
+
+Functions demanding more containers than max_concurrency are split into
+chunks spread across batches. Containers warmed by earlier chunks must still
+be busy when later chunks fire, otherwise the platform would reuse them
+instead of starting new ones. Earlier chunks therefore hold their containers
+for longer: their startup_time is extended by the estimated duration of the
+batches fired until the function's last chunk.
+'''
+import asyncio
+import logging
+import math
+from typing import Awaitable, Callable, Dict, List
+
+from xlibs import telemetry, utils
+from xlibs.professor import constants
+
+
+logger = logging.getLogger()
+
+
+def get_startup_time(*, function: Dict) -> int:
+    return function.get('settings', {}).get('startup_time', 0)
+
+
+def split(*, function: Dict, max_concurrency: int) -> List[Dict]:
+    '''Split a function's demand into chunks of up to max_concurrency'''
+    warm_count = function['warm_count']
+    count = math.ceil(warm_count / max_concurrency)
+
+    if count <= 1:
+        return [function]
+
+    return [
+        {
+            **function,
+            'warm_count': min(
+                max_concurrency,
+                warm_count - i * max_concurrency,
+            ),
+            'chunk': {'index': i, 'count': count},
+        }
+        for i in range(count)
+    ]
+
+
+def get_batch_duration(*, batch: List[Dict]) -> int:
+    '''Estimate how long a batch takes to warm up, in milliseconds'''
+    return max(
+        get_startup_time(function=function) for function in batch
+    ) + constants.WARM_BATCH_OVERHEAD
+
+
+def extend_holds(*, batches: List[List[Dict]]) -> None:
+    '''Extend the hold time of chunks fired before their function's last'''
+    durations = [get_batch_duration(batch=batch) for batch in batches]
+    last_batch = {}
+
+    for i, batch in enumerate(batches):
+        for function in batch:
+            if 'chunk' in function:
+                last_batch[utils.get_function_key(function=function)] = i
+
+    for i, batch in enumerate(batches):
+        for j, function in enumerate(batch):
+            if 'chunk' not in function:
+                continue
+
+            last = last_batch[utils.get_function_key(function=function)]
+            extension = sum(durations[i:last])
+
+            if extension:
+                settings = function.get('settings', {})
+
+                batch[j] = {
+                    **function,
+                    'settings': {
+                        **settings,
+                        'startup_time':
+                            get_startup_time(function=function) + extension,
+                    },
+                    'hold_extension': extension,
+                }
+
+
+def pack(*, functions: List[Dict], max_concurrency: int) -> List[List[Dict]]:
+    '''Pack functions into batches of up to max_concurrency containers
+
+    :arg functions: functions with a demand forecast
+    :return: list of batches, each a list of functions (or chunks of them)
+        with the number of containers to warm in "warm_count"
+    '''
+    items = []
+
+    for function in functions:
+        function['warm_count'] = utils.get_warm_count(function=function)
+
+        items.extend(split(function=function, max_concurrency=max_concurrency))
+
+    # Chunks of the same function keep their order, which is what matters
+    # when extending their hold times
+    items.sort(key=lambda item: item['warm_count'], reverse=True)
+
+    batches = []
+    room = []
+
+    for item in items:
+        for i, available in enumerate(room):
+            if item['warm_count'] <= available:
+                batches[i].append(item)
+                room[i] -= item['warm_count']
+                break
+
+        else:
+            batches.append([item])
+            room.append(max_concurrency - item['warm_count'])
+
+    extend_holds(batches=batches)
+
+    return batches
+
+
+def get_stats(*, batches: List[List[Dict]], max_concurrency: int) -> Dict:
+    '''Measure how efficiently batches use the max_concurrency budget
+
+    - efficiency: containers warmed over the capacity of all batches
+    - min_batches: lower bound on the number of batches for the demand
+    '''
+    containers = sum(f['warm_count'] for batch in batches for f in batch)
+    capacity = len(batches) * max_concurrency
+
+    return {
+        'batches': len(batches),
+        'min_batches': math.ceil(containers / max_concurrency),
+        'containers': containers,
+        'efficiency': round(containers / capacity, 4) if capacity else 1.0,
+        'split_functions': len({
+            utils.get_function_key(function=f)
+            for batch in batches
+            for f in batch
+            if 'chunk' in f
+        }),
+    }
+
+
+async def warm_up(
+        *,
+        batches: List[List[Dict]],
+        burn: Callable[[Dict], Awaitable[Dict]],
+        ) -> Dict:
+    '''Fire batches of warm-up requests one after the other
+
+    A batch starts once the previous one is done, except for chunks with an
+    extended hold, which are still holding their containers on purpose.
+
+    :arg batches: batches prepared with pack
+    :arg burn: coroutine function warming a function (e.g. Cyclops)
+    '''
+    outcome = {'warm_results': [], 'errors': []}
+
+    async def fire(function: Dict) -> None:
+        try:
+            with telemetry.span('warm', region=function.get('region')) as span:
+                span.describe(function=function.get('name'))
+                span.set(containers_requested=function.get('warm_count'))
+
+                result = await burn(function)
+
+                span.set(containers_confirmed=result.get(
+                    'warm_summary', {}).get('confirmed'))
+
+            outcome['warm_results'].append(result)
+
+        except Exception as error:
+            logger.exception(error)
+
+            outcome['errors'].append({
+                'name': function.get('name'),
+                'region': function.get('region'),
+                'type': type(error).__name__,
+                'description': str(error),
+            })
+
+    holding = []
+
+    for batch in batches:
+        tasks = [
+            (function, asyncio.ensure_future(fire(function)))
+            for function in batch
+        ]
+
+        gate = [
+            task for function, task in tasks
+            if 'hold_extension' not in function
+        ]
+        holding.extend(
+            task for function, task in tasks
+            if 'hold_extension' in function
+        )
+
+        if gate:
+            await asyncio.wait(gate)
+
+        else:
+            await asyncio.sleep(get_batch_duration(batch=batch) / 1000)
+
+    if holding:
+        await asyncio.wait(holding)
+
+    return outcome
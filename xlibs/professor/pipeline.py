@@ -0,0 +1,301 @@
+'''Streaming pipeline for the Lambda warming process
+
+Each function flows through Wolverine > Jean > Cyclops on its own, advancing
+as soon as its upstream result arrives, instead of waiting on the slowest
+function of every stage. End-to-end latency therefore tracks the slowest
+single function rather than the sum of the slowest call in each stage.
+
+Functions reaching Wolverine or Jean around the same time are still combined
+into multi-function invocations: a stage batcher flushes its pending
+functions once WOLVERINE_BATCH_SIZE / JEAN_BATCH_SIZE of them are waiting, or
+after STREAM_BATCH_WAIT, and hands each result back to its own flow.
+
+Stage semaphores cap how many invocations of each Mutant are in flight, and
+a capacity limiter keeps the containers being warmed at once within the
+max_concurrency budget. Both are kept per region.
+'''
+import asyncio
+import logging
+from typing import Callable, Dict, List, Tuple
+
+from xlibs import async_lambda, exc, mutant, telemetry
+from xlibs.professor import constants, packing
+
+
+logger = logging.getLogger()
+
+
+class CapacityLimiter():
+    '''Limit the total amount of a shared capacity in use at once
+
+    :arg capacity: total capacity available (e.g. containers)
+    '''
+
+    def __init__(self, capacity: int, *args, **kwargs):
+        self.capacity = capacity
+        self.in_use = 0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self, amount: int) -> int:
+        '''Wait until the amount is available and reserve it
+
+        :return: amount reserved, never more than the total capacity
+        '''
+        amount = min(amount, self.capacity)
+
+        async with self._condition:
+            await self._condition.wait_for(
+                lambda: self.in_use + amount <= self.capacity,
+            )
+            self.in_use += amount
+
+        return amount
+
+    async def release(self, amount: int) -> None:
+        async with self._condition:
+            self.in_use -= amount
+            self._condition.notify_all()
+
+
+class StageBatcher():
+    '''Combine functions submitted by concurrent flows into batch requests
+
+    :arg process: coroutine function processing a list of functions and
+        returning a dictionary with the processed "functions" and, optionally,
+        the "errors" of those that failed
+    :arg semaphore: limit of batch requests in flight
+    :arg size: maximum number of functions in a batch
+    :arg wait: seconds to wait for more functions before flushing a batch
+    :arg error: exception raised in the flows of functions that failed
+    '''
+
+    def __init__(
+            self,
+            process: Callable,
+            semaphore: asyncio.Semaphore,
+            size: int,
+            wait: float,
+            error: type = exc.XLambdaExceptionMutantFailed,
+            *args,
+            **kwargs,
+            ):
+        self.process = process
+        self.semaphore = semaphore
+        self.size = size
+        self.wait = wait
+        self.error = error
+        self.pending = []
+        self._timer = None
+
+    def key(self, function: Dict) -> Tuple:
+        return (function.get('region'), function.get('name'))
+
+    async def submit(self, function: Dict) -> Dict:
+        '''Process a function within the next batch
+
+        :return: the processed function
+        :raise: the batcher error, if processing the function failed
+        '''
+        future = asyncio.get_event_loop().create_future()
+        self.pending.append((function, future))
+
+        if len(self.pending) >= self.size:
+            self.flush()
+
+        elif not self._timer:
+            self._timer = asyncio.get_event_loop().call_later(
+                self.wait,
+                self.flush,
+            )
+
+        return await future
+
+    def flush(self) -> None:
+        '''Start processing the pending functions as a batch'''
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self.pending = self.pending, []
+
+        if batch:
+            asyncio.ensure_future(self.process_batch(batch=batch))
+
+    async def process_batch(self, *, batch: List[Tuple]) -> None:
+        try:
+            async with self.semaphore:
+                data = await self.process([function for function, _ in batch])
+
+        except Exception as error:
+            for _, future in batch:
+                future.set_exception(error)
+
+            return
+
+        results = {
+            self.key(function): function for function in data['functions']
+        }
+        errors = {self.key(error): error for error in data.get('errors', [])}
+
+        for function, future in batch:
+            key = self.key(function)
+
+            if key in results:
+                future.set_result(results[key])
+
+            else:
+                future.set_exception(self.error(
+                    f"Failed to process {function.get('name')}: "
+                    f"{errors.get(key, {}).get('error', 'missing result')}"
+                ))
+
+
+class StreamPipeline():
+    '''Warm up functions through independent per-function flows
+
+    :arg config: validated configuration options loaded from S3
+    '''
+
+    def __init__(self, config, *args, **kwargs):
+        self.config = config
+        self.wolverine = mutant.Wolverine(**config.mutant_options)
+        self.jean = mutant.Jean(**config.mutant_options)
+        self.cyclops = mutant.Cyclops(**config.mutant_options)
+
+    def run(self, *, functions: List) -> Dict:
+        '''Run the warming process for a list of functions'''
+        return async_lambda.get_loop().run_until_complete(
+            self.run_async(functions=functions),
+        )
+
+    def get_limits(self, *, region: str) -> Tuple[Dict, CapacityLimiter]:
+        '''Get the stage semaphores and capacity limiter of a region
+
+        Each region has its own limits, so that regions progress
+        concurrently, and its own max_concurrency budget, like the Lambda
+        concurrency quotas. They are created on demand within the running
+        event loop, to which they are bound.
+        '''
+        if region not in self.limits:
+            self.limits[region] = (
+                {
+                    stage: asyncio.Semaphore(limit)
+                    for stage, limit in
+                    self.config.execution['concurrency'].items()
+                },
+                CapacityLimiter(capacity=self.config.max_concurrency),
+            )
+
+        return self.limits[region]
+
+    def get_batcher(self, *, stage: str, region: str) -> StageBatcher:
+        '''Get the batcher of a stage in a region, within its semaphore'''
+        if (stage, region) not in self.batchers:
+            limits, _ = self.get_limits(region=region)
+
+            if stage == 'wolverine':
+                batcher = StageBatcher(
+                    process=self.wolverine.get_functions_metrics,
+                    semaphore=limits['wolverine'],
+                    size=constants.WOLVERINE_BATCH_SIZE,
+                    wait=constants.STREAM_BATCH_WAIT,
+                    error=exc.XLambdaExceptionGetMetricsFailed,
+                )
+
+            else:
+                batcher = StageBatcher(
+                    process=self.forecast,
+                    semaphore=limits['jean'],
+                    size=constants.JEAN_BATCH_SIZE,
+                    wait=constants.STREAM_BATCH_WAIT,
+                )
+
+            self.batchers[(stage, region)] = batcher
+
+        return self.batchers[(stage, region)]
+
+    async def forecast(self, functions: List) -> Dict:
+        return {
+            'functions': await self.jean.forecast_functions(
+                functions=functions,
+                timeframe=constants.FORECAST_TIMEFRAME,
+            ),
+        }
+
+    async def run_async(self, *, functions: List) -> Dict:
+        self.limits = {}
+        self.batchers = {}
+
+        flows = await asyncio.gather(*[
+            self.flow(function=function)
+            for function in functions
+        ])
+
+        return {
+            'warm_results': [
+                result for flow in flows for result in flow['warm_results']
+            ],
+            'errors': [
+                error for flow in flows for error in flow['errors']
+            ],
+        }
+
+    async def flow(self, *, function: Dict) -> Dict:
+        '''Take a single function through all stages of the pipeline
+
+        :return: dictionary with warm results and errors of the function
+        '''
+        with telemetry.span('function', region=function['region']) as span:
+            span.describe(function=function.get('name'))
+
+            return await self.flow_stages(function=function)
+
+    async def flow_stages(self, *, function: Dict) -> Dict:
+        '''Take a function through the stages, within the region limits'''
+        region = function['region']
+        limits, capacity = self.get_limits(region=region)
+
+        try:
+            function = await self.get_batcher(
+                stage='wolverine',
+                region=region,
+            ).submit(function)
+
+            function = await self.get_batcher(
+                stage='jean',
+                region=region,
+            ).submit(function)
+
+            # Functions above the budget are split into chunks fired in
+            # sequence, with the whole budget reserved meanwhile
+            batches = packing.pack(
+                functions=[function],
+                max_concurrency=self.config.max_concurrency,
+            )
+
+            reserved = await capacity.acquire(function['warm_count'])
+
+            try:
+                async with limits['cyclops']:
+                    outcome = await packing.warm_up(
+                        batches=batches,
+                        burn=self.cyclops.burn_function,
+                    )
+
+            finally:
+                await capacity.release(reserved)
+
+            return outcome
+
+        except Exception as error:
+            logger.exception(error)
+
+            return {
+                'warm_results': [],
+                'errors': [{
+                    'name': function.get('name'),
+                    'region': function.get('region'),
+                    'type': type(error).__name__,
+                    'description': str(error),
+                }],
+            }
@@ -0,0 +1,334 @@
+'''Queue-decoupled pipeline for the Lambda warming process
+
+Professor enqueues one job per function and stage workers consume, process
+and forward them: wolverine > jean > cyclops. Each stage has its own queue
+(see xlibs.queues), so throughput scales with the number of workers instead
+of a single coordinator's wall clock.
+
+Delivery is at-least-once. Failed jobs become visible again after an
+exponential backoff and are dropped after a maximum number of attempts.
+Each job carries an idempotency key, so duplicate deliveries are discarded
+instead of processed (and warmed) twice.
+'''
+import concurrent.futures
+import contextvars
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+import uuid
+
+from xlibs import (
+    async_lambda,
+    constants,
+    mutant,
+    queues,
+    storage,
+    telemetry,
+    utils,
+)
+from xlibs.professor import packing
+
+
+logger = logging.getLogger()
+
+STAGES = ['wolverine', 'jean', 'cyclops']
+
+
+class StageWorker():
+    '''Consume jobs from a stage queue and forward results to the next one
+
+    :arg stage: name of the stage
+    :arg process: callable receiving a list of functions and returning the
+        ones processed successfully
+    :arg queue: queue of jobs for this stage
+    :arg next_queue: queue of the following stage, if any
+    :arg options: queue execution options (see DEFAULT_EXECUTION)
+    :arg state: storage for idempotency keys
+    '''
+
+    def __init__(
+            self,
+            *,
+            stage: str,
+            process: Callable[[List[Dict]], List[Dict]],
+            queue: queues.Queue,
+            next_queue: Optional[queues.Queue],
+            options: Dict,
+            state: storage.Storage,
+            ):
+        self.stage = stage
+        self.process = process
+        self.queue = queue
+        self.next_queue = next_queue
+        self.options = options
+        self.state = state
+
+    def state_key(self, *, job_key: str) -> str:
+        return f'queue:{self.stage}:{job_key}'
+
+    def is_done(self, *, job_key: str, job_id: str) -> bool:
+        '''Whether a job was already processed in this stage'''
+        done = self.state.get(self.state_key(job_key=job_key))
+
+        return done is not None and done['job_id'] == job_id
+
+    def poll(self) -> Optional[Dict]:
+        '''Process a batch of jobs from the queue
+
+        :return: None if no job was available, otherwise a dictionary with
+            the results and errors of the batch
+        '''
+        messages = self.queue.receive(
+            max_messages=self.options['batch_size'],
+            visibility_timeout=self.options['visibility_timeout'],
+        )
+
+        if not messages:
+            return None
+
+        with telemetry.span('queue', stage=self.stage) as span:
+            span.set(requests=len(messages))
+
+            return self.process_messages(messages=messages)
+
+    def process_messages(self, *, messages: List[queues.Message]) -> Dict:
+        '''Process a batch of jobs received from the queue'''
+
+        jobs = {}
+
+        for message in messages:
+            job_key = utils.get_function_key(function=message.body['function'])
+
+            if self.is_done(job_key=job_key, job_id=message.body['job_id']):
+                # Duplicate delivery of a job already processed
+                self.queue.delete(message)
+                continue
+
+            if job_key in jobs:
+                # Another job for the same function is in this batch, retry
+                # this one after it is done
+                self.queue.release(message, delay=self.options['retry_delay'])
+                continue
+
+            jobs[job_key] = message
+
+        try:
+            processed = self.process([
+                message.body['function'] for message in jobs.values()
+            ]) if jobs else []
+
+        except Exception as error:
+            logger.exception(error)
+            processed = []
+
+        processed = {
+            utils.get_function_key(function=function): function
+            for function in processed
+        }
+
+        outcome = {'results': [], 'errors': []}
+
+        for job_key, message in jobs.items():
+            job_id = message.body['job_id']
+
+            if job_key in processed:
+                if self.next_queue:
+                    self.next_queue.send(
+                        {'job_id': job_id, 'function': processed[job_key]},
+                        dedup_key=job_id,
+                    )
+
+                self.state.put(
+                    self.state_key(job_key=job_key),
+                    {'job_id': job_id},
+                )
+                self.queue.delete(message)
+                outcome['results'].append(processed[job_key])
+
+            elif message.attempts >= self.options['max_attempts']:
+                self.queue.delete(message)
+                outcome['errors'].append({
+                    'job_id': job_id,
+                    'stage': self.stage,
+                    'attempts': message.attempts,
+                })
+
+            else:
+                self.queue.release(
+                    message,
+                    delay=self.options['retry_delay'] *
+                    2 ** (message.attempts - 1),
+                )
+
+        return outcome
+
+
+class QueuePipeline():
+    '''Warm up functions through queue-decoupled stage workers
+
+    :arg config: validated configuration options loaded from S3
+    '''
+
+    def __init__(self, config, *args, **kwargs):
+        self.config = config
+        self.options = config.execution['queue']
+
+        self.wolverine = mutant.Wolverine(**config.mutant_options)
+        self.jean = mutant.Jean(**config.mutant_options)
+        self.cyclops = mutant.Cyclops(**config.mutant_options)
+
+        # Warm batches from concurrent workers of this process must not
+        # exceed max_concurrency together
+        self._cyclops_lock = threading.Lock()
+
+        self.queues = {
+            stage: queues.get_queue(
+                name=stage,
+                backend=self.options['backend'],
+            )
+            for stage in STAGES
+        }
+
+        processors = {
+            'wolverine': self.get_metrics,
+            'jean': self.forecast,
+            'cyclops': self.warm_up,
+        }
+
+        state = storage.get_storage()
+
+        self.workers = {
+            stage: StageWorker(
+                stage=stage,
+                process=processors[stage],
+                queue=self.queues[stage],
+                next_queue=self.queues.get(next_stage),
+                options=self.options,
+                state=state,
+            )
+            for stage, next_stage in zip(STAGES, STAGES[1:] + [None])
+        }
+
+    def get_metrics(self, functions: List) -> List:
+        return self.wolverine.get_metrics(functions=functions)
+
+    def forecast(self, functions: List) -> List:
+        return self.jean.forecast(
+            functions_metrics=functions,
+            timeframe=constants.FORECAST_TIMEFRAME,
+        )
+
+    def warm_up(self, functions: List) -> List:
+        with self._cyclops_lock:
+            outcome = async_lambda.get_loop().run_until_complete(
+                packing.warm_up(
+                    batches=packing.pack(
+                        functions=functions,
+                        max_concurrency=self.config.max_concurrency,
+                    ),
+                    burn=self.cyclops.burn_function,
+                ),
+            )
+
+        # Functions split in chunks are done when all chunks succeeded
+        failed = {
+            utils.get_function_key(function=error)
+            for error in outcome['errors']
+        }
+
+        return list({
+            utils.get_function_key(function=result): result
+            for result in outcome['warm_results']
+            if utils.get_function_key(function=result) not in failed
+        }.values())
+
+    def enqueue(self, *, functions: List) -> int:
+        '''Enqueue one job per function for the current warming cycle
+
+        :return: number of jobs enqueued
+        '''
+        cycle = uuid.uuid4().hex
+
+        return sum(
+            self.queues['wolverine'].send(
+                {'job_id': job_id, 'function': function},
+                dedup_key=job_id,
+            )
+            for function in functions
+            for job_id in [
+                f'{cycle}:{utils.get_function_key(function=function)}',
+            ]
+        )
+
+    def run(self, *, functions: List) -> Dict:
+        '''Enqueue functions and process them with in-process workers
+
+        With no in-process workers configured, jobs are left for external
+        workers (see the "process_queues" Professor action).
+        '''
+        enqueued = self.enqueue(functions=functions)
+
+        if not self.options['workers']:
+            return {'enqueued': enqueued}
+
+        return {'enqueued': enqueued, **self.drain()}
+
+    def drain(self, *, deadline: Optional[float] = None) -> Dict:
+        '''Process jobs from all stages until the queues are empty
+
+        :arg deadline: epoch time when workers stop picking up new jobs
+        '''
+        outcome = {'warm_results': [], 'errors': []}
+        lock = threading.Lock()
+
+        def work():
+            try:
+                while deadline is None or time.time() < deadline:
+                    polled = False
+
+                    # Downstream stages first, to finish jobs in flight
+                    for stage in reversed(STAGES):
+                        batch = self.workers[stage].poll()
+
+                        if batch is None:
+                            continue
+
+                        polled = True
+
+                        with lock:
+                            outcome['errors'].extend(batch['errors'])
+
+                            if stage == 'cyclops':
+                                outcome['warm_results'].extend(
+                                    batch['results'])
+
+                    if not polled:
+                        if not any(q.size() for q in self.queues.values()):
+                            return
+
+                        # Jobs are invisible, waiting for a retry
+                        time.sleep(constants.QUEUE_POLL_INTERVAL)
+
+            finally:
+                async_lambda.close_loop()
+
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.options['workers']) as executor:
+            for future in [
+                    executor.submit(contextvars.copy_context().run, work)
+                    for _ in range(self.options['workers'])]:
+                future.result()
+
+        return outcome
+
+
+def run(*, config) -> Dict:
+    '''Process queued jobs until the queues are empty or time runs out
+
+    Entry point for stand-alone workers: invoke the Professor with the
+    "process_queues" action from as many concurrent workers as needed.
+    '''
+    deadline = time.time() + config.execution['queue']['worker_timeout']
+
+    return QueuePipeline(config=config).drain(deadline=deadline)
@@ -1,7 +1,14 @@
 '''Start the execution of the Lambda warming process'''
+import concurrent.futures
+import contextvars
+import logging
 from typing import Dict, List
 
-from xlibs import constants, exc, mutant, utils
+from xlibs import async_lambda, constants, mutant, utils
+from xlibs.professor import packing, pipeline, queue_pipeline
+
+
+logger = logging.getLogger()
 
 
 def run(*, config: Dict) -> Dict:
@@ -11,14 +18,84 @@ def run(*, config: Dict) -> Dict:
     '''
     functions = prepare_functions(config=config)
 
-    return [
-        result
-        for batch in utils.split_list(
-            list_=functions,
-            n=config.max_concurrency,
+    if config.execution['mode'] == 'queue':
+        return queue_pipeline.QueuePipeline(config=config).run(
+            functions=functions,
         )
-        for result in execute_batch(functions=batch, config=config)
-    ]
+
+    if config.execution['mode'] == 'stream':
+        return pipeline.StreamPipeline(config=config).run(
+            functions=functions,
+        )
+
+    return run_batches(functions=functions, config=config)
+
+
+def run_batches(*, functions: List, config) -> Dict:
+    '''Run the warming process in batches, regions concurrently
+
+    Lambda concurrency quotas are regional, so each region gets its own
+    max_concurrency budget and its batches don't wait on other regions.
+    '''
+    regions = {}
+
+    for function in functions:
+        regions.setdefault(function['region'], []).append(function)
+
+    def run_region(region_functions: List) -> List:
+        return [
+            execute_batch(functions=batch, config=config)
+            for batch in utils.split_list(
+                list_=region_functions,
+                n=config.max_concurrency,
+            )
+        ]
+
+    def run_region_thread(region_functions: List) -> List:
+        try:
+            return run_region(region_functions)
+
+        finally:
+            async_lambda.close_loop()
+
+    if len(regions) <= 1:
+        outcomes = [
+            outcome
+            for region_functions in regions.values()
+            for outcome in run_region(region_functions)
+        ]
+
+    else:
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=len(regions)) as executor:
+            # Threads carry on the telemetry span of the run
+            futures = [
+                executor.submit(
+                    contextvars.copy_context().run,
+                    run_region_thread,
+                    region_functions,
+                )
+                for region_functions in regions.values()
+            ]
+
+            outcomes = [
+                outcome
+                for future in futures
+                for outcome in future.result()
+            ]
+
+    return {
+        'warm_results': [
+            result
+            for outcome in outcomes
+            for result in outcome['warm_results']
+        ],
+        'errors': [
+            error
+            for outcome in outcomes
+            for error in outcome.get('errors', [])
+        ],
+    }
 
 
 def execute_batch(*, functions: List, config) -> List:
@@ -28,11 +105,11 @@ def execute_batch(*, functions: List, config) -> List:
     :arg config: validated configuration options loaded from S3
     '''
     # Get metrics from CloudWatch
-    wolverine = mutant.Wolverine()
+    wolverine = mutant.Wolverine(**config.mutant_options)
     functions = wolverine.get_metrics(functions=functions)
 
     # Run predictions for how many containers should be warmed up
-    jean = mutant.Jean()
+    jean = mutant.Jean(**config.mutant_options)
     functions = jean.forecast(
         functions_metrics=functions,
         timeframe=constants.FORECAST_TIMEFRAME,
@@ -44,16 +121,22 @@ def execute_batch(*, functions: List, config) -> List:
         max_concurrency=config.max_concurrency,
     )
 
+    stats = packing.get_stats(
+        batches=warm_batches,
+        max_concurrency=config.max_concurrency,
+    )
+    logger.info(f'Warm batches packing: {stats}')
+
     # Warm up the containers
-    cyclops = mutant.Cyclops()
-    warm_results = [
-        result
-        for functions_batch in warm_batches
-        for result in cyclops.burn(functions_demand=functions_batch)
-    ]
+    cyclops = mutant.Cyclops(**config.mutant_options)
+    outcome = async_lambda.get_loop().run_until_complete(packing.warm_up(
+        batches=warm_batches,
+        burn=cyclops.burn_function,
+    ))
 
     return {
-        'warm_results': warm_results,
+        **outcome,
+        'packing': stats,
     }
 
 
@@ -72,30 +155,9 @@ def prepare_functions(*, config) -> List:
 
 
 def prepare_warm_batches(*, functions: List, max_concurrency: int) -> List:
-    '''Prepare batches of functions within the max concurrency limit'''
-    batches = [{'sum': 0, 'functions': []}]
-
-    for f in functions:
-        demand_peak = max(f['forecast'])
+    '''Prepare batches of functions within the max concurrency limit
 
-        f['warm_count'] = min(
-            demand_peak,
-            max_concurrency,
-            f['scaling']['max_containers'],
-        )
-
-        for batch in batches:
-            try:
-                if batch['sum'] + f['warm_count'] <= max_concurrency:
-                    batch['functions'].append(f)
-                    batch['sum'] += f['warm_count']
-                    break
-
-                raise exc.XLambdaExceptionExhaustedWarmBatches()
-
-            except exc.XLambdaExceptionExhaustedWarmBatches:
-                new_batch = {'sum': f['warm_count'], 'functions': [f]}
-                batches.append(new_batch)
-                break
-
-    return [batch['functions'] for batch in batches]
+    Functions demanding more than max_concurrency containers are split
+    across batches (see packing).
+    '''
+    return packing.pack(functions=functions, max_concurrency=max_concurrency)
@@ -0,0 +1,380 @@
+'''Work queues decoupling the stages of the warming process
+
+Message bodies are JSON-serializable dictionaries. Delivery is at-least-once:
+a received message becomes invisible for a visibility timeout and shows up
+again unless it is deleted, so crashed or failed jobs are retried. Backends:
+
+- memory: process memory, useful for tests and in-process workers
+- sqlite: a single SQLite database file, shared by local worker processes
+- sqs: an Amazon SQS queue (FIFO queues also deduplicate on send)
+'''
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional
+import uuid
+
+from xlibs import constants, exc
+from xlibs.aws_clients import get_client
+
+
+class Message(NamedTuple):
+    '''Message received from a queue'''
+    body: Dict
+    receipt: str
+    attempts: int
+
+
+class Queue():
+    '''Boilerplate for a work queue backend'''
+
+    def send(self, body: Dict, *, dedup_key: Optional[str] = None) -> bool:
+        '''Send a message to the queue
+
+        :arg dedup_key: idempotency key, messages with a key already waiting
+            in the queue are dropped (where supported by the backend)
+        :return: whether the message was enqueued
+        '''
+        raise NotImplementedError()
+
+    def receive(
+            self,
+            *,
+            max_messages: int = constants.QUEUE_BATCH_SIZE,
+            visibility_timeout: int = constants.QUEUE_VISIBILITY_TIMEOUT,
+            ) -> List[Message]:
+        '''Receive visible messages, hiding them for a visibility timeout'''
+        raise NotImplementedError()
+
+    def delete(self, message: Message) -> None:
+        '''Acknowledge a message, removing it from the queue for good'''
+        raise NotImplementedError()
+
+    def release(self, message: Message, *, delay: float = 0) -> None:
+        '''Make a received message visible again after a delay (retry)'''
+        raise NotImplementedError()
+
+    def size(self) -> int:
+        '''Approximate number of messages in the queue, visible or not'''
+        raise NotImplementedError()
+
+
+class MemoryQueue(Queue):
+    '''Queue messages in process memory'''
+
+    def __init__(self, clock=time.time, *args, **kwargs):
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._messages = {}
+
+    def send(self, body: Dict, *, dedup_key: Optional[str] = None) -> bool:
+        with self._lock:
+            if dedup_key and any(
+                    message['dedup_key'] == dedup_key
+                    for message in self._messages.values()):
+                return False
+
+            self._messages[uuid.uuid4().hex] = {
+                'body': json.dumps(body),
+                'dedup_key': dedup_key,
+                'visible_at': self._clock(),
+                'attempts': 0,
+                'receipt': None,
+            }
+
+        return True
+
+    def receive(
+            self,
+            *,
+            max_messages: int = constants.QUEUE_BATCH_SIZE,
+            visibility_timeout: int = constants.QUEUE_VISIBILITY_TIMEOUT,
+            ) -> List[Message]:
+        now = self._clock()
+        received = []
+
+        with self._lock:
+            for message in self._messages.values():
+                if len(received) >= max_messages:
+                    break
+
+                if message['visible_at'] > now:
+                    continue
+
+                message['visible_at'] = now + visibility_timeout
+                message['attempts'] += 1
+                message['receipt'] = uuid.uuid4().hex
+
+                received.append(Message(
+                    body=json.loads(message['body']),
+                    receipt=message['receipt'],
+                    attempts=message['attempts'],
+                ))
+
+        return received
+
+    def find(self, receipt: str) -> Optional[str]:
+        '''Find the ID of a message by its latest receipt'''
+        for message_id, message in self._messages.items():
+            if message['receipt'] == receipt:
+                return message_id
+
+        return None
+
+    def delete(self, message: Message) -> None:
+        with self._lock:
+            self._messages.pop(self.find(message.receipt), None)
+
+    def release(self, message: Message, *, delay: float = 0) -> None:
+        with self._lock:
+            message_id = self.find(message.receipt)
+
+            if message_id:
+                self._messages[message_id]['visible_at'] = \
+                    self._clock() + delay
+
+    def size(self) -> int:
+        with self._lock:
+            return len(self._messages)
+
+
+class SQLiteQueue(Queue):
+    '''Queue messages in a SQLite database'''
+
+    def __init__(
+            self,
+            name: str,
+            path: str = constants.QUEUE_SQLITE_PATH,
+            clock=time.time,
+            *args,
+            **kwargs,
+            ):
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+        self._name = name
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS xlambda_queue ('
+            'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+            'queue TEXT NOT NULL, '
+            'body TEXT NOT NULL, '
+            'dedup_key TEXT, '
+            'visible_at REAL NOT NULL, '
+            'attempts INTEGER NOT NULL DEFAULT 0, '
+            'receipt TEXT, '
+            'UNIQUE (queue, dedup_key))'
+        )
+        self._connection.commit()
+
+    def send(self, body: Dict, *, dedup_key: Optional[str] = None) -> bool:
+        with self._lock, self._connection:
+            cursor = self._connection.execute(
+                'INSERT OR IGNORE INTO xlambda_queue '
+                '(queue, body, dedup_key, visible_at) VALUES (?, ?, ?, ?)',
+                (self._name, json.dumps(body), dedup_key, self._clock()),
+            )
+
+        return cursor.rowcount == 1
+
+    def receive(
+            self,
+            *,
+            max_messages: int = constants.QUEUE_BATCH_SIZE,
+            visibility_timeout: int = constants.QUEUE_VISIBILITY_TIMEOUT,
+            ) -> List[Message]:
+        now = self._clock()
+        received = []
+
+        # BEGIN IMMEDIATE locks the database so that concurrent workers in
+        # other processes never receive the same message
+        with self._lock:
+            self._connection.execute('BEGIN IMMEDIATE')
+
+            try:
+                rows = self._connection.execute(
+                    'SELECT id, body, attempts FROM xlambda_queue '
+                    'WHERE queue = ? AND visible_at <= ? ORDER BY id LIMIT ?',
+                    (self._name, now, max_messages),
+                ).fetchall()
+
+                for message_id, body, attempts in rows:
+                    receipt = uuid.uuid4().hex
+
+                    self._connection.execute(
+                        'UPDATE xlambda_queue SET visible_at = ?, '
+                        'attempts = ?, receipt = ? WHERE id = ?',
+                        (now + visibility_timeout, attempts + 1, receipt,
+                         message_id),
+                    )
+
+                    received.append(Message(
+                        body=json.loads(body),
+                        receipt=receipt,
+                        attempts=attempts + 1,
+                    ))
+
+                self._connection.commit()
+
+            except Exception:
+                self._connection.rollback()
+                raise
+
+        return received
+
+    def delete(self, message: Message) -> None:
+        with self._lock, self._connection:
+            self._connection.execute(
+                'DELETE FROM xlambda_queue WHERE receipt = ?',
+                (message.receipt,),
+            )
+
+    def release(self, message: Message, *, delay: float = 0) -> None:
+        with self._lock, self._connection:
+            self._connection.execute(
+                'UPDATE xlambda_queue SET visible_at = ? WHERE receipt = ?',
+                (self._clock() + delay, message.receipt),
+            )
+
+    def size(self) -> int:
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT COUNT(*) FROM xlambda_queue WHERE queue = ?',
+                (self._name,),
+            ).fetchone()
+
+        return row[0]
+
+
+class SQSQueue(Queue):
+    '''Queue messages in Amazon SQS
+
+    Queue names ending in ".fifo" deduplicate messages by their dedup_key
+    within SQS's five-minute deduplication interval. Standard queues may
+    deliver duplicates, which workers discard by idempotency key.
+    '''
+
+    def __init__(
+            self,
+            name: str,
+            region: str = constants.REGION,
+            *args,
+            **kwargs,
+            ):
+        self._name = constants.QUEUE_NAME.format(name=name)
+        self._client = get_client(service='sqs', region=region)
+        self._url = None
+
+    @property
+    def url(self) -> str:
+        if not self._url:
+            self._url = self._client.get_queue_url(
+                QueueName=self._name,
+            )['QueueUrl']
+
+        return self._url
+
+    @property
+    def is_fifo(self) -> bool:
+        return self._name.endswith('.fifo')
+
+    def send(self, body: Dict, *, dedup_key: Optional[str] = None) -> bool:
+        options = {}
+
+        if self.is_fifo:
+            options['MessageGroupId'] = dedup_key or uuid.uuid4().hex
+            options['MessageDeduplicationId'] = dedup_key or \
+                uuid.uuid4().hex
+
+        self._client.send_message(
+            QueueUrl=self.url,
+            MessageBody=json.dumps(body),
+            **options,
+        )
+
+        return True
+
+    def receive(
+            self,
+            *,
+            max_messages: int = constants.QUEUE_BATCH_SIZE,
+            visibility_timeout: int = constants.QUEUE_VISIBILITY_TIMEOUT,
+            ) -> List[Message]:
+        response = self._client.receive_message(
+            QueueUrl=self.url,
+            MaxNumberOfMessages=min(max_messages, 10),
+            VisibilityTimeout=visibility_timeout,
+            AttributeNames=['ApproximateReceiveCount'],
+        )
+
+        return [
+            Message(
+                body=json.loads(message['Body']),
+                receipt=message['ReceiptHandle'],
+                attempts=int(
+                    message['Attributes']['ApproximateReceiveCount']),
+            )
+            for message in response.get('Messages', [])
+        ]
+
+    def delete(self, message: Message) -> None:
+        self._client.delete_message(
+            QueueUrl=self.url,
+            ReceiptHandle=message.receipt,
+        )
+
+    def release(self, message: Message, *, delay: float = 0) -> None:
+        self._client.change_message_visibility(
+            QueueUrl=self.url,
+            ReceiptHandle=message.receipt,
+            VisibilityTimeout=int(delay),
+        )
+
+    def size(self) -> int:
+        attributes = self._client.get_queue_attributes(
+            QueueUrl=self.url,
+            AttributeNames=[
+                'ApproximateNumberOfMessages',
+                'ApproximateNumberOfMessagesNotVisible',
+            ],
+        )['Attributes']
+
+        return sum(int(value) for value in attributes.values())
+
+
+BACKENDS = {
+    'memory': MemoryQueue,
+    'sqlite': SQLiteQueue,
+    'sqs': SQSQueue,
+}
+
+_queues = {}
+_queues_lock = threading.Lock()
+
+
+def get_queue(*, name: str, backend: Optional[str] = None) -> Queue:
+    '''Get a queue, reused across invocations of a warm container
+
+    :arg name: name of the queue, e.g. the stage consuming its messages
+    :arg backend: name of the backend, defaults to the QUEUE_BACKEND env var
+    '''
+    if not backend:
+        backend = constants.QUEUE_BACKEND
+
+    if backend not in BACKENDS:
+        raise exc.XLambdaExceptionInvalidQueueBackend(
+            f'Queue backend "{backend}" is not recognized, expected: '
+            f'{", ".join(BACKENDS.keys())}.'
+        )
+
+    key = (backend, name)
+
+    with _queues_lock:
+        if key not in _queues:
+            _queues[key] = BACKENDS[backend](name=name)
+
+        return _queues[key]
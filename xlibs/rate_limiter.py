@@ -0,0 +1,192 @@
+'''Client-side rate limiting of AWS API requests
+
+Each API and region pair gets a token bucket sized to the documented quota.
+Throttled requests are retried with jittered exponential backoff, and the
+bucket rate adapts with AIMD (additive increase, multiplicative decrease).
+'''
+import random
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from botocore.exceptions import ClientError
+
+from xlibs import constants, telemetry
+
+
+class RateLimiter():
+    '''Token bucket rate limiter with AIMD adaptive rate
+
+    :arg api: name of the API limited, e.g. "GetMetricData"
+    :arg region: AWS region of the API endpoint
+    '''
+
+    def __init__(
+            self,
+            rate: float,
+            burst: Optional[float] = None,
+            min_rate: float = constants.RATE_LIMIT_MIN_RATE,
+            max_retries: int = constants.RATE_LIMIT_MAX_RETRIES,
+            clock: Callable = time.monotonic,
+            sleep: Callable = time.sleep,
+            api: Optional[str] = None,
+            region: Optional[str] = None,
+            *args,
+            **kwargs,
+            ):
+        self.api = api
+        self.region = region
+        self.max_rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.rate = rate
+        self.burst = burst if burst else rate
+        self.max_retries = max_retries
+
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._tokens = self.burst
+        self._updated_at = clock()
+
+        self.throttles = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.retries = 0
+
+    @property
+    def stats(self) -> Dict:
+        return {
+            'rate': self.rate,
+            'throttles': self.throttles,
+            'waits': self.waits,
+            'wait_time': round(self.wait_time, 3),
+            'retries': self.retries,
+        }
+
+    def acquire(self) -> None:
+        '''Take a token from the bucket, waiting until one is available
+
+        Tokens are reserved upfront: when the bucket is empty, the balance
+        goes negative and the caller sleeps until its token is refilled.
+        '''
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(
+                self.burst,
+                self._tokens + (now - self._updated_at) * self.rate,
+            )
+            self._updated_at = now
+            self._tokens -= 1
+
+            delay = -self._tokens / self.rate if self._tokens < 0 else 0
+
+            if delay:
+                self.waits += 1
+                self.wait_time += delay
+
+        if delay:
+            self._sleep(delay)
+
+    def on_success(self) -> None:
+        '''Additive increase of the rate after a successful request'''
+        with self._lock:
+            self.rate = min(
+                self.max_rate,
+                self.rate + constants.RATE_LIMIT_INCREASE_STEP,
+            )
+
+    def on_throttle(self) -> None:
+        '''Multiplicative decrease of the rate after a throttled request'''
+        with self._lock:
+            self.throttles += 1
+            self.rate = max(
+                self.min_rate,
+                self.rate * constants.RATE_LIMIT_DECREASE_FACTOR,
+            )
+            self._tokens = min(self._tokens, 0)
+
+    def backoff(self, *, attempt: int) -> float:
+        '''Exponential backoff delay with full jitter'''
+        return random.uniform(0, min(
+            constants.RATE_LIMIT_BACKOFF_CAP,
+            constants.RATE_LIMIT_BACKOFF_BASE * 2 ** attempt,
+        ))
+
+    def call(self, func: Callable, *args, **kwargs):
+        '''Call an AWS API function within the rate limit
+
+        Throttled calls are retried up to max_retries times, after which the
+        throttling error is raised.
+        '''
+        with telemetry.span(
+                'api',
+                aggregate=True,
+                api=self.api,
+                region=self.region,
+                ):
+            attempt = 0
+
+            while True:
+                self.acquire()
+
+                try:
+                    result = func(*args, **kwargs)
+
+                except ClientError as error:
+                    if not is_throttling_error(error=error) \
+                            or attempt >= self.max_retries:
+                        raise
+
+                    self.on_throttle()
+
+                    with self._lock:
+                        self.retries += 1
+
+                    telemetry.add(retries=1)
+
+                    self._sleep(self.backoff(attempt=attempt))
+                    attempt += 1
+
+                    continue
+
+                self.on_success()
+
+                return result
+
+
+def is_throttling_error(*, error: ClientError) -> bool:
+    '''Check whether an AWS API error was caused by throttling'''
+    code = error.response.get('Error', {}).get('Code')
+
+    return code in constants.THROTTLING_ERROR_CODES
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(*, api: str, region: str) -> RateLimiter:
+    '''Get the rate limiter shared by all requests to an API in a region'''
+    with _limiters_lock:
+        if (api, region) not in _limiters:
+            _limiters[(api, region)] = RateLimiter(
+                rate=constants.API_RATE_LIMITS.get(
+                    api,
+                    constants.API_RATE_LIMITS['default'],
+                ),
+                api=api,
+                region=region,
+            )
+
+        return _limiters[(api, region)]
+
+
+def get_stats() -> Dict:
+    '''Get counters of all rate limiters in use'''
+    with _limiters_lock:
+        limiters = dict(_limiters)
+
+    return {
+        f'{api}:{region}': limiter.stats
+        for (api, region), limiter in limiters.items()
+    }
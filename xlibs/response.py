@@ -1,9 +1,18 @@
-'''Build responses for X-Lambdas'''
+'''Build responses for X-Lambdas
+
+Responses carry only what the invoker needs: stages shape their data down to
+the fields the next stage consumes, the original request is only echoed back
+on errors when asked for, and error details are capped in size.
+'''
+import traceback
 from typing import (
     Dict,
+    List,
     Optional,
 )
 
+from xlibs import constants
+
 
 def build(
         *,
@@ -28,3 +37,68 @@ def build(
         'error': error,
         'original_request': original_request,
     }
+
+
+def shape(*, data: Dict, fields: List[str]) -> Dict:
+    '''Keep only the given fields of a response data dictionary'''
+    return {field: data[field] for field in fields if field in data}
+
+
+def truncate(*, text: str, size: int, tail: bool = False) -> str:
+    '''Cap a text to a maximum size
+
+    :arg tail: keep the end of the text instead of its beginning (e.g. for
+        tracebacks, which end with the error raised)
+    '''
+    if len(text) <= size:
+        return text
+
+    if tail:
+        return '...' + text[len(text) - size:]
+
+    return text[:size] + '...'
+
+
+def format_error(*, error: Exception, trace: Optional[str] = None) -> Dict:
+    '''Format an exception with its description and traceback capped'''
+    if trace is None:
+        trace = traceback.format_exc()
+
+    return {
+        'type': type(error).__name__,
+        'description': truncate(
+            text=str(error),
+            size=constants.RESPONSE_MAX_DESCRIPTION,
+        ),
+        'trace': truncate(
+            text=trace,
+            size=constants.RESPONSE_MAX_TRACE,
+            tail=True,
+        ),
+    }
+
+
+def build_error(
+        *,
+        error: Exception,
+        event: Dict,
+        msg: str = None,
+        ) -> Dict:
+    '''Build an error response for an exception raised by a Lambda
+
+    The original event is echoed back only if the request had the
+    "echo_request" option set, or RESPONSE_ECHO_REQUEST is enabled.
+
+    :arg error: exception raised
+    :arg event: event payload received by the Lambda
+    :arg msg: any message
+    '''
+    echo = event.get('echo_request', constants.RESPONSE_ECHO_REQUEST) \
+        if isinstance(event, dict) else constants.RESPONSE_ECHO_REQUEST
+
+    return build(
+        status=500,
+        msg=msg,
+        error=format_error(error=error),
+        original_request=event if echo else None,
+    )
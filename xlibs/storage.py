@@ -0,0 +1,212 @@
+'''Key-value storage backends to persist X-Lambda state across executions
+
+Values are JSON-serializable dictionaries. Backends:
+
+- memory: process memory, useful for tests
+- file: one JSON file per key in a local directory (e.g. Lambda /tmp)
+- sqlite: a single SQLite database file
+- dynamodb: a DynamoDB table shared by all X-Lambda functions
+'''
+import json
+import os
+import sqlite3
+import threading
+from typing import Dict, Optional
+import urllib.parse
+
+from xlibs import constants, exc
+from xlibs.aws_clients import get_client
+
+
+class Storage():
+    '''Boilerplate for a key-value storage backend'''
+
+    def get(self, key: str) -> Optional[Dict]:
+        '''Get the value stored under a key, None if it doesn't exist'''
+        raise NotImplementedError()
+
+    def put(self, key: str, value: Dict) -> None:
+        '''Store a value under a key, replacing any previous value'''
+        raise NotImplementedError()
+
+    def delete(self, key: str) -> None:
+        '''Delete a key, if it exists'''
+        raise NotImplementedError()
+
+
+class MemoryStorage(Storage):
+    '''Store values in process memory'''
+
+    def __init__(self, *args, **kwargs):
+        self._data = {}
+
+    def get(self, key: str) -> Optional[Dict]:
+        value = self._data.get(key)
+
+        return json.loads(value) if value is not None else None
+
+    def put(self, key: str, value: Dict) -> None:
+        self._data[key] = json.dumps(value)
+
+    def delete(self, key: str) -> None:
+        self._data.pop(key, None)
+
+
+class FileStorage(Storage):
+    '''Store each value as a JSON file in a local directory'''
+
+    def __init__(self, path: str = constants.STORAGE_PATH, *args, **kwargs):
+        self._path = path
+
+    def filename(self, key: str) -> str:
+        return os.path.join(
+            self._path,
+            urllib.parse.quote(key, safe='') + '.json',
+        )
+
+    def get(self, key: str) -> Optional[Dict]:
+        try:
+            with open(self.filename(key), 'r') as file:
+                return json.loads(file.read())
+
+        except FileNotFoundError:
+            return None
+
+    def put(self, key: str, value: Dict) -> None:
+        os.makedirs(self._path, exist_ok=True)
+
+        # Write to a temporary file first to avoid leaving partial values
+        filename = self.filename(key)
+        tmp_filename = f'{filename}.{os.getpid()}.tmp'
+
+        with open(tmp_filename, 'w') as file:
+            file.write(json.dumps(value))
+
+        os.replace(tmp_filename, filename)
+
+    def delete(self, key: str) -> None:
+        try:
+            os.remove(self.filename(key))
+
+        except FileNotFoundError:
+            pass
+
+
+class SQLiteStorage(Storage):
+    '''Store values in a SQLite database'''
+
+    def __init__(
+            self,
+            path: str = constants.STORAGE_SQLITE_PATH,
+            *args,
+            **kwargs,
+            ):
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS xlambda_state '
+            '(key TEXT PRIMARY KEY, value TEXT NOT NULL)'
+        )
+        self._connection.commit()
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT value FROM xlambda_state WHERE key = ?',
+                (key,),
+            ).fetchone()
+
+        return json.loads(row[0]) if row else None
+
+    def put(self, key: str, value: Dict) -> None:
+        with self._lock, self._connection:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO xlambda_state (key, value) '
+                'VALUES (?, ?)',
+                (key, json.dumps(value)),
+            )
+
+    def delete(self, key: str) -> None:
+        with self._lock, self._connection:
+            self._connection.execute(
+                'DELETE FROM xlambda_state WHERE key = ?',
+                (key,),
+            )
+
+
+class DynamoDBStorage(Storage):
+    '''Store values in a DynamoDB table
+
+    Values are kept as JSON strings to avoid DynamoDB's Decimal conversions.
+    '''
+
+    def __init__(
+            self,
+            table_name: str = constants.STORAGE_TABLE,
+            region: str = constants.REGION,
+            *args,
+            **kwargs,
+            ):
+        self._table_name = table_name
+        self._client = get_client(service='dynamodb', region=region)
+
+    def get(self, key: str) -> Optional[Dict]:
+        response = self._client.get_item(
+            TableName=self._table_name,
+            Key={'key': {'S': key}},
+        )
+
+        if 'Item' not in response:
+            return None
+
+        return json.loads(response['Item']['value']['S'])
+
+    def put(self, key: str, value: Dict) -> None:
+        self._client.put_item(
+            TableName=self._table_name,
+            Item={
+                'key': {'S': key},
+                'value': {'S': json.dumps(value)},
+            },
+        )
+
+    def delete(self, key: str) -> None:
+        self._client.delete_item(
+            TableName=self._table_name,
+            Key={'key': {'S': key}},
+        )
+
+
+BACKENDS = {
+    'memory': MemoryStorage,
+    'file': FileStorage,
+    'sqlite': SQLiteStorage,
+    'dynamodb': DynamoDBStorage,
+}
+
+_storages = {}
+_storages_lock = threading.Lock()
+
+
+def get_storage(*, backend: Optional[str] = None) -> Storage:
+    '''Get a storage instance, reused across invocations of a warm container
+
+    :arg backend: name of the backend, defaults to the STORAGE_BACKEND env var
+    '''
+    if not backend:
+        backend = constants.STORAGE_BACKEND
+
+    if backend not in BACKENDS:
+        raise exc.XLambdaExceptionInvalidStorageBackend(
+            f'Storage backend "{backend}" is not recognized, expected: '
+            f'{", ".join(BACKENDS.keys())}.'
+        )
+
+    with _storages_lock:
+        if backend not in _storages:
+            _storages[backend] = BACKENDS[backend]()
+
+        return _storages[backend]
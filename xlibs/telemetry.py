@@ -0,0 +1,281 @@
+'''Timing spans emitted as CloudWatch Embedded Metric Format (EMF) logs
+
+Spans measure the duration of a Professor run, of each stage invocation, of
+each function warmed and of each AWS API call, along with counters such as
+retries, payload bytes and containers requested or confirmed. Each finished
+span is written to stdout as a single EMF JSON line, from which CloudWatch
+Logs extracts metrics asynchronously: no network call is made.
+
+Spans nest through context variables, so spans started within a span (also
+in asyncio tasks it creates) share its trace ID. Whether a trace is emitted
+is decided once, at its root span, with TELEMETRY_SAMPLE_RATE. Mutant
+invocations carry the trace in their payload (see get_trace), which their
+handler span adopts, so that a run is a single trace across Lambdas.
+
+Leaf spans repeated for every request, such as Lambda invocations or AWS
+API calls, are aggregated within their parent span: a single record is
+emitted per kind and dimensions, with the number of spans and their metric
+values, up to TELEMETRY_MAX_VALUES of them. Log volume then doesn't grow
+with the containers warmed.
+
+Usage:
+
+    with telemetry.span('stage', stage='wolverine') as span:
+        span.set(functions=10)
+        ...
+        telemetry.add(retries=1)  # Increment a counter of the current span
+'''
+import contextlib
+import contextvars
+import json
+import random
+import sys
+import time
+from typing import Dict, Iterator, Optional
+import uuid
+
+from xlibs import constants
+
+
+# Metrics recorded in spans and their CloudWatch units
+UNITS = {
+    'duration': 'Milliseconds',
+    'retries': 'Count',
+    'payload_bytes': 'Bytes',
+    'response_bytes': 'Bytes',
+    'functions': 'Count',
+    'requests': 'Count',
+    'containers_requested': 'Count',
+    'containers_confirmed': 'Count',
+    'containers_skipped': 'Count',
+    'hold_duration': 'Milliseconds',
+    'send_spread': 'Milliseconds',
+    'spans': 'Count',
+}
+
+
+def camel_case(name: str) -> str:
+    return ''.join(word.capitalize() for word in name.split('_'))
+
+
+class Span():
+    '''Timed operation with metrics and dimensions
+
+    :arg name: kind of operation, e.g. "stage" or "api"
+    :arg dimensions: low-cardinality values metrics are aggregated by
+    :arg parent: span within which this one was started, if any
+    :arg sampled: whether the span is emitted when finished
+    :arg trace_id: trace of a root span started by another Lambda
+    '''
+
+    def __init__(
+            self,
+            name: str,
+            dimensions: Dict,
+            parent: Optional['Span'] = None,
+            sampled: bool = True,
+            trace_id: Optional[str] = None,
+            *args,
+            **kwargs,
+            ):
+        self.name = name
+        self.dimensions = dimensions
+        self.parent = parent
+        self.sampled = sampled
+        self.trace_id = parent.trace_id if parent else (
+            trace_id or uuid.uuid4().hex
+        )
+        self.metrics = {}
+        self.properties = {}
+        self.leaves = {}
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+
+    def set(self, **metrics) -> 'Span':
+        '''Set metric values, see UNITS'''
+        self.metrics.update(metrics)
+
+        return self
+
+    def add(self, **metrics) -> 'Span':
+        '''Increment metric values, see UNITS'''
+        for name, value in metrics.items():
+            self.metrics[name] = self.metrics.get(name, 0) + value
+
+        return self
+
+    def describe(self, **properties) -> 'Span':
+        '''Set properties logged with the span, not aggregated as metrics
+
+        Useful for high-cardinality values, such as function names.
+        '''
+        self.properties.update(properties)
+
+        return self
+
+    def collect(self, leaf: 'Span') -> None:
+        '''Aggregate a finished leaf span, to be emitted with this span
+
+        Leaves of the same kind and dimensions are emitted as a single
+        record, with metric values as lists (as supported by EMF).
+        '''
+        key = (leaf.name, tuple(sorted(leaf.dimensions.items())))
+        aggregate = self.leaves.get(key)
+
+        if not aggregate:
+            aggregate = self.leaves[key] = Span(
+                name=leaf.name,
+                dimensions=leaf.dimensions,
+                parent=self,
+                sampled=self.sampled,
+            )
+            aggregate.started_at = leaf.started_at
+
+        aggregate.add(spans=1)
+
+        for name, value in leaf.metrics.items():
+            values = aggregate.metrics.setdefault(name, [])
+
+            if value is not None and \
+                    len(values) < constants.TELEMETRY_MAX_VALUES:
+                values.append(value)
+
+    def finish(self) -> None:
+        self.metrics['duration'] = round(
+            (time.perf_counter() - self._started) * 1000,
+            3,
+        )
+
+    def to_emf(self) -> Dict:
+        '''Format the span as an EMF log record'''
+        dimensions = {'Span': self.name, **{
+            camel_case(name): str(value)
+            for name, value in self.dimensions.items()
+        }}
+
+        metrics = {
+            camel_case(name): value
+            for name, value in self.metrics.items()
+            if value is not None
+        }
+
+        return {
+            '_aws': {
+                'Timestamp': int(self.started_at * 1000),
+                'CloudWatchMetrics': [{
+                    'Namespace': constants.TELEMETRY_NAMESPACE,
+                    'Dimensions': [list(dimensions.keys())],
+                    'Metrics': [
+                        {
+                            'Name': camel_case(name),
+                            'Unit': UNITS.get(name, 'None'),
+                        }
+                        for name, value in self.metrics.items()
+                        if value is not None
+                    ],
+                }],
+            },
+            **{camel_case(k): v for k, v in self.properties.items()},
+            **metrics,
+            **dimensions,
+            'TraceId': self.trace_id,
+            'Parent': self.parent.name if self.parent else None,
+        }
+
+
+_current = contextvars.ContextVar('xlambda_span', default=None)
+
+
+def current() -> Optional[Span]:
+    '''Get the span in progress in the current context, if any'''
+    return _current.get()
+
+
+def is_sampled() -> bool:
+    return random.random() < constants.TELEMETRY_SAMPLE_RATE
+
+
+def get_trace() -> Optional[Dict]:
+    '''Get the trace in progress, to be continued by another Lambda
+
+    :return: dictionary with the trace "id" and whether it is "sampled",
+        None outside of spans
+    '''
+    in_progress = current()
+
+    if not in_progress:
+        return None
+
+    return {'id': in_progress.trace_id, 'sampled': in_progress.sampled}
+
+
+def write(record: Dict) -> None:
+    '''Write an EMF record to the Lambda logs'''
+    sys.stdout.write(json.dumps(record, default=str) + '\n')
+
+
+@contextlib.contextmanager
+def span(
+        name: str,
+        *,
+        trace: Optional[Dict] = None,
+        aggregate: bool = False,
+        **dimensions,
+        ) -> Iterator[Span]:
+    '''Measure an operation within a span
+
+    :arg name: kind of operation
+    :arg trace: trace started by another Lambda (see get_trace), continued
+        by root spans
+    :arg aggregate: whether the span is a leaf aggregated within its parent,
+        instead of emitted on its own
+    :arg dimensions: values metrics are aggregated by (e.g. stage, region)
+    '''
+    parent = current()
+
+    if parent:
+        sampled = parent.sampled
+
+    elif trace:
+        sampled = trace['sampled']
+
+    else:
+        sampled = is_sampled()
+
+    new_span = Span(
+        name=name,
+        dimensions=dimensions,
+        parent=parent,
+        sampled=sampled,
+        trace_id=trace['id'] if trace else None,
+    )
+
+    token = _current.set(new_span)
+
+    try:
+        yield new_span
+
+    except BaseException as error:
+        new_span.describe(error=type(error).__name__)
+        raise
+
+    finally:
+        _current.reset(token)
+        new_span.finish()
+
+        if new_span.sampled and aggregate and parent:
+            parent.collect(new_span)
+
+        elif new_span.sampled:
+            write(new_span.to_emf())
+
+            for leaf in new_span.leaves.values():
+                write(leaf.to_emf())
+
+
+def add(**metrics) -> None:
+    '''Increment metrics of the span in progress, if any'''
+    in_progress = current()
+
+    if in_progress:
+        in_progress.add(**metrics)
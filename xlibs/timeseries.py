@@ -0,0 +1,121 @@
+'''Compact columnar format for metric series exchanged between X-Lambdas
+
+A series is a dictionary with the epoch of its first period, the period
+length in seconds and a dense list of integer values, one per period:
+
+    {'start': 1561939200, 'period': 300, 'values': [1, 0, 0, 4]}
+
+Periods without datapoints are filled explicitly with zeros (CloudWatch
+omits periods without invocations), so positions map to timestamps. Values
+may also be packed into a base64 string of little-endian 32-bit integers,
+under "packed" instead of "values", which shrinks long series further.
+
+Series in the legacy format, a dictionary of values keyed by datetime
+strings, are still accepted by the readers below.
+'''
+import array
+import base64
+import sys
+from typing import Dict, List, Tuple, Union
+
+
+TYPECODE = 'i'
+
+
+def is_columnar(metrics: Dict) -> bool:
+    '''Whether metrics are in the columnar format'''
+    return 'period' in metrics and \
+        ('values' in metrics or 'packed' in metrics)
+
+
+def pack(values: List[int]) -> str:
+    '''Pack integer values into a base64 string'''
+    packed = array.array(TYPECODE, values)
+
+    if sys.byteorder == 'big':
+        packed.byteswap()
+
+    return base64.b64encode(packed.tobytes()).decode('ascii')
+
+
+def unpack(packed: str) -> List[int]:
+    '''Unpack integer values from a base64 string'''
+    values = array.array(TYPECODE)
+    values.frombytes(base64.b64decode(packed))
+
+    if sys.byteorder == 'big':
+        values.byteswap()
+
+    return values.tolist()
+
+
+def from_points(
+        *,
+        points: Dict[Union[str, int], float],
+        period: int,
+        start: int,
+        end: int,
+        packed: bool = False,
+        ) -> Dict:
+    '''Build a columnar series from sparse datapoints
+
+    :arg points: values keyed by period-aligned epoch timestamps
+    :arg period: length of each period, in seconds
+    :arg start: epoch of the first period of the series
+    :arg end: epoch of the last period of the series (inclusive)
+    :arg packed: whether to pack values into a base64 string
+    '''
+    values = [0] * max(0, (end - start) // period + 1)
+
+    for timestamp, value in points.items():
+        index = (int(timestamp) - start) // period
+
+        if 0 <= index < len(values):
+            values[index] = int(round(float(value)))
+
+    series = {'start': start, 'period': period}
+
+    if packed:
+        series['packed'] = pack(values)
+    else:
+        series['values'] = values
+
+    return series
+
+
+def get_values(metrics: Dict) -> List[float]:
+    '''Get the values of a series, in either format'''
+    if not is_columnar(metrics):
+        return [float(value) for value in metrics.values()]
+
+    if 'packed' in metrics:
+        return [float(value) for value in unpack(metrics['packed'])]
+
+    return [float(value) for value in metrics['values']]
+
+
+def get_observations(metrics: Dict) -> List[Tuple[Union[str, int], float]]:
+    '''Get (timestamp, value) pairs of a series, in either format
+
+    Timestamps are epoch integers for columnar series and datetime strings
+    for legacy ones. Either way, they sort in chronological order.
+    '''
+    if not is_columnar(metrics):
+        return [(key, float(value)) for key, value in metrics.items()]
+
+    return [
+        (metrics['start'] + i * metrics['period'], value)
+        for i, value in enumerate(get_values(metrics))
+    ]
+
+
+def tail(metrics: Dict, count: int) -> Dict:
+    '''Get the last periods of a columnar series, as a columnar series'''
+    values = get_values(metrics)
+    first = max(len(values) - count, 0)
+
+    return {
+        'start': metrics['start'] + first * metrics['period'],
+        'period': metrics['period'],
+        'values': [int(value) for value in values[first:]],
+    }
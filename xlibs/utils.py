@@ -1,11 +1,20 @@
 '''Common utility functions for X-Lambdas'''
+import base64
+import binascii
 import json
+import re
 from typing import Dict, List, Optional
 
-import boto3
 import yaml
 
 from xlibs import constants
+from xlibs.aws_clients import get_client
+
+
+INIT_DURATION_PATTERN = re.compile(
+    r'^REPORT .*\bInit Duration: (?P<duration>\d+(?:\.\d+)?) ms',
+    re.MULTILINE,
+)
 
 
 def validate_request(options: Dict, required_args: List) -> tuple:
@@ -46,7 +55,7 @@ def invoke_lambda(
         ):
     '''Invokes a Lambda function
 
-    Uses a separate boto3 session for each request to make it thread-safe
+    Uses a pooled boto3 client, which is thread-safe and reused across calls
 
     :param function: name of the function to invoke
     :param invocation_type: one of these options:
@@ -58,8 +67,7 @@ def invoke_lambda(
         'None': does not include execution logs in the response
         'Tail': includes execution logs in the response
     '''
-    session = boto3.session.Session()
-    aws_lambda = session.client('lambda')
+    aws_lambda = get_client(service='lambda', region=region)
 
     response = aws_lambda.invoke(
         FunctionName=function,
@@ -79,6 +87,69 @@ def invoke_lambda(
     return response
 
 
+def decode_log_result(*, log_result: Optional[str]) -> str:
+    '''Decode the base64 execution logs returned with LogType "Tail"'''
+    if not log_result:
+        return ''
+
+    try:
+        return base64.b64decode(log_result).decode('utf-8', errors='replace')
+
+    except (binascii.Error, ValueError):
+        return ''
+
+
+def get_init_durations(*, logs: str) -> List[float]:
+    '''Get the Init Duration of cold starts from Lambda execution logs
+
+    Lambda reports the duration of the initialization phase in the REPORT
+    line of the first invocation served by each new container:
+
+        REPORT RequestId: ... Duration: 2.1 ms ... Init Duration: 153.4 ms
+
+    :arg logs: execution logs, e.g. a decoded LogResult or a log file
+    :return: durations found, in milliseconds
+    '''
+    return [
+        float(match.group('duration'))
+        for match in INIT_DURATION_PATTERN.finditer(logs)
+    ]
+
+
+def get_forecast_peak(*, forecast: List) -> int:
+    '''Get the peak container demand in a forecast
+
+    Forecasts with prediction intervals are sized on their upper bounds.
+    '''
+    return max(
+        value['upper'] if isinstance(value, dict) else value
+        for value in forecast
+    )
+
+
+def get_warm_count(*, function: Dict) -> int:
+    '''Get how many containers to warm for a function with a forecast
+
+    The forecast peak is bounded by the function's min and max containers,
+    and by its max concurrency, if any.
+    '''
+    scaling = function['scaling']
+
+    return min(
+        max(
+            get_forecast_peak(forecast=function['forecast']),
+            scaling.get('min_containers', 0),
+        ),
+        scaling['max_containers'],
+        scaling.get('max_concurrency', scaling['max_containers']),
+    )
+
+
+def get_function_key(*, function: Dict) -> str:
+    '''Identify a function by its region and name'''
+    return f"{function['region']}:{function['name']}"
+
+
 def split_list(*, list_: List, n: int):
     '''Split a list into multiple lists
 
@@ -1,66 +1,130 @@
 '''Wrapper functions to interact with AWS API endpoints'''
 import datetime
+from typing import Dict, List
 
-import boto3
+from xlibs.aws_clients import get_client
+from xlibs.rate_limiter import get_rate_limiter
+from xlibs.utils import split_list
+from xlibs.wolverine import constants
 
 
 def get_metric_data(
         *,
-        function_name: str,
+        function_names: List[str],
         region_name: str,
         period: int,
         start_time: datetime.datetime,
         end_time: datetime.datetime,
-        max_datapoints: int,
+        max_datapoints: int = constants.METRICS_MAX_DATAPOINTS_PER_REQUEST,
         ) -> tuple:
-    '''Retrieve metric data from CloudWatch API'''
-    client = boto3.client('cloudwatch', region_name=region_name)
-
-    response = client.get_metric_data(
-        MetricDataQueries=[
-            {
-                'Id': 'lambda_metrics',
-                'MetricStat': {
-                    'Metric': {
-                        'Namespace': 'AWS/Lambda',
-                        'MetricName': 'ConcurrentExecutions',
-                        'Dimensions': [
-                            {
-                                'Name': 'FunctionName',
-                                'Value': function_name,
-                            },
-                        ],
-                    },
-                    'Period': period,
-                    'Stat': 'Maximum',
-                },
-                'ReturnData': True,
-            },
-        ],
-        StartTime=start_time,
-        EndTime=end_time,
-        # NextToken='string',
-        ScanBy='TimestampAscending',
-        MaxDatapoints=max_datapoints,
+    '''Retrieve metric data for multiple functions from CloudWatch API
+
+    Packs up to METRICS_MAX_QUERIES_PER_REQUEST metric queries into each
+    GetMetricData request and follows NextToken pagination until all
+    datapoints were retrieved.
+
+    :return: tuple with the HTTP status code and a dictionary mapping each
+        function name to its list of datapoints
+    '''
+    client = get_client(
+        service='cloudwatch', region=region_name,
+        rate_limited=True,
     )
+    limiter = get_rate_limiter(api='GetMetricData', region=region_name)
 
-    status = response['ResponseMetadata']['HTTPStatusCode']
-    metrics = [
-        {
-            'timestamp': response['MetricDataResults'][0]['Timestamps'][i],
-            'value': int(response['MetricDataResults'][0]['Values'][i]),
-        }
-        for i in range(0, len(response['MetricDataResults'][0]['Timestamps']))
-    ]
+    status = 200
+    metrics = {function_name: [] for function_name in function_names}
+
+    for names in split_list(
+            list_=list(metrics.keys()),
+            n=constants.METRICS_MAX_QUERIES_PER_REQUEST,
+            ):
+        query_ids = {f'f{i}': name for i, name in enumerate(names)}
+
+        queries = [
+            build_metric_query(query_id=query_id, function_name=name,
+                               period=period)
+            for query_id, name in query_ids.items()
+        ]
+
+        next_token = None
+
+        while True:
+            request = {
+                'MetricDataQueries': queries,
+                'StartTime': start_time,
+                'EndTime': end_time,
+                'ScanBy': 'TimestampAscending',
+                'MaxDatapoints': max_datapoints,
+            }
+
+            if next_token:
+                request['NextToken'] = next_token
+
+            response = limiter.call(client.get_metric_data, **request)
+
+            status = response['ResponseMetadata']['HTTPStatusCode']
+
+            if status != 200:
+                return status, metrics
+
+            for result in response['MetricDataResults']:
+                metrics[query_ids[result['Id']]].extend(
+                    {
+                        'timestamp': timestamp,
+                        'value': int(value),
+                    }
+                    for timestamp, value in zip(
+                        result['Timestamps'],
+                        result['Values'],
+                    )
+                )
+
+            next_token = response.get('NextToken')
+
+            if not next_token:
+                break
 
     return status, metrics
 
 
+def build_metric_query(
+        *,
+        query_id: str,
+        function_name: str,
+        period: int,
+        ) -> Dict:
+    '''Build a ConcurrentExecutions metric query for a Lambda function'''
+    return {
+        'Id': query_id,
+        'MetricStat': {
+            'Metric': {
+                'Namespace': 'AWS/Lambda',
+                'MetricName': 'ConcurrentExecutions',
+                'Dimensions': [
+                    {
+                        'Name': 'FunctionName',
+                        'Value': function_name,
+                    },
+                ],
+            },
+            'Period': period,
+            'Stat': 'Maximum',
+        },
+        'ReturnData': True,
+    }
+
+
 def get_settings(*, function_name: str, region: str) -> tuple:
     '''Get Lambda settings'''
-    client = boto3.client('lambda', region_name=region)
+    client = get_client(
+        service='lambda', region=region,
+        rate_limited=True,
+    )
+    limiter = get_rate_limiter(api='GetFunctionConfiguration', region=region)
 
-    response = client.get_function_configuration(
+    response = limiter.call(
+        client.get_function_configuration,
         FunctionName=function_name,
     )
 
@@ -1,4 +1,6 @@
 '''Constant values for Wolverine Lambda'''
+import os
+
 from xlibs.constants import *  # NOQA
 
 
@@ -7,18 +9,53 @@ REQUIRED_ARGS = [
     'region',
 ]
 
+# Fields of each function sent back to the invoker
+RESPONSE_FIELDS = [
+    'name',
+    'region',
+    'metrics',
+    'settings',
+    'recent_concurrency',
+]
+
 # Parameters to gather Lambda metrics from CloudWatch
 METRICS_MAX_DATAPOINTS = 1000
 METRICS_TIME_PERIOD = 300  # Seconds
 METRICS_DAYS_AGO = 3
 
+# Trailing periods of metrics in which containers serving real traffic are
+# considered still warm (see xlibs.cyclops.warm_state)
+RECENT_CONCURRENCY_PERIODS = 2
+
+# Pack metric series values into base64 strings (see xlibs.timeseries)
+METRICS_PACKED = os.environ.get('METRICS_PACKED', 'false') == 'true'
+
+# Trailing buckets of cached metrics to retrieve again on every run, since
+# they might have been partial or not yet consolidated by CloudWatch
+METRICS_CACHE_REFRESH_PERIODS = 2
+
+# GetMetricData API limits for a single request
+METRICS_MAX_QUERIES_PER_REQUEST = 500
+METRICS_MAX_DATAPOINTS_PER_REQUEST = 100800
+
 if METRICS_DAYS_AGO * 3600 / METRICS_TIME_PERIOD * 24 > METRICS_MAX_DATAPOINTS:
     raise ValueError(
         'The value of METRICS_DAYS_AGO * 3600 / METRICS_TIME_PERIOD * 24 must '
         'be lower than the value of METRICS_MAX_DATAPOINTS.'
     )
 
-# Startup time sensitivity coefficients
+# Cache of Lambda settings
+SETTINGS_CACHE_TTL = 3600  # Seconds
+SETTINGS_CACHE_JITTER = 0.2  # Up to 20% added to the TTL
+
+# Startup times learned from observed Init Durations (see startup_tracker)
+STARTUP_SAMPLES_MIN = 5  # Regression estimate used below this count
+STARTUP_SAMPLES_MAX = 100  # Most recent samples kept for each function
+STARTUP_SAMPLES_MAX_AGE = 7 * 24 * 3600  # Seconds
+STARTUP_PERCENTILE = 90
+
+# Startup time sensitivity coefficients, used until Init Durations are
+# observed for a function
 STARTUP_TIME = {
     'csharp': {
         'intercept': 11.66002128,
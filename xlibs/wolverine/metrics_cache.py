@@ -0,0 +1,126 @@
+'''Incremental cache of Lambda concurrency metrics
+
+Each function series is stored with datapoints keyed by period-aligned epoch
+timestamps, along with the boundary up to which CloudWatch was queried. On
+subsequent runs, only the missing tail of the series needs to be retrieved.
+'''
+import logging
+from typing import Dict, List, Optional
+
+from xlibs import storage
+from xlibs.wolverine import constants
+
+
+logger = logging.getLogger(__name__)
+
+
+def align_time(*, timestamp: float, period: int) -> int:
+    '''Align an epoch timestamp to the start of its period bucket'''
+    return int(timestamp // period * period)
+
+
+class MetricsCache():
+    '''Cache metric series for Lambda functions in a storage backend'''
+
+    def __init__(
+            self,
+            backend: Optional[storage.Storage] = None,
+            period: int = constants.METRICS_TIME_PERIOD,
+            *args,
+            **kwargs,
+            ):
+        self._backend = backend
+        self.period = period
+
+    @property
+    def backend(self) -> storage.Storage:
+        if not self._backend:
+            self._backend = storage.get_storage()
+
+        return self._backend
+
+    def key(self, *, function_name: str, region: str) -> str:
+        return f'metrics:{region}:{function_name}'
+
+    def load(self, *, function_name: str, region: str) -> Optional[Dict]:
+        '''Load a cached series, None if missing or unusable'''
+        try:
+            entry = self.backend.get(
+                self.key(function_name=function_name, region=region),
+            )
+
+        except Exception as error:
+            logger.warning(f'Failed to load cached metrics: {error}')
+            return None
+
+        if not entry or entry.get('period') != self.period:
+            return None
+
+        return entry
+
+    def save(self, *, function_name: str, region: str, entry: Dict) -> None:
+        '''Save a series to the cache, failures are not fatal'''
+        try:
+            self.backend.put(
+                self.key(function_name=function_name, region=region),
+                entry,
+            )
+
+        except Exception as error:
+            logger.warning(f'Failed to save cached metrics: {error}')
+
+    def fetch_start(
+            self,
+            *,
+            entry: Optional[Dict],
+            window_start: int,
+            ) -> int:
+        '''Determine from when metrics need to be retrieved from CloudWatch
+
+        The trailing buckets of the cached series are always retrieved again,
+        since they may have been partial or incomplete when cached.
+        '''
+        if not entry:
+            return window_start
+
+        refresh_from = entry['fetched_until'] - \
+            constants.METRICS_CACHE_REFRESH_PERIODS * self.period
+
+        return max(window_start, refresh_from)
+
+    def merge(
+            self,
+            *,
+            entry: Optional[Dict],
+            metrics: List,
+            window_start: int,
+            fetched_until: int,
+            ) -> Dict:
+        '''Merge new datapoints into a cached series
+
+        :arg entry: cached series entry (None if not cached)
+        :arg metrics: datapoints retrieved from CloudWatch
+        :arg window_start: epoch of the oldest bucket to keep in the series
+        :arg fetched_until: epoch of the current (possibly partial) bucket
+        '''
+        series = dict(entry['series']) if entry else {}
+
+        for metric in metrics:
+            timestamp = align_time(
+                timestamp=metric['timestamp'].timestamp(),
+                period=self.period,
+            )
+            series[str(timestamp)] = metric['value']
+
+        return {
+            'period': self.period,
+            'fetched_until': fetched_until,
+            'series': {
+                timestamp: value
+                for timestamp, value in sorted(
+                    series.items(),
+                    key=lambda item: int(item[0]),
+                )
+                if int(timestamp) >= window_start
+            },
+        }
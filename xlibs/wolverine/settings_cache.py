@@ -0,0 +1,116 @@
+'''TTL cache of formatted Lambda function settings
+
+Settings such as runtime, memory size and VPC config rarely change. Cached
+settings are served until their TTL expires; they are then revalidated
+against the function's CodeSha256 and LastModified attributes, and only
+formatted again when these have changed. Entries can also be invalidated
+explicitly when a change is detected elsewhere (e.g. failed warm-ups).
+
+The startup time learned from cold starts (see startup_tracker) is cached
+along with the settings, so that fresh entries are served with a single
+storage read. It is looked up again when entries are revalidated.
+'''
+import logging
+import random
+import time
+from typing import Callable, Dict, Optional
+
+from xlibs import storage
+from xlibs.wolverine import constants
+
+
+logger = logging.getLogger(__name__)
+
+
+class SettingsCache():
+    '''Cache formatted settings of Lambda functions in a storage backend'''
+
+    def __init__(
+            self,
+            backend: Optional[storage.Storage] = None,
+            ttl: int = constants.SETTINGS_CACHE_TTL,
+            clock: Callable = time.time,
+            *args,
+            **kwargs,
+            ):
+        self._backend = backend
+        self.ttl = ttl
+        self._clock = clock
+
+    @property
+    def backend(self) -> storage.Storage:
+        if not self._backend:
+            self._backend = storage.get_storage()
+
+        return self._backend
+
+    def key(self, *, function_name: str, region: str) -> str:
+        return f'settings:{region}:{function_name}'
+
+    def load(self, *, function_name: str, region: str) -> Optional[Dict]:
+        '''Load a cached entry, None if missing or unavailable'''
+        try:
+            return self.backend.get(
+                self.key(function_name=function_name, region=region),
+            )
+
+        except Exception as error:
+            logger.warning(f'Failed to load cached settings: {error}')
+            return None
+
+    def is_fresh(self, *, entry: Optional[Dict]) -> bool:
+        '''Check whether an entry can be served without revalidation'''
+        return bool(entry) and self._clock() < entry['expires_at']
+
+    def is_unchanged(self, *, entry: Optional[Dict], raw_settings: Dict) \
+            -> bool:
+        '''Check whether a function has not changed since it was cached'''
+        return bool(entry) \
+            and entry['code_sha256'] == raw_settings.get('CodeSha256') \
+            and entry['last_modified'] == raw_settings.get('LastModified')
+
+    def save(
+            self,
+            *,
+            function_name: str,
+            region: str,
+            settings: Dict,
+            raw_settings: Dict,
+            startup_time: Optional[int] = None,
+            ) -> None:
+        '''Cache formatted settings, failures are not fatal
+
+        :arg startup_time: startup time observed in cold starts, if any
+
+        The TTL is jittered so that entries cached together do not all expire
+        in the same run.
+        '''
+        now = self._clock()
+        jitter = random.uniform(0, constants.SETTINGS_CACHE_JITTER)
+        ttl = self.ttl * (1 + jitter)
+
+        try:
+            self.backend.put(
+                self.key(function_name=function_name, region=region),
+                {
+                    'settings': settings,
+                    'code_sha256': raw_settings.get('CodeSha256'),
+                    'last_modified': raw_settings.get('LastModified'),
+                    'startup_time': startup_time,
+                    'cached_at': now,
+                    'expires_at': now + ttl,
+                },
+            )
+
+        except Exception as error:
+            logger.warning(f'Failed to save cached settings: {error}')
+
+    def invalidate(self, *, function_name: str, region: str) -> None:
+        '''Force revalidation of a function's settings in the next run'''
+        try:
+            self.backend.delete(
+                self.key(function_name=function_name, region=region),
+            )
+
+        except Exception as error:
+            logger.warning(f'Failed to invalidate cached settings: {error}')
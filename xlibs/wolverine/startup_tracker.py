@@ -0,0 +1,130 @@
+'''Per-function cold start times learned from observed Init Durations
+
+The startup time regression (see utils.estimate_startup_time) only knows a
+few runtimes and was fitted on a past benchmark. Cold starts triggered by
+warm-ups report their actual Init Duration in the execution logs returned by
+Lambda (see xlibs.utils.get_init_durations), which are recorded here for
+each function.
+
+Only recent samples are kept, so that estimates follow code and dependency
+changes. The startup time is estimated with a high percentile of samples,
+robust to the occasional outlier, once enough of them were observed.
+'''
+import logging
+import math
+import time
+from typing import Callable, Dict, List, Optional
+
+from xlibs import storage
+from xlibs.wolverine import constants
+
+
+logger = logging.getLogger(__name__)
+
+
+def percentile(*, values: List[float], percent: float) -> float:
+    '''Compute a percentile with the nearest-rank method'''
+    ordered = sorted(values)
+    rank = math.ceil(percent / 100 * len(ordered))
+
+    return ordered[min(max(rank, 1), len(ordered)) - 1]
+
+
+class StartupTracker():
+    '''Record Init Durations of Lambda functions in a storage backend'''
+
+    def __init__(
+            self,
+            backend: Optional[storage.Storage] = None,
+            clock: Callable = time.time,
+            *args,
+            **kwargs,
+            ):
+        self._backend = backend
+        self._clock = clock
+
+    @property
+    def backend(self) -> storage.Storage:
+        if not self._backend:
+            self._backend = storage.get_storage()
+
+        return self._backend
+
+    def key(self, *, function_name: str, region: str) -> str:
+        return f'startup:{region}:{function_name}'
+
+    def load(self, *, function_name: str, region: str) -> Optional[Dict]:
+        '''Load the samples of a function, None if missing or unavailable'''
+        try:
+            return self.backend.get(
+                self.key(function_name=function_name, region=region),
+            )
+
+        except Exception as error:
+            logger.warning(f'Failed to load startup samples: {error}')
+            return None
+
+    def get_samples(self, *, entry: Optional[Dict]) -> List[List[float]]:
+        '''Get the samples of an entry not older than the max age
+
+        :return: list of [timestamp, duration] pairs
+        '''
+        if not entry:
+            return []
+
+        oldest = self._clock() - constants.STARTUP_SAMPLES_MAX_AGE
+
+        return [
+            sample for sample in entry['samples']
+            if sample[0] >= oldest
+        ]
+
+    def record(
+            self,
+            *,
+            function_name: str,
+            region: str,
+            durations: List[float],
+            ) -> None:
+        '''Record observed Init Durations, failures are not fatal
+
+        :arg durations: Init Durations, in milliseconds
+        '''
+        if not durations:
+            return
+
+        entry = self.load(function_name=function_name, region=region)
+        now = self._clock()
+
+        samples = self.get_samples(entry=entry) + [
+            [now, duration] for duration in durations
+        ]
+
+        try:
+            self.backend.put(
+                self.key(function_name=function_name, region=region),
+                {
+                    'samples': samples[-constants.STARTUP_SAMPLES_MAX:],
+                    'updated_at': now,
+                },
+            )
+
+        except Exception as error:
+            logger.warning(f'Failed to save startup samples: {error}')
+
+    def estimate(self, *, function_name: str, region: str) -> Optional[int]:
+        '''Estimate the startup time of a function from observed samples
+
+        :return: startup time in milliseconds, None without enough samples
+        '''
+        samples = self.get_samples(
+            entry=self.load(function_name=function_name, region=region),
+        )
+
+        if len(samples) < constants.STARTUP_SAMPLES_MIN:
+            return None
+
+        return math.ceil(percentile(
+            values=[duration for _, duration in samples],
+            percent=constants.STARTUP_PERCENTILE,
+        ))
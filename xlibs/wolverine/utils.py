@@ -3,29 +3,216 @@ import datetime
 import math
 from typing import Dict, List, Optional
 
-from xlibs import exc
+from xlibs import exc, timeseries
 from xlibs.utils import *  # NOQA
-from xlibs.wolverine import aws_api_wrapper, constants
+from xlibs.wolverine import (
+    aws_api_wrapper,
+    constants,
+    metrics_cache,
+    settings_cache,
+    startup_tracker,
+)
 
 
 def get_lambda_info(*, function_name: str, region: str) -> List:
     '''Get demand metrics from a given Lamdba functions'''
-    now = datetime.datetime.utcnow()
-    start_time = now - datetime.timedelta(days=constants.METRICS_DAYS_AGO)
+    metrics = get_metrics(function_names=[function_name], region=region)
 
-    status, metrics = aws_api_wrapper.get_metric_data(
+    settings = get_function_settings(
         function_name=function_name,
-        region_name=region,
-        period=constants.METRICS_TIME_PERIOD,
-        start_time=start_time,
-        end_time=now,
-        max_datapoints=constants.METRICS_MAX_DATAPOINTS,
+        region=region,
     )
 
-    if status != 200:
-        raise exc.XLambdaExceptionGetMetricsFailed()
+    return metrics[function_name], settings
+
+
+def get_recent_concurrency(*, metrics: Dict) -> Dict:
+    '''Get the concurrency of a function in its most recent periods
+
+    Periods keep their timestamps, so that the concurrency of warm-ups can
+    be told apart from real traffic (see xlibs.cyclops.warm_state).
+
+    :arg metrics: columnar metrics series
+    :return: columnar series of the most recent periods
+    '''
+    return timeseries.tail(metrics, constants.RECENT_CONCURRENCY_PERIODS)
+
+
+def get_lambdas_info(*, functions: List[Dict]) -> tuple:
+    '''Get demand metrics and settings for multiple Lambda functions
+
+    Metrics are retrieved with batched CloudWatch queries, grouping functions
+    by region. A failure to retrieve data for one function does not prevent
+    the others from being processed.
+
+    :arg functions: list of function dicts, each with "name" and "region"
+    :return: tuple with a list of functions extended with "metrics" and
+        "settings", and a list of errors for the functions that failed
+    '''
+    results = []
+    errors = []
+
+    regions = {}
+
+    for function in functions:
+        regions.setdefault(function['region'], []).append(function)
+
+    for region, region_functions in regions.items():
+        try:
+            metrics = get_metrics(
+                function_names=[f['name'] for f in region_functions],
+                region=region,
+            )
+
+        except Exception as error:
+            errors.extend(
+                format_error(function=function, error=error)
+                for function in region_functions
+            )
+            continue
+
+        for function in region_functions:
+            try:
+                settings = get_function_settings(
+                    function_name=function['name'],
+                    region=region,
+                )
+
+            except Exception as error:
+                errors.append(format_error(function=function, error=error))
+                continue
+
+            results.append({
+                **function,
+                'metrics': metrics[function['name']],
+                'settings': settings,
+                'recent_concurrency': get_recent_concurrency(
+                    metrics=metrics[function['name']],
+                ),
+            })
+
+    return results, errors
+
+
+def get_metrics(
+        *,
+        function_names: List[str],
+        region: str,
+        cache: Optional[metrics_cache.MetricsCache] = None,
+        ) -> Dict:
+    '''Get concurrency metrics for a list of functions in a region
+
+    Series cached from previous runs are reused, so that CloudWatch is only
+    queried for the missing tail of each series. Query boundaries are aligned
+    to METRICS_TIME_PERIOD to keep cached buckets stable.
+    '''
+    if not cache:
+        cache = metrics_cache.MetricsCache()
+
+    period = constants.METRICS_TIME_PERIOD
+
+    now = datetime.datetime.now(tz=datetime.timezone.utc).timestamp()
+    current_bucket = metrics_cache.align_time(timestamp=now, period=period)
+    window = datetime.timedelta(days=constants.METRICS_DAYS_AGO)
+    window_start = current_bucket - int(window.total_seconds())
+    end_time = current_bucket + period
+
+    entries = {
+        function_name: cache.load(function_name=function_name, region=region)
+        for function_name in function_names
+    }
+
+    # Group functions sharing the same query start to batch them together
+    groups = {}
+
+    for function_name, entry in entries.items():
+        fetch_start = cache.fetch_start(entry=entry, window_start=window_start)
+        groups.setdefault(fetch_start, []).append(function_name)
+
+    metrics = {}
+
+    for fetch_start, names in groups.items():
+        status, group_metrics = aws_api_wrapper.get_metric_data(
+            function_names=names,
+            region_name=region,
+            period=period,
+            start_time=epoch_to_datetime(timestamp=fetch_start),
+            end_time=epoch_to_datetime(timestamp=end_time),
+        )
 
-    status, settings = aws_api_wrapper.get_settings(
+        if status != 200:
+            raise exc.XLambdaExceptionGetMetricsFailed()
+
+        for function_name, function_metrics in group_metrics.items():
+            entry = cache.merge(
+                entry=entries[function_name],
+                metrics=function_metrics,
+                window_start=window_start,
+                fetched_until=current_bucket,
+            )
+
+            cache.save(function_name=function_name, region=region, entry=entry)
+
+            # The current bucket is only included once it has datapoints,
+            # since CloudWatch may not have consolidated it yet
+            last_bucket = current_bucket \
+                if str(current_bucket) in entry['series'] \
+                else current_bucket - period
+
+            metrics[function_name] = timeseries.from_points(
+                points=entry['series'],
+                period=period,
+                start=window_start,
+                end=last_bucket,
+                packed=constants.METRICS_PACKED,
+            )
+
+    return metrics
+
+
+def epoch_to_datetime(*, timestamp) -> datetime.datetime:
+    '''Convert an epoch timestamp to a timezone-aware UTC datetime'''
+    return datetime.datetime.fromtimestamp(
+        int(timestamp),
+        tz=datetime.timezone.utc,
+    )
+
+
+def get_function_settings(
+        *,
+        function_name: str,
+        region: str,
+        cache: Optional[settings_cache.SettingsCache] = None,
+        tracker: Optional[startup_tracker.StartupTracker] = None,
+        ) -> Dict:
+    '''Get formatted settings for a Lambda function
+
+    Cached settings are used while fresh. Once expired, they are revalidated
+    against the function CodeSha256 and LastModified attributes.
+
+    The startup time observed in cold starts of the function, if any, is
+    cached with the settings and looked up again on revalidation.
+    '''
+    if not cache:
+        cache = settings_cache.SettingsCache()
+
+    entry = cache.load(function_name=function_name, region=region)
+
+    if cache.is_fresh(entry=entry):
+        return with_startup_time(
+            settings=entry['settings'],
+            startup_time=entry.get('startup_time'),
+        )
+
+    if not tracker:
+        tracker = startup_tracker.StartupTracker()
+
+    startup_time = tracker.estimate(
+        function_name=function_name,
+        region=region,
+    )
+
+    status, raw_settings = aws_api_wrapper.get_settings(
         function_name=function_name,
         region=region,
     )
@@ -33,22 +220,40 @@ def get_lambda_info(*, function_name: str, region: str) -> List:
     if status != 200:
         raise exc.XLambdaExceptionGetSettingsFailed()
 
-    return (
-        stringify_metrics_datetime(metrics=metrics),
-        format_settings(settings=settings),
+    if cache.is_unchanged(entry=entry, raw_settings=raw_settings):
+        settings = entry['settings']
+    else:
+        settings = format_settings(settings=raw_settings)
+
+    cache.save(
+        function_name=function_name,
+        region=region,
+        settings=settings,
+        raw_settings=raw_settings,
+        startup_time=startup_time,
     )
 
+    return with_startup_time(settings=settings, startup_time=startup_time)
 
-def stringify_metrics_datetime(*, metrics: List) -> List:
-    '''Stringify datetime objects in metrics retrieved from CloudWatch'''
+
+def format_error(*, function: Dict, error: Exception) -> Dict:
+    '''Format an error raised while processing a function'''
     return {
-        metric['timestamp'].strftime('%Y-%m-%d %H:%M:%S'): metric['value']
-        for metric in metrics
+        'name': function['name'],
+        'region': function['region'],
+        'error': {
+            'type': type(error).__name__,
+            'description': str(error),
+        },
     }
 
 
 def format_settings(*, settings: Dict) -> Dict:
-    '''Format Lambda settings'''
+    '''Format Lambda settings
+
+    The startup time is estimated from the settings, see with_startup_time
+    for the startup time observed in cold starts.
+    '''
     formatted = {
         'runtime': normalize_runtime(aws_runtime=settings['Runtime']),
         'memory_size': settings['MemorySize'],
@@ -61,6 +266,15 @@ def format_settings(*, settings: Dict) -> Dict:
     return formatted
 
 
+def with_startup_time(*, settings: Dict, startup_time: Optional[int]) \
+        -> Dict:
+    '''Override the startup time of formatted settings, if observed'''
+    if startup_time is None:
+        return settings
+
+    return {**settings, 'startup_time': startup_time}
+
+
 def estimate_startup_time(
         *,
         runtime: str,